@@ -0,0 +1,151 @@
+"""
+Structured documents produced by the agent flow steps.
+
+When the user approves the result of a step, Claude calls that step's tool
+with the final document (Anthropic tool use). The document is stored in the
+matching Business column and from then on replaces the conversation turns
+that produced it in the context (see services/claude.py).
+"""
+
+from typing import Optional
+
+from bot.db.models import FlowStep
+
+# step → Business column that holds its approved document
+STEP_DOCUMENTS = {
+    FlowStep.PROFILE: "profile",
+    FlowStep.AUDIT: "audit_result",
+    FlowStep.STRATEGY: "strategy",
+    FlowStep.CONTENT_PLAN: "content_plan",
+}
+
+NEXT_STEP = {
+    FlowStep.ONBOARDING: FlowStep.PROFILE,
+    FlowStep.PROFILE: FlowStep.AUDIT,
+    FlowStep.AUDIT: FlowStep.STRATEGY,
+    FlowStep.STRATEGY: FlowStep.CONTENT_PLAN,
+    FlowStep.CONTENT_PLAN: FlowStep.GENERATION,
+    FlowStep.GENERATION: FlowStep.CYCLE,
+}
+
+_STR = {"type": "string"}
+_STR_LIST = {"type": "array", "items": {"type": "string"}}
+
+STEP_TOOLS = {
+    FlowStep.PROFILE: {
+        "name": "save_profile",
+        "description": "Сохранить утверждённый профиль бизнеса (итог шага «Знакомство»).",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "niche": {**_STR, "description": "Ниша / сфера бизнеса"},
+                "product": {**_STR, "description": "Что продаёт, ключевые продукты и цены"},
+                "audience": {**_STR, "description": "Целевая аудитория"},
+                "geography": _STR,
+                "usp": {**_STR, "description": "Чем отличается от конкурентов"},
+                "competitors": _STR_LIST,
+                "channels": {**_STR_LIST, "description": "Каналы продвижения, которые уже используются"},
+                "budget": {**_STR, "description": "Маркетинговый бюджет в месяц"},
+                "goals": _STR_LIST,
+                "notes": _STR_LIST,
+            },
+            "required": ["niche", "product", "audience", "goals"],
+        },
+    },
+    FlowStep.AUDIT: {
+        "name": "save_audit",
+        "description": "Сохранить утверждённые результаты чекапа / аудита.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "summary": _STR,
+                "strengths": _STR_LIST,
+                "weaknesses": _STR_LIST,
+                "channels": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"name": _STR, "status": _STR, "comment": _STR},
+                        "required": ["name", "status"],
+                    },
+                },
+                "priorities": {**_STR_LIST, "description": "Что исправлять в первую очередь"},
+            },
+            "required": ["summary", "priorities"],
+        },
+    },
+    FlowStep.STRATEGY: {
+        "name": "save_strategy",
+        "description": "Сохранить утверждённую маркетинговую стратегию.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "goal": _STR,
+                "positioning": _STR,
+                "audience_segments": _STR_LIST,
+                "key_messages": _STR_LIST,
+                "channels": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"name": _STR, "role": _STR, "budget_share": _STR, "kpi": _STR},
+                        "required": ["name", "role"],
+                    },
+                },
+                "plan": {
+                    "type": "array",
+                    "description": "План по периодам (недели / месяцы)",
+                    "items": {
+                        "type": "object",
+                        "properties": {"period": _STR, "actions": _STR_LIST},
+                        "required": ["period", "actions"],
+                    },
+                },
+                "kpis": _STR_LIST,
+            },
+            "required": ["goal", "channels", "plan"],
+        },
+    },
+    FlowStep.CONTENT_PLAN: {
+        "name": "save_content_plan",
+        "description": "Сохранить утверждённый контент-план.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "period": _STR,
+                "frequency": _STR,
+                "rubrics": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"name": _STR, "goal": _STR, "share": _STR},
+                        "required": ["name"],
+                    },
+                },
+                "items": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "when": _STR, "channel": _STR, "format": _STR, "topic": _STR, "rubric": _STR,
+                        },
+                        "required": ["when", "channel", "topic"],
+                    },
+                },
+            },
+            "required": ["period", "items"],
+        },
+    },
+}
+
+STEP_TOOL_INSTRUCTION = """
+## Сохранение результата шага
+
+Когда пользователь явно утвердил итог текущего шага, вызови инструмент `{tool}` с итоговым
+документом и в том же ответе коротко подтверди переход к следующему шагу.
+Не вызывай инструмент, пока пользователь не утвердил результат.
+"""
+
+
+def step_tool(step: FlowStep) -> Optional[dict]:
+    return STEP_TOOLS.get(step)
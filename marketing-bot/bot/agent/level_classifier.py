@@ -0,0 +1,244 @@
+"""
+Local, deterministic business-level classifier for onboarding (Step 0).
+
+Parses the answers to the three onboarding questions — headcount, marketing
+staff, monthly revenue — including Russian forms like "20 человек", "500к",
+"1,5 млн", "полмиллиона". Clear cases are classified instantly; anything
+ambiguous returns None and goes to Claude with the onboarding prompt.
+
+Ranges follow ONBOARDING_PROMPT:
+    MICRO   1–3 чел.,   нет маркетолога,      до 500 тыс./мес.
+    SMALL   5–20 чел.,  1 человек/фрилансер,  500 тыс. – 5 млн/мес.
+    MEDIUM  20–100 чел., отдел 3+ чел.,        5–50 млн/мес.
+"""
+
+import re
+from collections import Counter
+from typing import NamedTuple, Optional
+
+from bot.db.models import BusinessLevel
+
+
+# Hit rate of the fast path: "local" — classified here, "fallback" — sent to Claude
+stats: Counter = Counter()
+
+
+class LevelSignals(NamedTuple):
+    headcount: Optional[int]
+    marketing_staff: Optional[int]
+    revenue: Optional[int]          # RUB per month
+
+
+# ─── Number parsing ───────────────────────────────────────────────────────────
+
+_NUM = r"(\d+(?:[.,]\d+)?)"
+
+# Порядок важен: "работаем вдвоём, маркетингом занимаюсь сам" — это 2, а не 1
+_WORD_COUNTS = {
+    r"\bдвое\b|\bвдвоем\b": 2,
+    r"\bтрое\b|\bвтроем\b": 3,
+    r"\bчетверо\b|\bвчетвером\b": 4,
+    r"\bпятеро\b|\bвпятером\b": 5,
+    r"\bодин\b|\bодна\b|\bсам\b|\bсама\b|\bв одиночку\b": 1,
+}
+
+_REVENUE_UNITS = [
+    (r"млрд|миллиард\w*", 1_000_000_000),
+    (r"млн|миллион\w*|лям\w*|kk|кк", 1_000_000),
+    (r"тыс\w*|т\.?\s?р\.?|k|к", 1_000),
+    (r"руб\w*|₽", 1),
+]
+_REVENUE_HINT_RE = re.compile(r"оборот|выручк|доход|в месяц|/мес")
+
+_HEADCOUNT_RE = re.compile(
+    rf"{_NUM}(?:\s*(?:-|–|—|до)\s*{_NUM})?\s*(?:чел\w*|сотрудник\w*|работник\w*|людей|человек\w*)"
+)
+_REVENUE_RE = re.compile(
+    rf"{_NUM}(?:\s*(?:-|–|—|до)\s*{_NUM})?\s*("
+    + "|".join(unit for unit, _ in _REVENUE_UNITS)
+    + r")(?![а-яa-z])"
+)
+_HALF_MILLION_RE = re.compile(r"пол\s*-?\s*(?:миллиона|ляма|млн)")
+_MARKETING_DEPT_RE = re.compile(rf"отдел\w*[^\d\n]{{0,40}}?{_NUM}|{_NUM}\s*(?:маркетолог\w*|чел\w*\s+в\s+отдел\w*)")
+_ANSWER_SPLIT_RE = re.compile(r"(?:^|\s)[1-3]\s*[.)️⃣:]\s*|\n+")
+
+
+def _to_float(value: str) -> float:
+    return float(value.replace(",", "."))
+
+
+def _normalize(text: str) -> str:
+    text = text.lower().replace("ё", "е")
+    # "1 500 000" → "1500000"
+    return re.sub(r"(?<=\d)[\s ](?=\d{3}\b)", "", text)
+
+
+def parse_headcount(text: str, bare_numbers: bool = False) -> Optional[int]:
+    """'20 человек' → 20, '5-7 сотрудников' → 7, 'я один' → 1."""
+    text = _normalize(text)
+    match = _HEADCOUNT_RE.search(text)
+    if match:
+        return int(_to_float(match.group(2) or match.group(1)))
+    for pattern, count in _WORD_COUNTS.items():
+        if re.search(pattern, text):
+            return count
+    if bare_numbers:
+        numbers = re.findall(r"\d+", text)
+        if len(numbers) == 1:
+            return int(numbers[0])
+    return None
+
+
+def parse_revenue(text: str, bare_numbers: bool = False) -> Optional[int]:
+    """'5 млн' → 5_000_000, '500к' → 500_000, '1,5 млн' → 1_500_000 (RUB/month)."""
+    text = _normalize(text)
+    if _HALF_MILLION_RE.search(text):
+        return 500_000
+    match = _REVENUE_RE.search(text)
+    if match:
+        amount = _to_float(match.group(2) or match.group(1))
+        unit = match.group(3)
+        for pattern, multiplier in _REVENUE_UNITS:
+            if re.fullmatch(pattern, unit):
+                return int(amount * multiplier)
+    if bare_numbers or _REVENUE_HINT_RE.search(text):
+        # Голое число без единиц: "800000" — это рубли, "800" — неясно
+        numbers = [int(n) for n in re.findall(r"\d+", text) if int(n) >= 10_000]
+        if len(numbers) == 1:
+            return numbers[0]
+    return None
+
+
+def parse_marketing_staff(text: str, positional: bool = False) -> Optional[int]:
+    """'нет маркетолога' → 0, 'фрилансер' → 1, 'отдел из 4 человек' → 4, 'отдел' → 3."""
+    text = _normalize(text)
+    if re.search(r"\b(нет|без|никого|не[тм]у)\b[^.\n]{0,30}(маркет|smm|смм|отдел)", text):
+        return 0
+    if re.search(r"(маркет|smm|смм)\w*[^.\n,;]{0,30}\b(нет|никого|сам|сама|сами)\b", text):
+        return 0
+    match = _MARKETING_DEPT_RE.search(text)
+    if match:
+        return int(_to_float(match.group(1) or match.group(2)))
+    if "отдел" in text:
+        return 3
+    if re.search(r"маркетолог|фрилансер|smm|смм|таргетолог|агентств", text):
+        return 1
+    if positional:
+        if re.search(r"\b(нет|никого|сам|сама|сами)\b", text):
+            return 0
+        if re.search(r"\bда\b|\bесть\b", text):
+            return 1
+    return None
+
+
+def _split_answers(text: str) -> list[str]:
+    return [part.strip() for part in _ANSWER_SPLIT_RE.split(text) if part and part.strip()]
+
+
+def parse_signals(text: str) -> LevelSignals:
+    """
+    Extract all three signals. When the answer is clearly split into three parts
+    (numbered or one per line), bare numbers are read positionally.
+    """
+    parts = _split_answers(text)
+    if len(parts) == 3:
+        return LevelSignals(
+            headcount=parse_headcount(parts[0], bare_numbers=True),
+            marketing_staff=parse_marketing_staff(parts[1], positional=True),
+            revenue=parse_revenue(parts[2], bare_numbers=True),
+        )
+    return LevelSignals(
+        headcount=parse_headcount(text),
+        marketing_staff=parse_marketing_staff(text),
+        revenue=parse_revenue(text),
+    )
+
+
+# ─── Classification ───────────────────────────────────────────────────────────
+
+def _level_by_headcount(n: int) -> Optional[BusinessLevel]:
+    if n <= 3:
+        return BusinessLevel.MICRO
+    if 5 <= n < 20:
+        return BusinessLevel.SMALL
+    if n > 20:
+        return BusinessLevel.MEDIUM
+    return None  # 4 и 20 — на границе диапазонов
+
+
+def _level_by_marketing(n: int) -> Optional[BusinessLevel]:
+    if n == 0:
+        return BusinessLevel.MICRO
+    if n == 1:
+        return BusinessLevel.SMALL
+    if n >= 3:
+        return BusinessLevel.MEDIUM
+    return None
+
+
+def _level_by_revenue(rub: int) -> Optional[BusinessLevel]:
+    # ±10% вокруг границ считаем неоднозначным
+    if rub < 450_000:
+        return BusinessLevel.MICRO
+    if 550_000 <= rub < 4_500_000:
+        return BusinessLevel.SMALL
+    if rub >= 5_500_000:
+        return BusinessLevel.MEDIUM
+    return None
+
+
+def classify_signals(signals: LevelSignals) -> Optional[BusinessLevel]:
+    """
+    A case is clear when headcount and revenue are both known and point to
+    the same level, and the marketing answer (if any) doesn't contradict them.
+    """
+    if signals.headcount is None or signals.revenue is None:
+        return None
+
+    by_headcount = _level_by_headcount(signals.headcount)
+    by_revenue = _level_by_revenue(signals.revenue)
+    if by_headcount is None or by_headcount != by_revenue:
+        return None
+
+    if signals.marketing_staff is not None:
+        by_marketing = _level_by_marketing(signals.marketing_staff)
+        if by_marketing is not None and by_marketing != by_headcount:
+            return None
+
+    return by_headcount
+
+
+def classify_level(text: str) -> Optional[BusinessLevel]:
+    """Classify onboarding answers locally. None means 'ask Claude'."""
+    level = classify_signals(parse_signals(text))
+    stats["local" if level else "fallback"] += 1
+    return level
+
+
+def hit_rate() -> float:
+    """Share of onboarding answers classified without Claude since process start."""
+    total = stats["local"] + stats["fallback"]
+    return stats["local"] / total if total else 0.0
+
+
+# ─── Confirmation ─────────────────────────────────────────────────────────────
+
+_LEVEL_WORDS = [
+    (BusinessLevel.MICRO, r"микро|micro|🟢"),
+    (BusinessLevel.SMALL, r"малый|малого|малому|small|🔵"),
+    (BusinessLevel.MEDIUM, r"средний|среднего|среднему|medium|🟣"),
+]
+_CONFIRM_RE = re.compile(r"\b(да|верно|правильно|точно|подтверждаю|согласен|согласна|ок|ok|ага|угу)\b|^\s*\+\s*$")
+_DENY_RE = re.compile(r"\b(нет|не)\b")
+
+
+def find_level_mention(text: str) -> Optional[BusinessLevel]:
+    """Level named explicitly in the text; None if none or several are named."""
+    text = _normalize(text)
+    found = [level for level, pattern in _LEVEL_WORDS if re.search(pattern, text)]
+    return found[0] if len(found) == 1 else None
+
+
+def is_confirmation(text: str) -> bool:
+    text = _normalize(text)
+    return bool(_CONFIRM_RE.search(text)) and not _DENY_RE.search(text)
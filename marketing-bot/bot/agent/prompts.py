@@ -47,6 +47,55 @@ ONBOARDING_PROMPT = """Ты — ИИ-маркетолог. Твоя задача
 Озвучь определённый уровень, коротко объясни что это значит в режиме работы, и попроси подтверждение.
 """ + BASE_RULES
 
+# Ответ на онбординг, когда уровень определён локально (без вызова Claude)
+LEVEL_CONFIRMATION = {
+    "micro": (
+        "🟢 **Микро** — 1–3 человека, без маркетолога, оборот до 500 тыс./мес.\n\n"
+        "В этом режиме я — твой первый маркетолог: беру всё на себя, говорю простым языком "
+        "и задаю по 1–2 вопроса за раз."
+    ),
+    "small": (
+        "🔵 **Малый бизнес** — 5–20 человек, маркетолог или фрилансер, 500 тыс. – 5 млн/мес.\n\n"
+        "В этом режиме я — маркетинговый директор на аутсорсе: стратегия, приоритеты "
+        "и понятные задачи для исполнителей."
+    ),
+    "medium": (
+        "🟣 **Средний бизнес** — 20–100 человек, отдел маркетинга от 3 человек, 5–50 млн/мес.\n\n"
+        "В этом режиме я — маркетинговый штаб и ИИ-CMO: системный аудит, стратегия по каналам, "
+        "метрики и процессы для команды."
+    ),
+}
+
+LEVEL_CONFIRMATION_QUESTION = (
+    "По твоим ответам это уровень {summary}\n\n"
+    "Всё верно? Если нет — напиши, какой уровень ближе: микро, малый или средний."
+)
+
+# Если Claude сохранил документ шага, но не написал текста
+STEP_APPROVED_MESSAGE = "✅ Зафиксировал. Переходим к следующему шагу: {step}."
+
+# Запрос еженедельного отчёта (шаг 6), отправляется пакетом — см. services/weekly_reports.py
+WEEKLY_REPORT_REQUEST = (
+    "Пришло время еженедельного цикла. Подготовь короткий оперативный отчёт: "
+    "что по плану должно было быть сделано за неделю, что стоит скорректировать в тактике "
+    "и 3 приоритетные задачи на следующую неделю. "
+    "Если для выводов не хватает данных — в конце задай 1–2 вопроса."
+)
+# Старые фрагменты разговора, найденные по текущему сообщению — см. services/recall.py
+RECALL_HEADER = (
+    "## Из прошлых разговоров\n"
+    "Фрагменты более ранней переписки с пользователем, связанные с его текущим сообщением. "
+    "Опирайся на них и не переспрашивай то, что здесь уже сказано. "
+    "Если они противоречат более свежим сообщениям — верны свежие."
+)
+
+# Что поменялось в стратегии и контент-плане за неделю — см. repositories/documents.py
+DOCUMENT_CHANGES_HEADER = (
+    "## Что изменилось в документах за неделю\n"
+    "Правки стратегии и контент-плана с {since} (JSON Pointer пути, «было → стало»). "
+    "Текущие версии документов приведены выше целиком. Учти эти правки в отчёте."
+)
+
 # ─── MICRO: 🟢 ────────────────────────────────────────────────────────────────
 
 MICRO_SYSTEM_PROMPT = """Ты — первый маркетолог этого бизнеса. Ты работаешь в режиме 🟢 Микро.
@@ -11,14 +11,66 @@ class Settings(BaseSettings):
     # Anthropic
     anthropic_api_key: str
     anthropic_model: str = "claude-sonnet-4-5-20250929"
+    # Быстрая дешёвая модель: онбординг, профиль, короткие вопросы (см. ROUTING_TABLE)
+    anthropic_fast_model: str = "claude-haiku-4-5-20251001"
+    anthropic_routing_enabled: bool = True
+    # Governor: одновременные запросы к Anthropic на процесс (адаптивно, AIMD)
+    # и общий лимит на все реплики через Redis (0 — без координации)
+    claude_max_concurrency: int = 16
+    claude_min_concurrency: int = 2
+    claude_global_max_concurrency: int = 0
+    # Message Batches: "anthropic" или "stub" (офлайн, без сети)
+    anthropic_batch_backend: str = "anthropic"
+
+    # Еженедельные отчёты (шаг CYCLE) пакетом через Message Batches API
+    weekly_reports_enabled: bool = False
+    weekly_reports_day: str = "mon"
+    weekly_reports_hour: int = 6    # UTC
 
     # Database
     database_url: str
     database_pool_size: int = 10
+    # SQL-запросы в лог (через сэмплинг log_sampling["sqlalchemy.engine"])
+    database_echo: bool = False
+    # Реплика для чтений (пусто — всё идёт в основную базу). Пользователь, который что-то
+    # записал, читает из основной базы ещё N секунд — запас на отставание реплики
+    database_replica_url: str = ""
+    database_replica_pool_size: int = 10
+    database_replica_sticky_seconds: int = 10
+    # Один апдейт — одна транзакция. Больше N обращений к базе за апдейт (запросы,
+    # BEGIN/COMMIT) — предупреждение в лог, вне production — AssertionError (0 — не проверять)
+    database_round_trip_budget: int = 30
 
     # Redis
     redis_url: str = "redis://localhost:6379/0"
 
+    # Повторные доставки вебхука: update_id помнится N секунд (0 — без дедупликации)
+    update_dedup_ttl: int = 600
+    # Одновременно обрабатываемые апдейты на процесс (0 — без ограничения). Ещё до
+    # admission_max_queued ждут слота не дольше admission_queue_timeout секунд,
+    # остальным сразу уходит «сейчас много запросов»
+    admission_max_in_flight: int = 100
+    admission_max_queued: int = 200
+    admission_queue_timeout: float = 20.0
+
+    # Кэш списка проектов пользователя (секунды, 0 — выключен)
+    projects_cache_ttl: int = 30
+
+    # Последние сообщения проекта в Redis (write-through): сколько хранить (0 — без кэша),
+    # через сколько секунд простоя выбросить и какую долю чтений сверять с базой
+    history_cache_size: int = 100
+    history_cache_ttl: int = 3 * 24 * 3600
+    history_cache_verify_rate: float = 0.01
+
+    # Старые сообщения (за пределами окна контекста), подмешиваемые по релевантности:
+    # сколько фрагментов максимум и бюджет токенов на них (0 — выключено)
+    recall_top_k: int = 5
+    recall_token_budget: int = 600
+
+    # Доля выборов проекта, после которых кэш промпта прогревается в фоне
+    # (0 — выкл, 1 — всегда; промежуточное значение — A/B для claude_first_turn_latency_seconds)
+    prompt_cache_prewarm_rate: float = 0.0
+
     # Payments
     yookassa_shop_id: str = ""
     yookassa_secret_key: str = ""
@@ -39,9 +91,34 @@ class Settings(BaseSettings):
     # Data retention
     data_retention_days: int = 180
 
+    # Messages archival: партиции старше N месяцев уходят в холодное хранилище,
+    # чтобы горячая таблица messages помещалась в shared_buffers
+    messages_archive_after_months: int = 3
+    messages_partitions_ahead: int = 2
+    archive_dir: str = "data/archive"
+
     # App
     environment: str = "development"
     log_level: str = "INFO"
+    # Логи пишет фоновый поток: json | console; при переполнении очереди запись теряется
+    log_format: str = "json"
+    log_queue_size: int = 10_000
+    # Доля записей INFO/DEBUG по префиксу имени логгера (WARNING и выше пишутся всегда)
+    log_sampling: dict[str, float] = {"sqlalchemy.engine": 0.05, "aiogram.event": 0.1}
+    # Prometheus /metrics (0 — не поднимать HTTP-сервер метрик)
+    metrics_port: int = 9464
+    # Трейсинг (OpenTelemetry): "" — выключен, console — stdout, file — tracing_file (JSON на строку)
+    tracing_exporter: str = ""
+    tracing_file: str = "traces.jsonl"
+    # Доля трейсов, которые записываются (решение принимается на апдейт целиком)
+    tracing_sample_rate: float = 1.0
+    # Сэмплирующий профайлер апдейтов: профиль сохраняется, только если апдейт
+    # дольше порога; старые профили удаляются сверх лимита места на диске
+    profiler_enabled: bool = False
+    profiler_threshold_ms: int = 10_000
+    profiler_interval_ms: int = 10
+    profiler_dir: str = "data/profiles"
+    profiler_max_disk_mb: int = 200
     webhook_url: str = ""
     webhook_secret: str = ""
 
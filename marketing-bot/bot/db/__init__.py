@@ -1,11 +1,24 @@
+import functools
+from collections.abc import Awaitable, Callable
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import structlog
+from sqlalchemy import Delete, Insert, Select, Update, event
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session
 
 from bot.config import settings
 
+log = structlog.get_logger()
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
 engine = create_async_engine(
     settings.database_url,
     pool_size=settings.database_pool_size,
-    echo=not settings.is_production,
 )
 
 async_session_factory = async_sessionmaker(
@@ -15,12 +28,171 @@ async_session_factory = async_sessionmaker(
 )
 
 
+# ─── Read replica ─────────────────────────────────────────────────────────────
+#
+# Policy: only SELECTs issued inside a @read_only repository call (or a
+# replica_reads() block) may go to the replica, and only while the session has
+# not written anything. Once it has flushed or executed DML, every later read in
+# the same update goes to the primary (read-your-writes). The session also
+# stays on the primary for the whole update if it starts with
+# info["primary_only"] — DbSessionMiddleware sets that for users who wrote
+# within DATABASE_REPLICA_STICKY_SECONDS, to cover replication lag across
+# updates.
+
+replica_engine = (
+    create_async_engine(settings.database_replica_url, pool_size=settings.database_replica_pool_size)
+    if settings.database_replica_url
+    else None
+)
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if isinstance(clause, (Insert, Update, Delete)):
+            self.info["wrote"] = True
+        elif (
+            replica_engine is not None
+            and isinstance(clause, Select)
+            and clause._for_update_arg is None
+            and self.info.get("replica_reads")
+            and not self.info.get("wrote")
+            and not self.info.get("primary_only")
+        ):
+            return replica_engine.sync_engine
+        return engine.sync_engine
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_written(session: Session, flush_context) -> None:
+    session.info["wrote"] = True
+
+
+routing_session_factory = async_sessionmaker(
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    expire_on_commit=False,
+)
+
+
+@contextmanager
+def replica_reads(session: AsyncSession):
+    """Let SELECTs in this block go to the replica (see the policy above)."""
+    outer = session.info.get("replica_reads", False)
+    session.info["replica_reads"] = True
+    try:
+        yield session
+    finally:
+        session.info["replica_reads"] = outer
+
+
+def read_only(func):
+    """
+    Mark a repository coroutine as a lag-tolerant read: its SELECTs may be
+    served by the replica. Not for read-then-write functions such as
+    get_or_create_user.
+    """
+    @functools.wraps(func)
+    async def wrapper(session: AsyncSession, *args, **kwargs):
+        with replica_reads(session):
+            return await func(session, *args, **kwargs)
+    return wrapper
+
+
+# ─── Unit of work ─────────────────────────────────────────────────────────────
+#
+# DbSessionMiddleware owns the transaction: one commit per update after the
+# handler returns, rollback if it raises. Handlers and repositories only
+# flush(). Side effects that must not run before the data is durable
+# (cache writes and invalidation, deleting archive files) are queued with
+# after_commit(); code that manages its own session commits with commit().
+# A handler that must be able to undo part of its work without losing the rest
+# uses a savepoint: `async with session.begin_nested(): ...`.
+
+_round_trips: ContextVar[Optional[list[str]]] = ContextVar("db_round_trips", default=None)
+
+ROUND_TRIP_STATEMENT_CHARS = 120
+
+
+@contextmanager
+def count_round_trips() -> Iterator[list[str]]:
+    """Collect every statement sent to the database in this block (all engines)."""
+    statements: list[str] = []
+    token = _round_trips.set(statements)
+    try:
+        yield statements
+    finally:
+        _round_trips.reset(token)
+
+
+def _record(statement: str) -> None:
+    statements = _round_trips.get()
+    if statements is not None:
+        statements.append(statement[:ROUND_TRIP_STATEMENT_CHARS])
+
+
+def _count_engine_round_trips(engine) -> None:
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: _record(statement))
+    event.listen(sync_engine, "begin", lambda conn: _record("BEGIN"))
+    event.listen(sync_engine, "commit", lambda conn: _record("COMMIT"))
+    event.listen(sync_engine, "rollback", lambda conn: _record("ROLLBACK"))
+
+
+_count_engine_round_trips(engine)
+if replica_engine is not None:
+    _count_engine_round_trips(replica_engine)
+
+
+def after_commit(session: AsyncSession, func: Callable[..., Awaitable[Any]], *args) -> None:
+    """Run `await func(*args)` once the session's transaction has committed (skipped on rollback)."""
+    session.info.setdefault("after_commit", []).append((func, args))
+
+
+async def commit(session: AsyncSession) -> None:
+    """
+    Commit, then run the after_commit() callbacks in the order they were queued.
+    The data is already durable: a failing callback is logged and the rest still run.
+    """
+    await session.commit()
+    for func, args in session.info.pop("after_commit", ()):
+        try:
+            await func(*args)
+        except Exception as e:
+            log.error("After-commit callback failed", callback=getattr(func, "__qualname__", repr(func)), error=repr(e))
+
+
 async def get_session() -> AsyncSession:
     async with async_session_factory() as session:
         yield session
 
 
-async def create_tables() -> None:
-    from bot.db.models import Base
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+class SchemaOutdatedError(RuntimeError):
+    """Database revision does not match the migrations shipped with the code."""
+
+
+async def verify_schema_revision() -> str:
+    """
+    Check that the database is at the Alembic head revision. Read-only — no DDL.
+    Schema changes are applied out of band with `alembic upgrade head`.
+
+    Returns the current revision, raises SchemaOutdatedError otherwise.
+    """
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    heads = set(ScriptDirectory.from_config(config).get_heads())
+
+    async with engine.connect() as conn:
+        current = await conn.run_sync(
+            lambda sync_conn: set(MigrationContext.configure(sync_conn).get_current_heads())
+        )
+
+    if current != heads:
+        raise SchemaOutdatedError(
+            f"Database schema is at {sorted(current) or 'no revision'}, "
+            f"code expects {sorted(heads)}. Run: alembic upgrade head"
+        )
+    return ", ".join(sorted(current))
@@ -0,0 +1,108 @@
+"""initial schema
+
+Mirrors what Base.metadata.create_all() produced before migrations existed.
+Databases created that way should be stamped instead of upgraded:
+
+    alembic stamp 0001 && alembic upgrade head
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+business_level = sa.Enum("MICRO", "SMALL", "MEDIUM", name="businesslevel")
+flow_step = sa.Enum(
+    "ONBOARDING", "PROFILE", "AUDIT", "STRATEGY", "CONTENT_PLAN", "GENERATION", "CYCLE",
+    name="flowstep",
+)
+subscription_plan = sa.Enum(
+    "FREE_TRIAL", "MICRO", "SMALL", "MEDIUM", "PRO", "AGENCY",
+    name="subscriptionplan",
+)
+subscription_status = sa.Enum(
+    "ACTIVE", "EXPIRED", "CANCELLED", "PENDING",
+    name="subscriptionstatus",
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("username", sa.String(64), nullable=True),
+        sa.Column("first_name", sa.String(128), nullable=False),
+        sa.Column("last_name", sa.String(128), nullable=True),
+        sa.Column("language_code", sa.String(8), nullable=False),
+        sa.Column("reminders_enabled", sa.Boolean(), nullable=False),
+        sa.Column("reminder_day", sa.Integer(), nullable=False),
+        sa.Column("reminder_hour", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+    )
+
+    op.create_table(
+        "businesses",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("user_id", sa.BigInteger(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("name", sa.String(256), nullable=False),
+        sa.Column("level", business_level, nullable=True),
+        sa.Column("current_step", flow_step, nullable=False),
+        sa.Column("profile", sa.JSON(), nullable=True),
+        sa.Column("audit_result", sa.JSON(), nullable=True),
+        sa.Column("strategy", sa.JSON(), nullable=True),
+        sa.Column("content_plan", sa.JSON(), nullable=True),
+        sa.Column("website_url", sa.String(512), nullable=True),
+        sa.Column("website_content", sa.Text(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("delete_after", sa.DateTime(timezone=True), nullable=True),
+    )
+
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("business_id", sa.Integer(), sa.ForeignKey("businesses.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("role", sa.String(16), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("step", flow_step, nullable=True),
+        sa.Column("input_tokens", sa.Integer(), nullable=False),
+        sa.Column("output_tokens", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    )
+
+    op.create_table(
+        "subscriptions",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("user_id", sa.BigInteger(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("plan", subscription_plan, nullable=False),
+        sa.Column("status", subscription_status, nullable=False),
+        sa.Column("payment_id", sa.String(256), nullable=True),
+        sa.Column("amount_rub", sa.Integer(), nullable=False),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("cancelled_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("subscriptions")
+    op.drop_table("messages")
+    op.drop_table("businesses")
+    op.drop_table("users")
+    for enum_type in (subscription_status, subscription_plan, flow_step, business_level):
+        enum_type.drop(op.get_bind(), checkfirst=True)
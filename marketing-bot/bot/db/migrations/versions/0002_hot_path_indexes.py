@@ -0,0 +1,81 @@
+"""hot path indexes
+
+One index per hot query in bot/db/repositories/business.py:
+
+    ix_businesses_user_active_updated  get_user_businesses, get_active_business,
+                                       mark_for_deletion, delete_user_data
+    ix_businesses_delete_after         retention sweep (partial: only marked rows)
+    ix_messages_business_created       Business.messages (ordered by created_at)
+    ix_messages_created_at             time-range scans / retention
+    ix_subscriptions_user_status       User.active_subscription
+
+Built CONCURRENTLY so the upgrade does not block writes on a live database.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_businesses_user_active_updated",
+            "businesses",
+            ["user_id", "is_active", sa.text("updated_at DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_businesses_delete_after",
+            "businesses",
+            ["delete_after"],
+            postgresql_where=sa.text("delete_after IS NOT NULL"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_messages_business_created",
+            "messages",
+            ["business_id", "created_at"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_messages_created_at",
+            "messages",
+            ["created_at"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_subscriptions_user_status",
+            "subscriptions",
+            ["user_id", "status"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table, name in (
+            ("subscriptions", "ix_subscriptions_user_status"),
+            ("messages", "ix_messages_created_at"),
+            ("messages", "ix_messages_business_created"),
+            ("businesses", "ix_businesses_delete_after"),
+            ("businesses", "ix_businesses_user_active_updated"),
+        ):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,111 @@
+"""partition messages by month
+
+messages becomes a RANGE-partitioned table on created_at with one partition
+per calendar month (messages_pYYYY_MM) plus a DEFAULT partition as a safety
+net. The primary key becomes (id, created_at) — Postgres requires the
+partition key in every unique constraint. ids keep coming from the same
+sequence, so they stay unique on their own.
+
+Partitions for future months are created by bot.services.archive; old ones
+are archived to cold storage and dropped from there.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 00:00:00
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Сколько месяцев вперёд создать сразу; дальше — ежедневный maintenance job
+MONTHS_AHEAD = 2
+
+COLUMNS = "id, business_id, role, content, step, input_tokens, output_tokens, created_at"
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+
+    op.execute("ALTER TABLE messages RENAME TO messages_unpartitioned")
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE messages_unpartitioned DROP CONSTRAINT messages_pkey")
+    op.drop_index("ix_messages_business_created", table_name="messages_unpartitioned")
+    op.drop_index("ix_messages_created_at", table_name="messages_unpartitioned")
+
+    op.execute("""
+        CREATE TABLE messages (
+            id            INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+            business_id   INTEGER NOT NULL REFERENCES businesses (id) ON DELETE CASCADE,
+            role          VARCHAR(16) NOT NULL,
+            content       TEXT NOT NULL,
+            step          flowstep,
+            input_tokens  INTEGER NOT NULL,
+            output_tokens INTEGER NOT NULL,
+            created_at    TIMESTAMP WITH TIME ZONE NOT NULL,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+
+    oldest = conn.execute(sa.text("SELECT min(created_at) FROM messages_unpartitioned")).scalar()
+    today = datetime.now(timezone.utc).date()
+    month = (oldest.date() if oldest else today).replace(day=1)
+    last = today.replace(day=1)
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+
+    while month <= last:
+        upper = _next_month(month)
+        op.execute(
+            f"CREATE TABLE messages_p{month:%Y_%m} PARTITION OF messages "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+
+    op.create_index("ix_messages_business_created", "messages", ["business_id", "created_at"])
+    op.create_index("ix_messages_created_at", "messages", ["created_at"])
+
+    op.execute(f"INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_unpartitioned")
+    op.drop_table("messages_unpartitioned")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE messages RENAME TO messages_partitioned")
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY NONE")
+    op.drop_index("ix_messages_business_created", table_name="messages_partitioned")
+    op.drop_index("ix_messages_created_at", table_name="messages_partitioned")
+
+    op.execute("""
+        CREATE TABLE messages (
+            id            INTEGER NOT NULL DEFAULT nextval('messages_id_seq') PRIMARY KEY,
+            business_id   INTEGER NOT NULL REFERENCES businesses (id) ON DELETE CASCADE,
+            role          VARCHAR(16) NOT NULL,
+            content       TEXT NOT NULL,
+            step          flowstep,
+            input_tokens  INTEGER NOT NULL,
+            output_tokens INTEGER NOT NULL,
+            created_at    TIMESTAMP WITH TIME ZONE NOT NULL
+        )
+    """)
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    op.execute(f"INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_partitioned")
+    # Dropping the parent drops every partition with it
+    op.drop_table("messages_partitioned")
+
+    op.create_index("ix_messages_business_created", "messages", ["business_id", "created_at"])
+    op.create_index("ix_messages_created_at", "messages", ["created_at"])
@@ -0,0 +1,57 @@
+"""jsonb documents
+
+Converts profile / audit_result / strategy / content_plan from json to jsonb,
+so repositories can merge into them server-side (|| and jsonb_set) instead of
+rewriting whole documents. JSON 'null' values written by the old JSON type
+become SQL NULL.
+
+Adds a GIN index (jsonb_path_ops) on profile for containment queries across
+businesses, e.g. profile @> '{"niche": "кофейня"}'.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DOCUMENT_COLUMNS = ("profile", "audit_result", "strategy", "content_plan")
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE businesses "
+        + ", ".join(
+            f"ALTER COLUMN {col} TYPE JSONB USING NULLIF({col}::jsonb, 'null'::jsonb)"
+            for col in DOCUMENT_COLUMNS
+        )
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_businesses_profile_gin",
+            "businesses",
+            ["profile"],
+            postgresql_using="gin",
+            postgresql_ops={"profile": "jsonb_path_ops"},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_businesses_profile_gin", table_name="businesses", if_exists=True)
+    op.execute(
+        "ALTER TABLE businesses "
+        + ", ".join(f"ALTER COLUMN {col} TYPE JSON USING {col}::json" for col in DOCUMENT_COLUMNS)
+    )
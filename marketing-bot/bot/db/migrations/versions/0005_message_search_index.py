@@ -0,0 +1,45 @@
+"""message full-text search index
+
+Adds a GIN index over (business_id, to_tsvector('russian', content)) on the
+partitioned messages table, so older turns of one business can be retrieved
+by relevance (bot.services.recall). The 'russian' configuration stems Russian
+words with Snowball and English words with the English stemmer.
+
+The index is on an expression, not a stored tsvector column: no table rewrite,
+and Postgres maintains it incrementally on every insert. btree_gin lets the
+business_id equality share the same GIN index.
+
+CREATE INDEX on a partitioned table cannot run CONCURRENTLY; it builds the
+index on every partition and blocks writes to messages while it runs.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    op.create_index(
+        "ix_messages_business_search",
+        "messages",
+        ["business_id", sa.text("to_tsvector('russian', content)")],
+        postgresql_using="gin",
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_business_search", table_name="messages", if_exists=True)
@@ -0,0 +1,48 @@
+"""document version history
+
+Adds document_versions: the version history of the strategy and content_plan
+documents (bot/db/repositories/documents.py). Each version stores an RFC 6902
+JSON patch from the previous version. The first version, and then every
+SNAPSHOT_EVERY-th one, also stores the full document.
+
+The unique (business_id, doc_type, version) index serves every lookup: the
+latest chain, one version, or the version in effect at a given time.
+
+Existing documents get no rows. The first save after this migration records
+the stored document as version 1 before the change.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "document_versions",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("business_id", sa.Integer(), sa.ForeignKey("businesses.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("doc_type", sa.String(32), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("snapshot", postgresql.JSONB(), nullable=True),
+        sa.Column("patch", postgresql.JSONB(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.UniqueConstraint("business_id", "doc_type", "version", name="uq_document_versions_business_doc_version"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("document_versions")
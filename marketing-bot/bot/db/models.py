@@ -2,11 +2,12 @@
 Database models for the AI Marketing Agent.
 
 Tables:
-    users          — Telegram users
-    businesses     — Business projects (many per user)
-    messages       — Conversation history per business
-    subscriptions  — Payment & plan tracking
-    reminders      — Scheduled reminder jobs
+    users             — Telegram users
+    businesses        — Business projects (many per user)
+    messages          — Conversation history per business
+    document_versions — Version history of strategy / content plan
+    subscriptions     — Payment & plan tracking
+    reminders         — Scheduled reminder jobs
 """
 
 import enum
@@ -14,9 +15,10 @@ from datetime import datetime, timezone
 from typing import Optional
 
 from sqlalchemy import (
-    BigInteger, Boolean, DateTime, Enum, ForeignKey,
-    Integer, String, Text, JSON, UniqueConstraint,
+    BigInteger, Boolean, DateTime, Enum, ForeignKey, Index,
+    Integer, String, Text, UniqueConstraint, func, literal_column, text,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -108,6 +110,21 @@ class User(Base):
 
 class Business(Base):
     __tablename__ = "businesses"
+    __table_args__ = (
+        # get_user_businesses / get_active_business: WHERE user_id, is_active ORDER BY updated_at DESC
+        Index("ix_businesses_user_active_updated", "user_id", "is_active", text("updated_at DESC")),
+        # Очистка по TTL: индексируем только помеченные на удаление строки
+        Index(
+            "ix_businesses_delete_after", "delete_after",
+            postgresql_where=text("delete_after IS NOT NULL"),
+        ),
+        # Поиск по профилям разных бизнесов: profile @> '{"niche": "..."}'
+        Index(
+            "ix_businesses_profile_gin", "profile",
+            postgresql_using="gin",
+            postgresql_ops={"profile": "jsonb_path_ops"},
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"))
@@ -115,17 +132,37 @@ class Business(Base):
     level: Mapped[Optional[BusinessLevel]] = mapped_column(Enum(BusinessLevel), nullable=True)
     current_step: Mapped[FlowStep] = mapped_column(Enum(FlowStep), default=FlowStep.ONBOARDING)
 
-    # Профиль бизнеса — JSON-документ, накапливается в процессе диалога
-    profile: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    # Тяжёлые колонки (группа "heavy") не грузятся по умолчанию — спискам проектов
+    # они не нужны. Кому нужны, берёт их через undefer_group("heavy");
+    # обращение к незагруженной колонке падает сразу, а не ленивым запросом.
+
+    # Профиль бизнеса — JSONB-документ, накапливается в процессе диалога.
+    # Обновляется только частично, на стороне сервера (см. update_profile)
+    profile: Mapped[Optional[dict]] = mapped_column(
+        JSONB(none_as_null=True), nullable=True,
+        deferred=True, deferred_group="heavy", deferred_raiseload=True,
+    )
 
     # Утверждённые документы (после каждого шага)
-    audit_result: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
-    strategy: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
-    content_plan: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    audit_result: Mapped[Optional[dict]] = mapped_column(
+        JSONB(none_as_null=True), nullable=True,
+        deferred=True, deferred_group="heavy", deferred_raiseload=True,
+    )
+    strategy: Mapped[Optional[dict]] = mapped_column(
+        JSONB(none_as_null=True), nullable=True,
+        deferred=True, deferred_group="heavy", deferred_raiseload=True,
+    )
+    content_plan: Mapped[Optional[dict]] = mapped_column(
+        JSONB(none_as_null=True), nullable=True,
+        deferred=True, deferred_group="heavy", deferred_raiseload=True,
+    )
 
     # Мета
     website_url: Mapped[Optional[str]] = mapped_column(String(512), nullable=True)
-    website_content: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # кэш парсинга
+    website_content: Mapped[Optional[str]] = mapped_column(  # кэш парсинга
+        Text, nullable=True,
+        deferred=True, deferred_group="heavy", deferred_raiseload=True,
+    )
 
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
@@ -143,8 +180,20 @@ class Business(Base):
 
 
 class Message(Base):
-    """Full conversation history per business project."""
+    """
+    Full conversation history per business project.
+
+    Partitioned by month on created_at (see migration 0003). Old partitions are
+    moved to cold storage by bot.services.archive, so the hot table holds only
+    recent months.
+    """
     __tablename__ = "messages"
+    __table_args__ = (
+        # Business.messages: WHERE business_id ORDER BY created_at
+        Index("ix_messages_business_created", "business_id", "created_at"),
+        Index("ix_messages_created_at", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     business_id: Mapped[int] = mapped_column(Integer, ForeignKey("businesses.id", ondelete="CASCADE"))
@@ -156,13 +205,51 @@ class Message(Base):
     input_tokens: Mapped[int] = mapped_column(Integer, default=0)
     output_tokens: Mapped[int] = mapped_column(Integer, default=0)
 
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
+    # Ключ партиционирования — поэтому входит в первичный ключ
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, default=utcnow)
 
     business: Mapped["Business"] = relationship(back_populates="messages")
 
 
+# Полнотекстовый поиск по истории (русская морфология). Конфигурация — литерал,
+# а не параметр: иначе выражение в запросе не совпадёт с индексом
+MESSAGE_SEARCH_CONFIG = literal_column("'russian'")
+MESSAGE_SEARCH_VECTOR = func.to_tsvector(MESSAGE_SEARCH_CONFIG, Message.content)
+
+# Старые ходы одного бизнеса по релевантности (bot.services.recall); нужен btree_gin
+Index("ix_messages_business_search", Message.business_id, MESSAGE_SEARCH_VECTOR, postgresql_using="gin")
+
+
+class DocumentVersion(Base):
+    """
+    Version history of the strategy and content plan (see repositories/documents.py).
+
+    `patch` is the RFC 6902 JSON patch from the previous version (None for
+    version 1). `snapshot` is the full document, stored for version 1 and then
+    every SNAPSHOT_EVERY versions, so rebuilding any version applies only a
+    few patches.
+    """
+    __tablename__ = "document_versions"
+    __table_args__ = (
+        # Цепочка версий одного документа: WHERE business_id, doc_type ORDER BY version
+        UniqueConstraint("business_id", "doc_type", "version", name="uq_document_versions_business_doc_version"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    business_id: Mapped[int] = mapped_column(Integer, ForeignKey("businesses.id", ondelete="CASCADE"))
+    doc_type: Mapped[str] = mapped_column(String(32))     # "strategy" | "content_plan"
+    version: Mapped[int] = mapped_column(Integer)
+    snapshot: Mapped[Optional[dict]] = mapped_column(JSONB(none_as_null=True), nullable=True)
+    patch: Mapped[Optional[list]] = mapped_column(JSONB(none_as_null=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
+
+
 class Subscription(Base):
     __tablename__ = "subscriptions"
+    __table_args__ = (
+        # User.active_subscription: WHERE user_id AND status = 'ACTIVE'
+        Index("ix_subscriptions_user_status", "user_id", "status"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"))
@@ -0,0 +1,6 @@
+from redis.asyncio import Redis
+
+from bot.config import settings
+
+# Один пул соединений на процесс: FSM storage, кэши
+redis = Redis.from_url(settings.redis_url)
@@ -1,15 +1,30 @@
 """Data access layer for User, Business, Message."""
 
+import json
 from datetime import datetime, timezone, timedelta
-from typing import Optional
+from typing import NamedTuple, Optional
 
-from sqlalchemy import select, update
+import structlog
+from redis.exceptions import RedisError
+from sqlalchemy import ARRAY, Text, cast, func, inspect, literal, select, update
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-
-from bot.db.models import User, Business, Message, FlowStep
+from sqlalchemy.orm import undefer_group
+from sqlalchemy.orm.attributes import set_committed_value
+
+from bot.db import after_commit, read_only
+from bot.db.models import (
+    User, Business, BusinessLevel, Message, FlowStep,
+    Subscription, SubscriptionPlan, SubscriptionStatus,
+)
+from bot.db.redis import redis
+from bot.db.repositories.documents import VERSIONED_DOCUMENTS, record_version
+from bot.db.repositories.history import invalidate_history, push_turn
+from bot.agent.documents import NEXT_STEP, STEP_DOCUMENTS
 from bot.config import settings
 
+log = structlog.get_logger()
+
 
 # ─── User ─────────────────────────────────────────────────────────────────────
 
@@ -38,26 +53,54 @@ async def get_or_create_user(
     return user
 
 
+@read_only
+async def get_user_plan(
+    session: AsyncSession,
+    user_id: int,
+) -> Optional[SubscriptionPlan]:
+    """Plan of the active subscription, None if there is none."""
+    result = await session.execute(
+        select(Subscription.plan)
+        .where(Subscription.user_id == user_id, Subscription.status == SubscriptionStatus.ACTIVE)
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
 # ─── Business ─────────────────────────────────────────────────────────────────
 
+class ProjectSummary(NamedTuple):
+    """Lightweight projection of Business for project lists and keyboards."""
+    id: int
+    name: str
+    level: Optional[BusinessLevel]
+    current_step: FlowStep
+
+
+@read_only
 async def get_active_business(
     session: AsyncSession,
     user_id: int,
     business_id: int,
 ) -> Optional[Business]:
-    """Load business with full message history."""
+    """
+    Load business with documents and scraped site. Conversation history is not
+    loaded — recent turns come from history.get_recent_turns().
+    """
     result = await session.execute(
         select(Business)
         .where(Business.id == business_id, Business.user_id == user_id, Business.is_active == True)
-        .options(selectinload(Business.messages))
+        .options(undefer_group("heavy"))
     )
     return result.scalar_one_or_none()
 
 
+@read_only
 async def get_user_businesses(
     session: AsyncSession,
     user_id: int,
 ) -> list[Business]:
+    """Full Business rows without the heavy columns."""
     result = await session.execute(
         select(Business)
         .where(Business.user_id == user_id, Business.is_active == True)
@@ -66,14 +109,110 @@ async def get_user_businesses(
     return list(result.scalars().all())
 
 
+@read_only
+async def get_project_summary(
+    session: AsyncSession,
+    user_id: int,
+    business_id: int,
+) -> Optional[ProjectSummary]:
+    result = await session.execute(
+        select(Business.id, Business.name, Business.level, Business.current_step)
+        .where(Business.id == business_id, Business.user_id == user_id, Business.is_active == True)
+    )
+    row = result.one_or_none()
+    return ProjectSummary(*row) if row else None
+
+
+def _projects_cache_key(user_id: int) -> str:
+    return f"projects:{user_id}"
+
+
+@read_only
+async def get_project_summaries(
+    session: AsyncSession,
+    user_id: int,
+) -> list[ProjectSummary]:
+    """
+    Active projects of a user for list views (/start, /projects, limits).
+    Served from a short-TTL Redis cache when PROJECTS_CACHE_TTL > 0.
+    """
+    ttl = settings.projects_cache_ttl
+    key = _projects_cache_key(user_id)
+
+    if ttl > 0:
+        try:
+            cached = await redis.get(key)
+        except RedisError as e:
+            log.warning("Projects cache unavailable", error=repr(e))
+            cached = None
+        if cached is not None:
+            return [
+                ProjectSummary(
+                    id=p["id"],
+                    name=p["name"],
+                    level=BusinessLevel(p["level"]) if p["level"] else None,
+                    current_step=FlowStep(p["current_step"]),
+                )
+                for p in json.loads(cached)
+            ]
+
+    result = await session.execute(
+        select(Business.id, Business.name, Business.level, Business.current_step)
+        .where(Business.user_id == user_id, Business.is_active == True)
+        .order_by(Business.updated_at.desc())
+    )
+    summaries = [ProjectSummary(*row) for row in result.all()]
+
+    if ttl > 0:
+        payload = json.dumps([
+            {
+                "id": p.id,
+                "name": p.name,
+                "level": p.level.value if p.level else None,
+                "current_step": p.current_step.value,
+            }
+            for p in summaries
+        ], ensure_ascii=False)
+        try:
+            await redis.set(key, payload, ex=ttl)
+        except RedisError as e:
+            log.warning("Projects cache unavailable", error=repr(e))
+
+    return summaries
+
+
+async def invalidate_project_list(user_id: int) -> None:
+    """
+    Call after creating/deleting a project or changing its name or level —
+    via after_commit(), or a concurrent read refills the cache with the old list.
+    """
+    if settings.projects_cache_ttl <= 0:
+        return
+    try:
+        await redis.delete(_projects_cache_key(user_id))
+    except RedisError as e:
+        log.warning("Projects cache unavailable", error=repr(e))
+
+
 async def create_business(
     session: AsyncSession,
     user_id: int,
     name: str,
 ) -> Business:
-    business = Business(user_id=user_id, name=name)
+    # Тяжёлые колонки deferred с raiseload — задаём явно, чтобы новый объект
+    # можно было сразу отдавать в claude.chat() без повторной загрузки
+    business = Business(
+        user_id=user_id,
+        name=name,
+        profile=None,
+        audit_result=None,
+        strategy=None,
+        content_plan=None,
+        website_content=None,
+    )
     session.add(business)
     await session.flush()
+    after_commit(session, invalidate_project_list, user_id)
     return business
 
 
@@ -84,6 +223,50 @@ async def advance_step(
 ) -> None:
     business.current_step = step
     await session.flush()
+    # Шаг и updated_at видны в списке проектов
+    after_commit(session, invalidate_project_list, business.user_id)
+
+
+DOCUMENT_TYPES = ("audit_result", "strategy", "content_plan")
+
+
+async def _merge_jsonb(
+    session: AsyncSession,
+    business: Business,
+    column: str,
+    new_value,
+) -> dict:
+    """
+    UPDATE ... SET <column> = <new_value expression> RETURNING <column>.
+    The merge happens in Postgres, so concurrent turns touching different keys
+    don't overwrite each other and only the patch travels over the wire.
+    The returned document is put on the instance without marking it dirty.
+    """
+    col = getattr(Business, column)
+    result = await session.execute(
+        update(Business)
+        .where(Business.id == business.id)
+        .values({column: new_value})
+        .returning(col)
+        .execution_options(synchronize_session=False)
+    )
+    merged = result.scalar_one()
+    set_committed_value(business, column, merged)
+    return merged
+
+
+async def _merge_versioned(session: AsyncSession, business: Business, column: str, new_value) -> dict:
+    """_merge_jsonb(), then record the result in the version history (strategy, content plan)."""
+    # Прежнее значение — только если уже загружено: лишнего запроса ради него не делаем
+    previous = inspect(business).dict.get(column)
+    merged = await _merge_jsonb(session, business, column, new_value)
+    if column in VERSIONED_DOCUMENTS:
+        await record_version(session, business, column, merged, previous=previous)
+    return merged
+
+
+def _jsonb_or_empty(column: str):
+    return func.coalesce(getattr(Business, column), cast(literal("{}"), JSONB))
 
 
 async def update_profile(
@@ -91,10 +274,11 @@ async def update_profile(
     business: Business,
     profile_data: dict,
 ) -> None:
-    existing = business.profile or {}
-    existing.update(profile_data)
-    business.profile = existing
-    await session.flush()
+    """Shallow-merge profile_data into the profile server-side (jsonb ||)."""
+    await _merge_jsonb(
+        session, business, "profile",
+        _jsonb_or_empty("profile").op("||", return_type=JSONB)(literal(profile_data, JSONB)),
+    )
 
 
 async def save_document(
@@ -102,9 +286,80 @@ async def save_document(
     business: Business,
     doc_type: str,  # "audit_result" | "strategy" | "content_plan"
     data: dict,
+    replace: bool = False,
 ) -> None:
-    setattr(business, doc_type, data)
-    await session.flush()
+    """
+    Save an approved document. By default merges top-level keys server-side;
+    replace=True overwrites the whole document.
+    """
+    if doc_type not in DOCUMENT_TYPES:
+        raise ValueError(f"Unknown document type: {doc_type}")
+
+    if replace:
+        new_value = literal(data, JSONB)
+    else:
+        new_value = _jsonb_or_empty(doc_type).op("||", return_type=JSONB)(literal(data, JSONB))
+    await _merge_versioned(session, business, doc_type, new_value)
+
+
+async def set_document_field(
+    session: AsyncSession,
+    business: Business,
+    doc_type: str,  # "profile" | "audit_result" | "strategy" | "content_plan"
+    path: list[str],
+    value,
+) -> None:
+    """Set a single nested field server-side with jsonb_set, e.g. path=["channels", "vk"]."""
+    if doc_type != "profile" and doc_type not in DOCUMENT_TYPES:
+        raise ValueError(f"Unknown document type: {doc_type}")
+
+    await _merge_versioned(
+        session, business, doc_type,
+        func.jsonb_set(
+            _jsonb_or_empty(doc_type),
+            cast(path, ARRAY(Text)),
+            literal(value, JSONB),
+            True,
+            type_=JSONB,
+        ),
+    )
+
+
+async def complete_step(
+    session: AsyncSession,
+    business: Business,
+    document: dict,
+) -> FlowStep:
+    """
+    Store the approved document of the current step and advance to the next one.
+    The profile is merged (it accumulates during the dialog), other documents
+    are replaced as a whole. Returns the new step.
+    """
+    column = STEP_DOCUMENTS[business.current_step]
+    if column == "profile":
+        await update_profile(session, business, document)
+    else:
+        await save_document(session, business, column, document, replace=True)
+
+    next_step = NEXT_STEP.get(business.current_step, business.current_step)
+    await advance_step(session, business, next_step)
+    return next_step
+
+
+@read_only
+async def find_businesses_by_profile(
+    session: AsyncSession,
+    criteria: dict,
+    limit: int = 100,
+) -> list[Business]:
+    """Profiles containing `criteria` (jsonb @>, served by ix_businesses_profile_gin)."""
+    result = await session.execute(
+        select(Business)
+        .where(Business.profile.contains(criteria), Business.is_active == True)
+        .options(undefer_group("heavy"))
+        .limit(limit)
+    )
+    return list(result.scalars().all())
 
 
 # ─── Messages ─────────────────────────────────────────────────────────────────
@@ -128,6 +383,10 @@ async def add_message(
     session.add(msg)
     await session.flush()
 
+    # Write-through в кэш последних ходов — только после коммита: незакоммиченный
+    # ход не должен попасть к другим читателям и остаться в кэше после отката
+    after_commit(session, push_turn, msg)
+
     return msg
 
 
@@ -153,12 +412,17 @@ async def mark_for_deletion(
 async def delete_user_data(
     session: AsyncSession,
     user_id: int,
-) -> None:
-    """Immediately delete all data for a user (GDPR/152-ФЗ request)."""
+) -> list[int]:
+    """
+    Immediately delete all data for a user (GDPR/152-ФЗ request).
+    Returns ids of the deleted businesses, so archived history can be purged too.
+    """
     result = await session.execute(
         select(Business).where(Business.user_id == user_id)
     )
+    business_ids = []
     for business in result.scalars():
+        business_ids.append(business.id)
         await session.delete(business)
 
     result = await session.execute(select(User).where(User.id == user_id))
@@ -167,3 +431,6 @@ async def delete_user_data(
         await session.delete(user)
 
     await session.flush()
+    after_commit(session, invalidate_project_list, user_id)
+    after_commit(session, invalidate_history, *business_ids)
+    return business_ids
@@ -0,0 +1,147 @@
+"""
+Version history of the strategy and content plan: JSON-patch deltas with
+periodic full snapshots (document_versions).
+
+- record_version() is called by save_document() / set_document_field() once the
+  new document is stored. It appends the RFC 6902 patch from the previous
+  version, plus a full snapshot every SNAPSHOT_EVERY versions. A save that
+  changes nothing adds no row.
+- get_version() rebuilds any version from the nearest snapshot at or before it
+  plus fewer than SNAPSHOT_EVERY patches, in one query.
+- diff_versions() returns the patch between two versions. For adjacent versions
+  it is the stored patch, read as is.
+- version_at() returns the version in effect at a given time, e.g. a week ago
+  (see services/document_changes.py).
+"""
+
+from datetime import datetime
+from typing import Iterator, Optional
+
+import jsonpatch
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.db.models import Business, DocumentVersion
+
+VERSIONED_DOCUMENTS = ("strategy", "content_plan")
+
+# Полный документ в каждой N-й версии: восстановление любой версии — не больше N-1 патчей
+SNAPSHOT_EVERY = 10
+
+
+async def _chain(
+    session: AsyncSession,
+    business_id: int,
+    doc_type: str,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+) -> list:
+    """
+    Rows (version, snapshot, patch) from the last snapshot at or before `start`
+    through `end`, in order. Both default to the latest version.
+    """
+    of_document = (DocumentVersion.business_id == business_id, DocumentVersion.doc_type == doc_type)
+    base = select(func.max(DocumentVersion.version)).where(*of_document, DocumentVersion.snapshot.is_not(None))
+    start = start if start is not None else end
+    if start is not None:
+        base = base.where(DocumentVersion.version <= start)
+
+    query = (
+        select(DocumentVersion.version, DocumentVersion.snapshot, DocumentVersion.patch)
+        .where(*of_document, DocumentVersion.version >= base.scalar_subquery())
+        .order_by(DocumentVersion.version)
+    )
+    if end is not None:
+        query = query.where(DocumentVersion.version <= end)
+    result = await session.execute(query)
+    return list(result.all())
+
+
+def _replay(chain: list) -> Iterator[tuple[int, dict]]:
+    """(version, document) for every row of a chain that starts with a snapshot."""
+    document = None
+    for row in chain:
+        document = row.snapshot if row.snapshot is not None else jsonpatch.apply_patch(document, row.patch)
+        yield row.version, document
+
+
+async def record_version(
+    session: AsyncSession,
+    business: Business,
+    doc_type: str,
+    document: dict,
+    previous: Optional[dict] = None,
+) -> Optional[int]:
+    """
+    Append `document` as the next version. `previous` is the document as it
+    was before this save: it becomes version 1 if the document predates the
+    history. Returns the new version number, or None if nothing changed.
+    """
+    chain = await _chain(session, business.id, doc_type)
+    if chain:
+        base_version = chain[0].version
+        version, current = list(_replay(chain))[-1]
+    elif previous is not None:
+        # Документ сохранён до появления истории: он не менялся как минимум
+        # с последнего обновления проекта — с этого момента и считается версия 1
+        session.add(DocumentVersion(
+            business_id=business.id, doc_type=doc_type, version=1,
+            snapshot=previous, created_at=business.updated_at,
+        ))
+        base_version, version, current = 1, 1, previous
+    else:
+        session.add(DocumentVersion(business_id=business.id, doc_type=doc_type, version=1, snapshot=document))
+        return 1
+
+    patch = jsonpatch.make_patch(current, document).patch
+    if not patch:
+        return None
+    version += 1
+    session.add(DocumentVersion(
+        business_id=business.id,
+        doc_type=doc_type,
+        version=version,
+        snapshot=document if version - base_version >= SNAPSHOT_EVERY else None,
+        patch=patch,
+    ))
+    return version
+
+
+async def get_version(session: AsyncSession, business_id: int, doc_type: str, version: int) -> Optional[dict]:
+    """The document as of `version`, or None if there is no such version."""
+    chain = await _chain(session, business_id, doc_type, end=version)
+    if not chain or chain[-1].version != version:
+        return None
+    return list(_replay(chain))[-1][1]
+
+
+async def diff_versions(
+    session: AsyncSession, business_id: int, doc_type: str, old: int, new: int,
+) -> Optional[list[dict]]:
+    """JSON patch that turns version `old` into version `new`; None if either is missing."""
+    if new == old + 1:
+        patch = await session.scalar(
+            select(DocumentVersion.patch).where(
+                DocumentVersion.business_id == business_id,
+                DocumentVersion.doc_type == doc_type,
+                DocumentVersion.version == new,
+            )
+        )
+        if patch is not None:
+            return patch
+
+    documents = dict(_replay(await _chain(session, business_id, doc_type, start=min(old, new), end=max(old, new))))
+    if old not in documents or new not in documents:
+        return None
+    return jsonpatch.make_patch(documents[old], documents[new]).patch
+
+
+async def version_at(session: AsyncSession, business_id: int, doc_type: str, moment: datetime) -> Optional[int]:
+    """Latest version created at or before `moment`."""
+    return await session.scalar(
+        select(func.max(DocumentVersion.version)).where(
+            DocumentVersion.business_id == business_id,
+            DocumentVersion.doc_type == doc_type,
+            DocumentVersion.created_at <= moment,
+        )
+    )
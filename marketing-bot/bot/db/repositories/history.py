@@ -0,0 +1,209 @@
+"""
+Recent conversation turns per business: a Redis hot list in front of Postgres.
+
+history:{business_id} is a Redis list of the last HISTORY_CACHE_SIZE messages,
+oldest first. Each entry is the Claude message dict plus the id and step that
+context compaction needs.
+
+- Write-through: add_message() appends and trims once its transaction has
+  committed (bot.db.after_commit), and only if the list already exists. A
+  partial list must never pass for the full recent history.
+- Read: get_recent_turns() falls back to a windowed Postgres query on a miss
+  and refills the list.
+- Eviction: idle projects expire after HISTORY_CACHE_TTL (refreshed on every
+  read and write).
+- Consistency: a sampled check compares cached ids with Postgres and drops the
+  list on mismatch.
+
+Turns older than the context window are not cached. search_older_turns()
+finds the relevant ones by full-text search in Postgres.
+"""
+
+import json
+import random
+import re
+from typing import NamedTuple, Optional
+
+import structlog
+from redis.exceptions import RedisError
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.config import settings
+from bot.db import read_only
+from bot.db.models import MESSAGE_SEARCH_CONFIG, MESSAGE_SEARCH_VECTOR, FlowStep, Message
+from bot.db.redis import redis
+from bot.services.metrics import HISTORY_CACHE_INCONSISTENT, HISTORY_CACHE_REQUESTS
+
+log = structlog.get_logger()
+
+# HISTORY_CACHE_SIZE=0 (кэш выключен): окно из базы такого же размера, как у кэша по умолчанию
+MAX_UNCACHED_TURNS = 100
+
+# Слова запроса для поиска по истории: только буквы/цифры — безопасно для синтаксиса to_tsquery
+SEARCH_TERM_RE = re.compile(r"[^\W_]{2,}")
+MAX_SEARCH_TERMS = 32
+
+
+class Turn(NamedTuple):
+    """One message as the context builder sees it (duck-types Message)."""
+    id: int
+    role: str
+    content: str
+    step: Optional[FlowStep]
+
+    def as_claude(self) -> dict:
+        return {"role": self.role, "content": self.content}
+
+
+def _key(business_id: int) -> str:
+    return f"history:{business_id}"
+
+
+def _encode(turn: Turn) -> str:
+    return json.dumps(
+        {"id": turn.id, "role": turn.role, "content": turn.content, "step": turn.step.value if turn.step else None},
+        ensure_ascii=False,
+    )
+
+
+def _decode(raw: bytes) -> Turn:
+    data = json.loads(raw)
+    return Turn(data["id"], data["role"], data["content"], FlowStep(data["step"]) if data["step"] else None)
+
+
+def _from_message(message: Message) -> Turn:
+    return Turn(message.id, message.role, message.content, message.step)
+
+
+# ─── Postgres ─────────────────────────────────────────────────────────────────
+
+async def load_recent_turns(session: AsyncSession, business_id: int, limit: int) -> list[Turn]:
+    """Last `limit` messages of a business, oldest first (backward scan of ix_messages_business_created)."""
+    result = await session.execute(
+        select(Message.id, Message.role, Message.content, Message.step)
+        .where(Message.business_id == business_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(limit)
+    )
+    return [Turn(*row) for row in reversed(result.all())]
+
+
+@read_only
+async def search_older_turns(
+    session: AsyncSession, business_id: int, query: str, before_id: int, limit: int,
+) -> list[Turn]:
+    """
+    Messages of a business older than `before_id` that share stemmed words
+    with `query`, most relevant first (ix_messages_business_search).
+
+    Any word is enough to match (OR); ts_rank with length normalization orders
+    the matches, so a message hitting several rare words wins over a long one
+    that mentions a single word many times.
+    """
+    terms = list(dict.fromkeys(t.lower() for t in SEARCH_TERM_RE.findall(query)))[:MAX_SEARCH_TERMS]
+    if not terms:
+        return []
+    tsquery = func.to_tsquery(MESSAGE_SEARCH_CONFIG, " | ".join(terms))
+    result = await session.execute(
+        select(Message.id, Message.role, Message.content, Message.step)
+        .where(
+            Message.business_id == business_id,
+            Message.id < before_id,
+            MESSAGE_SEARCH_VECTOR.op("@@")(tsquery),
+        )
+        .order_by(func.ts_rank(MESSAGE_SEARCH_VECTOR, tsquery, 1).desc())
+        .limit(limit)
+    )
+    return [Turn(*row) for row in result.all()]
+
+
+# ─── Cache ────────────────────────────────────────────────────────────────────
+
+async def _fill(business_id: int, turns: list[Turn]) -> None:
+    if not turns:
+        return  # пустой список в Redis не хранится — следующее чтение снова промахнётся
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.delete(_key(business_id))
+        pipe.rpush(_key(business_id), *(_encode(t) for t in turns))
+        pipe.expire(_key(business_id), settings.history_cache_ttl)
+        await pipe.execute()
+
+
+async def push_turn(message: Message) -> None:
+    """Append a committed message to its business's list, if the list is cached."""
+    if not settings.history_cache_size:
+        return
+    key = _key(message.business_id)
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.rpushx(key, _encode(_from_message(message)))
+            pipe.ltrim(key, -settings.history_cache_size, -1)
+            pipe.expire(key, settings.history_cache_ttl)
+            await pipe.execute()
+    except RedisError as e:
+        # Список мог разойтись с базой — безопаснее его выбросить
+        log.warning("History cache write failed", business_id=message.business_id, error=repr(e))
+        await invalidate_history(message.business_id)
+
+
+async def invalidate_history(*business_ids: int) -> None:
+    if not business_ids:
+        return
+    try:
+        await redis.delete(*(_key(b) for b in business_ids))
+    except RedisError as e:
+        log.warning("History cache invalidation failed", business_ids=business_ids, error=repr(e))
+
+
+async def verify_history_cache(session: AsyncSession, business_id: int, cached: list[Turn]) -> bool:
+    """Compare cached ids with the same window in Postgres; drop the list on mismatch."""
+    expected = await load_recent_turns(session, business_id, len(cached))
+    if [t.id for t in cached] == [t.id for t in expected]:
+        return True
+    HISTORY_CACHE_INCONSISTENT.inc()
+    log.warning(
+        "History cache inconsistent, dropped",
+        business_id=business_id,
+        cached_last_id=cached[-1].id if cached else None,
+        db_last_id=expected[-1].id if expected else None,
+    )
+    await invalidate_history(business_id)
+    return False
+
+
+async def get_recent_turns(session: AsyncSession, business_id: int) -> list[Turn]:
+    """
+    The most recent turns of a business, oldest first: from Redis, or from
+    Postgres on a miss (then cached). Older turns are only in Postgres.
+    """
+    limit = settings.history_cache_size
+    if not limit:
+        return await load_recent_turns(session, business_id, MAX_UNCACHED_TURNS)
+
+    key = _key(business_id)
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.lrange(key, 0, -1)
+            pipe.expire(key, settings.history_cache_ttl)
+            raw, _ = await pipe.execute()
+    except RedisError as e:
+        log.warning("History cache read failed", business_id=business_id, error=repr(e))
+        HISTORY_CACHE_REQUESTS.labels(result="error").inc()
+        return await load_recent_turns(session, business_id, limit)
+
+    if raw:
+        turns = [_decode(item) for item in raw]
+        if random.random() >= settings.history_cache_verify_rate or await verify_history_cache(
+            session, business_id, turns
+        ):
+            HISTORY_CACHE_REQUESTS.labels(result="hit").inc()
+            return turns
+
+    HISTORY_CACHE_REQUESTS.labels(result="miss").inc()
+    turns = await load_recent_turns(session, business_id, limit)
+    try:
+        await _fill(business_id, turns)
+    except RedisError as e:
+        log.warning("History cache fill failed", business_id=business_id, error=repr(e))
+    return turns
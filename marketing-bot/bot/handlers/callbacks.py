@@ -1,18 +1,23 @@
 """Inline keyboard callback handlers."""
 
+import asyncio
+
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from bot.db import after_commit
 from bot.db.repositories.business import (
-    get_active_business,
-    get_user_businesses,
+    get_project_summary,
+    get_project_summaries,
     delete_user_data,
 )
 from bot.db.models import User
 from bot.handlers.states import ChatState
 from bot.keyboards.inline import projects_keyboard, settings_keyboard
+from bot.services.archive import purge_archived
+from bot.services.prewarm import schedule_prewarm
 
 router = Router()
 
@@ -20,14 +25,17 @@ router = Router()
 @router.callback_query(F.data.startswith("project:"))
 async def on_project_select(callback: CallbackQuery, state: FSMContext, session: AsyncSession) -> None:
     business_id = int(callback.data.split(":")[1])
-    business = await get_active_business(session, callback.from_user.id, business_id)
+    business = await get_project_summary(session, callback.from_user.id, business_id)
 
     if not business:
         await callback.answer("Проект не найден", show_alert=True)
         return
 
     await state.set_state(ChatState.active)
-    await state.update_data(business_id=business.id)
+    # first_turn/prewarmed — для метрики задержки первого хода: группа (прогрев или нет)
+    # выбирается здесь, а не по тому, успел ли прогрев закончиться
+    prewarmed = schedule_prewarm(callback.from_user.id, business.id)
+    await state.update_data(business_id=business.id, first_turn=True, prewarmed=prewarmed)
 
     from bot.db.models import FlowStep
     step_labels = {
@@ -63,7 +71,7 @@ async def on_new_project(callback: CallbackQuery, state: FSMContext, session: As
         await callback.answer("Сначала напиши /start")
         return
 
-    businesses = await get_user_businesses(session, user.id)
+    businesses = await get_project_summaries(session, user.id)
     if len(businesses) >= user.max_projects:
         await callback.answer(
             f"Лимит проектов ({user.max_projects}) достигнут. Перейди на тариф Про.",
@@ -89,7 +97,6 @@ async def on_toggle_reminders(callback: CallbackQuery, session: AsyncSession) ->
 
     if user:
         user.reminders_enabled = not user.reminders_enabled
-        await session.commit()
         status = "включены ✅" if user.reminders_enabled else "выключены ❌"
         await callback.message.edit_text(
             f"⚙️ **Настройки**\n\nНапоминания: {status}",
@@ -115,11 +122,16 @@ async def on_request_delete(callback: CallbackQuery) -> None:
 
 @router.callback_query(F.data == "confirm_delete")
 async def on_confirm_delete(callback: CallbackQuery, state: FSMContext, session: AsyncSession) -> None:
-    await delete_user_data(session, callback.from_user.id)
-    await session.commit()
+    business_ids = await delete_user_data(session, callback.from_user.id)
+    # Старые месяцы переписки лежат в холодном архиве — чистим и их, но только
+    # после коммита: файлы не вернуть, если удаление в базе откатится
+    after_commit(session, asyncio.to_thread, purge_archived, set(business_ids))
     await state.clear()
-    await callback.message.edit_text(
-        "✅ Все данные удалены. Если захочешь вернуться — напиши /start."
+    # «Удалено» — только когда удаление действительно закоммичено
+    after_commit(
+        session,
+        callback.message.edit_text,
+        "✅ Все данные удалены. Если захочешь вернуться — напиши /start.",
     )
     await callback.answer()
 
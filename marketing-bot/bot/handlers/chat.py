@@ -6,22 +6,42 @@ saves both user message and assistant response to DB.
 """
 
 import re
+import time
+
+import structlog
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.handlers.states import ChatState, OnboardingState
+from bot.db import after_commit
 from bot.db.repositories.business import (
     get_active_business,
     get_or_create_user,
     create_business,
     add_message,
     update_profile,
+    invalidate_project_list,
+    get_user_plan,
+    complete_step,
 )
-from bot.services.claude import chat as claude_chat
-from bot.services.scraper import scrape
+from bot.db.repositories.history import get_recent_turns
+from bot.services.claude import chat as claude_chat, chat_step
+from bot.services.governor import priority_for_plan
+from bot.services.prewarm import record_first_turn
+from bot.services.recall import recall_older_turns
+from bot.services.telegram_text import split_message
 from bot.db.models import BusinessLevel, FlowStep
+from bot.agent.level_classifier import classify_level, find_level_mention, hit_rate, is_confirmation
+from bot.agent.prompts import (
+    LEVEL_CONFIRMATION,
+    LEVEL_CONFIRMATION_QUESTION,
+    STEP_APPROVED_MESSAGE,
+    STEP_DESCRIPTIONS,
+)
+
+log = structlog.get_logger()
 
 router = Router()
 
@@ -34,6 +54,9 @@ async def _handle_url_in_message(text: str, business, session: AsyncSession) ->
     if not urls or business.website_content:
         return ""
 
+    # bs4/lxml (и Playwright внутри) грузятся только при первой ссылке — не на старте
+    from bot.services.scraper import scrape
+
     url = urls[0]
     content = await scrape(url)
     business.website_url = url
@@ -62,14 +85,34 @@ async def handle_chat_message(message: Message, state: FSMContext, session: Asyn
     # Handle URL scraping in background
     url_notice = await _handle_url_in_message(user_text, business, session)
 
+    # Recent turns (Redis, Postgres on a miss) — read before the current message is saved
+    history = await get_recent_turns(session, business.id)
+    # Older turns relevant to this message (beyond the context window)
+    recall = await recall_older_turns(session, business.id, history, user_text)
+
     # Save user message
     await add_message(session, business, "user", user_text)
 
     # Show typing indicator
     await message.bot.send_chat_action(message.chat.id, "typing")
 
-    # Call Claude
-    response_text, input_tokens, output_tokens = await claude_chat(business, user_text)
+    # Call Claude (paid plans get the priority lane)
+    priority = priority_for_plan(await get_user_plan(session, message.from_user.id))
+    started = time.perf_counter()
+    response_text, input_tokens, output_tokens, document = await chat_step(
+        business, user_text, priority, history=history, recall=recall,
+    )
+    if data.get("first_turn"):
+        await record_first_turn(business.id, time.perf_counter() - started, data.get("prewarmed", False))
+        await state.update_data(first_turn=False)
+
+    # User approved the step — Claude returned its structured document
+    if document:
+        finished = business.current_step
+        next_step = await complete_step(session, business, document)
+        log.info("Step approved", business_id=business.id, step=finished.value, next_step=next_step.value)
+        if not response_text.strip():
+            response_text = STEP_APPROVED_MESSAGE.format(step=STEP_DESCRIPTIONS[next_step.value])
 
     # Save assistant response
     await add_message(
@@ -77,25 +120,12 @@ async def handle_chat_message(message: Message, state: FSMContext, session: Asyn
         input_tokens=input_tokens, output_tokens=output_tokens,
     )
 
-    await session.commit()
-
     # Send response (split if > 4096 chars for Telegram)
     full_response = response_text + url_notice
-    for chunk in _split_message(full_response):
+    for chunk in split_message(full_response):
         await message.answer(chunk, parse_mode="Markdown")
 
 
-def _split_message(text: str, max_len: int = 4000) -> list[str]:
-    """Split long messages into Telegram-safe chunks."""
-    if len(text) <= max_len:
-        return [text]
-    chunks = []
-    while text:
-        chunks.append(text[:max_len])
-        text = text[max_len:]
-    return chunks
-
-
 # ─── Onboarding flow ──────────────────────────────────────────────────────────
 
 @router.message(OnboardingState.waiting_for_level_answers)
@@ -104,29 +134,43 @@ async def handle_onboarding_answers(
 ) -> None:
     """
     User answered the 3 onboarding questions.
-    Claude determines the business level and asks for confirmation.
+    Clear answers are classified locally; ambiguous ones go to Claude.
+    Either way the proposed level is asked for confirmation.
     """
     user = await get_or_create_user(session, message.from_user.id, message.from_user.first_name)
 
     # Create a temporary business placeholder
     business = await create_business(session, user.id, f"Проект {message.from_user.first_name}")
-    await session.commit()
 
     # Save user's answer
     await add_message(session, business, "user", message.text)
 
-    await message.bot.send_chat_action(message.chat.id, "typing")
-
-    # Claude determines the level
-    from bot.services.claude import chat as claude_chat
-    response, in_tok, out_tok = await claude_chat(business, message.text)
+    level = classify_level(message.text or "")
+    if level:
+        response = LEVEL_CONFIRMATION_QUESTION.format(summary=LEVEL_CONFIRMATION[level.value])
+        in_tok = out_tok = 0
+        source = "local"
+    else:
+        await message.bot.send_chat_action(message.chat.id, "typing")
+        # Claude determines the level
+        priority = priority_for_plan(await get_user_plan(session, user.id))
+        # Fresh project — no history yet
+        response, in_tok, out_tok = await claude_chat(business, message.text, priority, history=[])
+        level = find_level_mention(response)
+        source = "claude"
+
+    log.info(
+        "Onboarding level proposed",
+        source=source,
+        level=level.value if level else None,
+        local_hit_rate=round(hit_rate(), 3),
+    )
 
     await add_message(session, business, "assistant", response, in_tok, out_tok)
-    await session.commit()
 
     # Move to confirmation state
     await state.set_state(OnboardingState.waiting_for_level_confirmation)
-    await state.update_data(business_id=business.id)
+    await state.update_data(business_id=business.id, proposed_level=level.value if level else None)
 
     await message.answer(response, parse_mode="Markdown")
 
@@ -144,22 +188,20 @@ async def handle_level_confirmation(
         await state.clear()
         return
 
-    # Detect level from user's confirmation
-    text_lower = message.text.lower()
-    level = None
-    if any(w in text_lower for w in ["микро", "micro", "да", "верно", "правильно"]):
-        level = BusinessLevel.MICRO
-    elif any(w in text_lower for w in ["малый", "малого", "small"]):
-        level = BusinessLevel.SMALL
-    elif any(w in text_lower for w in ["средний", "среднего", "medium"]):
-        level = BusinessLevel.MEDIUM
+    # Explicitly named level wins; a plain "да" confirms the proposed one
+    level = find_level_mention(message.text or "")
+    proposed = data.get("proposed_level")
+    if level is None and proposed and is_confirmation(message.text or ""):
+        level = BusinessLevel(proposed)
 
+    history = await get_recent_turns(session, business.id)
     await add_message(session, business, "user", message.text)
+    priority = priority_for_plan(await get_user_plan(session, message.from_user.id))
 
     if level:
         business.level = level
         business.current_step = FlowStep.PROFILE
-        await session.commit()
+        after_commit(session, invalidate_project_list, business.user_id)
 
         # Transition to active chat
         await state.set_state(ChatState.active)
@@ -168,15 +210,18 @@ async def handle_level_confirmation(
         # Get first question for profile step from Claude
         from bot.services.claude import chat as claude_chat
         greeting = f"Отлично, уровень подтверждён. Переходим к знакомству."
-        response, in_tok, out_tok = await claude_chat(business, greeting)
+        response, in_tok, out_tok = await claude_chat(business, greeting, priority, history=history)
         await add_message(session, business, "assistant", response, in_tok, out_tok)
-        await session.commit()
 
         await message.answer(response, parse_mode="Markdown")
     else:
         # Let Claude handle ambiguous confirmation
         from bot.services.claude import chat as claude_chat
-        response, in_tok, out_tok = await claude_chat(business, message.text)
+        response, in_tok, out_tok = await claude_chat(business, message.text, priority, history=history)
         await add_message(session, business, "assistant", response, in_tok, out_tok)
-        await session.commit()
+
+        # Claude may have proposed a different level — the next "да" confirms that one
+        reproposed = find_level_mention(response)
+        if reproposed:
+            await state.update_data(proposed_level=reproposed.value)
         await message.answer(response, parse_mode="Markdown")
@@ -7,15 +7,24 @@ Flow:
 3. If no businesses → initiate onboarding (Step 0)
 """
 
+import tempfile
+from pathlib import Path
+
 from aiogram import Router, F
-from aiogram.filters import CommandStart, Command
-from aiogram.types import Message, CallbackQuery
+from aiogram.filters import CommandStart, Command, CommandObject
+from aiogram.types import FSInputFile, Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from bot.db.repositories.business import get_or_create_user, get_user_businesses, create_business
+from bot.db.repositories.business import (
+    get_or_create_user,
+    get_project_summaries,
+    create_business,
+    get_active_business,
+)
 from bot.keyboards.inline import projects_keyboard, new_project_keyboard
 from bot.handlers.states import OnboardingState
+from bot.services.export import FORMATS, ExportTooLarge, export_business
 
 router = Router()
 
@@ -30,9 +39,8 @@ async def cmd_start(message: Message, session: AsyncSession, state: FSMContext)
         username=message.from_user.username,
         language_code=message.from_user.language_code or "ru",
     )
-    await session.commit()
 
-    businesses = await get_user_businesses(session, user.id)
+    businesses = await get_project_summaries(session, user.id)
 
     if not businesses:
         await state.set_state(OnboardingState.waiting_for_level_answers)
@@ -61,7 +69,7 @@ async def cmd_new_project(message: Message, session: AsyncSession, state: FSMCon
         telegram_id=message.from_user.id,
         first_name=message.from_user.first_name,
     )
-    businesses = await get_user_businesses(session, user.id)
+    businesses = await get_project_summaries(session, user.id)
 
     if len(businesses) >= user.max_projects:
         await message.answer(
@@ -83,7 +91,7 @@ async def cmd_new_project(message: Message, session: AsyncSession, state: FSMCon
 
 @router.message(Command("projects"))
 async def cmd_projects(message: Message, session: AsyncSession) -> None:
-    businesses = await get_user_businesses(session, message.from_user.id)
+    businesses = await get_project_summaries(session, message.from_user.id)
     if not businesses:
         await message.answer("У тебя пока нет проектов. Напиши /start чтобы создать первый.")
         return
@@ -104,6 +112,35 @@ async def cmd_delete_data(message: Message) -> None:
     )
 
 
+@router.message(Command("export"))
+async def cmd_export(
+    message: Message, command: CommandObject, session: AsyncSession, state: FSMContext
+) -> None:
+    """/export [md|jsonl] — documents and full history of the active project as a file."""
+    fmt = (command.args or "md").strip().lower()
+    if fmt not in FORMATS:
+        await message.answer("Формат: /export md или /export jsonl")
+        return
+
+    business_id = (await state.get_data()).get("business_id")
+    business = business_id and await get_active_business(session, message.from_user.id, business_id)
+    if not business:
+        await message.answer("Выбери проект командой /projects, затем повтори /export")
+        return
+
+    await message.bot.send_chat_action(message.chat.id, "upload_document")
+    with tempfile.TemporaryDirectory(prefix="export-") as directory:
+        try:
+            export = await export_business(session, business, fmt, Path(directory))
+        except ExportTooLarge:
+            await message.answer("История проекта слишком большая для отправки файлом в Telegram.")
+            return
+        await message.answer_document(
+            FSInputFile(export.path, filename=export.filename),
+            caption=f"📦 {business.name}: документы и {export.messages} сообщений",
+        )
+
+
 @router.message(Command("settings"))
 async def cmd_settings(message: Message, session: AsyncSession) -> None:
     from bot.keyboards.inline import settings_keyboard
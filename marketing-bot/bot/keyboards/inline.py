@@ -1,7 +1,8 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from bot.db.models import Business, User, BusinessLevel
+from bot.db.models import User, BusinessLevel
+from bot.db.repositories.business import ProjectSummary
 
 LEVEL_EMOJI = {
     BusinessLevel.MICRO: "🟢",
@@ -10,7 +11,7 @@ LEVEL_EMOJI = {
 }
 
 
-def projects_keyboard(businesses: list[Business]) -> InlineKeyboardMarkup:
+def projects_keyboard(businesses: list[ProjectSummary]) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     for b in businesses:
         emoji = LEVEL_EMOJI.get(b.level, "⚪️")
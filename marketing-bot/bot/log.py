@@ -0,0 +1,123 @@
+"""
+Logging pipeline: structlog and stdlib logging → one bounded queue → a
+background thread that renders and writes.
+
+The event loop only builds the event dict and enqueues the record; JSON
+rendering and the blocking write to stdout happen in a QueueListener thread.
+When the queue is full the record is dropped and counted instead of blocking.
+
+Noisy loggers are sampled by name prefix (LOG_SAMPLING), e.g. SQL echo
+("sqlalchemy.engine") and aiogram's per-update lines ("aiogram.event").
+Sampling applies to INFO and below; warnings and errors are always written.
+"""
+
+import atexit
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+import structlog
+
+from bot.config import settings
+from bot.services.metrics import LOG_RECORDS_DROPPED
+from bot.tracing import add_trace_ids
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a `rate` share of INFO/DEBUG records per logger-name prefix (longest prefix wins)."""
+
+    def __init__(self, rates: dict[str, float]) -> None:
+        super().__init__()
+        self.rules = sorted(rates.items(), key=lambda rule: -len(rule[0]))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rules:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return random.random() < rate
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the caller and leaves formatting to the listener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The default prepare() formats in the caller thread and would turn
+        # structlog's event dict into a string before ProcessorFormatter sees it
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class DrainingQueueListener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Blocking put: on a full queue stop() waits for it to drain instead of failing
+        self.queue.put(self._sentinel)
+
+    def stop(self) -> None:
+        if self._thread is not None:   # idempotent: explicit stop + atexit
+            super().stop()
+
+
+def setup_logging() -> QueueListener:
+    """Configure structlog + stdlib logging once at process start. Returns the started listener."""
+    shared = [
+        structlog.contextvars.merge_contextvars,
+        structlog.stdlib.add_logger_name,
+        structlog.stdlib.add_log_level,
+        structlog.processors.TimeStamper(fmt="iso", utc=True),
+    ]
+    renderer = (
+        structlog.dev.ConsoleRenderer()
+        if settings.log_format == "console"
+        else structlog.processors.JSONRenderer(ensure_ascii=False)
+    )
+
+    structlog.configure(
+        processors=[
+            structlog.stdlib.filter_by_level,
+            *shared,
+            add_trace_ids,    # текущий спан есть только в вызывающем потоке
+            structlog.processors.StackInfoRenderer(),
+            # exc_info=True must be resolved here: the listener thread has no current exception
+            structlog.processors.format_exc_info,
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(structlog.stdlib.ProcessorFormatter(
+        foreign_pre_chain=shared,
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            structlog.processors.format_exc_info,
+            renderer,
+        ],
+    ))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(settings.log_sampling))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(settings.log_level)
+
+    # SQL echo идёт через общий конвейер и сэмплинг, а не через echo=True движка
+    if settings.database_echo:
+        logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+
+    listener = DrainingQueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)   # flushes what is still queued
+    return listener
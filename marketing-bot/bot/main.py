@@ -7,29 +7,68 @@ Supports two modes:
 """
 
 import asyncio
-import logging
 import traceback
+from datetime import datetime, timezone
 
 import structlog
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.redis import RedisStorage
 from aiogram.types import ErrorEvent
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiohttp import web
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from bot.config import settings
-from bot.db import create_tables, async_session_factory
+from bot.db import verify_schema_revision, async_session_factory, replica_engine, routing_session_factory
+from bot.db.redis import redis
+from bot.log import setup_logging
 from bot.handlers import start, chat, callbacks
+from bot.middlewares.admission import AdmissionMiddleware
 from bot.middlewares.db import DbSessionMiddleware
+from bot.middlewares.dedup import UpdateDedupMiddleware
+from bot.middlewares.profiler import HandlerTagMiddleware, SlowUpdateProfilerMiddleware
+from bot.middlewares.tracing import BotApiTracingMiddleware, TracedRedisStorage, UpdateTracingMiddleware
+from bot.services.archive import run_maintenance
+from bot.services.claude import get_batch_backend
+from bot.services.metrics import start_metrics_server
+from bot.services.weekly_reports import collect_reports, pending_batch_ids, run_weekly_reports
+from bot.tracing import setup_tracing
 
 log = structlog.get_logger()
 
+scheduler = AsyncIOScheduler(timezone="UTC")
+
 
 async def on_startup(bot: Bot) -> None:
-    await create_tables()
-    log.info("Database tables ready")
+    revision = await verify_schema_revision()
+    log.info("Database schema up to date", revision=revision)
+
+    if start_metrics_server():
+        log.info("Metrics exposed", port=settings.metrics_port)
+
+    # Партиции messages + архивация старых месяцев: при старте и каждую ночь
+    scheduler.add_job(
+        run_maintenance, "cron", hour=3,
+        id="messages_maintenance", replace_existing=True,
+        next_run_time=datetime.now(timezone.utc),
+    )
+
+    if settings.weekly_reports_enabled:
+        scheduler.add_job(
+            run_weekly_reports, "cron",
+            day_of_week=settings.weekly_reports_day, hour=settings.weekly_reports_hour,
+            args=[bot], id="weekly_reports", replace_existing=True,
+        )
+        # Добрать результаты пакетов, отправленных до перезапуска
+        for batch_id in await pending_batch_ids():
+            scheduler.add_job(
+                collect_reports, args=[bot, get_batch_backend(), batch_id],
+                id=f"weekly_reports:{batch_id}", replace_existing=True,
+                next_run_time=datetime.now(timezone.utc),
+            )
+
+    scheduler.start()
 
     if settings.is_production and settings.webhook_url:
         await bot.set_webhook(
@@ -44,16 +83,20 @@ async def on_startup(bot: Bot) -> None:
 
 
 async def on_shutdown(bot: Bot) -> None:
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
     if settings.is_production:
         await bot.delete_webhook()
     log.info("Bot stopped")
 
 
 def create_bot() -> Bot:
-    return Bot(
+    bot = Bot(
         token=settings.telegram_bot_token,
         default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN),
     )
+    bot.session.middleware(BotApiTracingMiddleware())
+    return bot
 
 
 async def on_error(event: ErrorEvent) -> None:
@@ -66,11 +109,44 @@ async def on_error(event: ErrorEvent) -> None:
 
 
 def create_dispatcher() -> Dispatcher:
-    storage = RedisStorage.from_url(settings.redis_url)
+    storage = TracedRedisStorage(redis=redis)
     dp = Dispatcher(storage=storage)
 
-    # Middleware — inject DB session into every handler
-    dp.update.middleware(DbSessionMiddleware(session_factory=async_session_factory))
+    # Root span of every update (no-op unless TRACING_EXPORTER is set)
+    dp.update.outer_middleware(UpdateTracingMiddleware())
+
+    # Opt-in: keep a sampling profile of updates slower than PROFILER_THRESHOLD_MS
+    if settings.profiler_enabled:
+        dp.update.outer_middleware(SlowUpdateProfilerMiddleware(
+            threshold_ms=settings.profiler_threshold_ms,
+            interval_ms=settings.profiler_interval_ms,
+            directory=settings.profiler_dir,
+            max_disk_bytes=settings.profiler_max_disk_mb * 1024 * 1024,
+        ))
+        dp.message.middleware(HandlerTagMiddleware())
+        dp.callback_query.middleware(HandlerTagMiddleware())
+
+    # Outer middleware — drop Telegram redeliveries before any work is done
+    if settings.update_dedup_ttl:
+        dp.update.outer_middleware(UpdateDedupMiddleware(redis, settings.update_dedup_ttl))
+
+    # Outer middleware — in-flight cap with a bounded wait queue; overflow gets a busy reply
+    if settings.admission_max_in_flight:
+        dp.update.outer_middleware(AdmissionMiddleware(
+            max_in_flight=settings.admission_max_in_flight,
+            max_queued=settings.admission_max_queued,
+            queue_timeout=settings.admission_queue_timeout,
+        ))
+
+    # Middleware — one session and one transaction per update (read replica routing if configured)
+    replicated = replica_engine is not None
+    dp.update.middleware(DbSessionMiddleware(
+        session_factory=routing_session_factory if replicated else async_session_factory,
+        redis=redis if replicated else None,
+        sticky_seconds=settings.database_replica_sticky_seconds if replicated else 0,
+        round_trip_budget=settings.database_round_trip_budget,
+        strict=not settings.is_production,
+    ))
 
     # Routers
     dp.include_router(start.router)
@@ -110,7 +186,8 @@ def run_webhook() -> None:
 
 
 if __name__ == "__main__":
-    logging.basicConfig(level=settings.log_level)
+    setup_logging()
+    setup_tracing()
     if settings.is_production:
         run_webhook()
     else:
@@ -0,0 +1,73 @@
+import asyncio
+from collections.abc import Callable, Awaitable
+from typing import Any
+
+import structlog
+from aiogram import BaseMiddleware, Bot
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import TelegramObject, Update
+
+from bot.services.metrics import UPDATES_IN_FLIGHT, UPDATES_QUEUED, UPDATES_SHED
+
+log = structlog.get_logger()
+
+BUSY_MESSAGE = "⏳ Сейчас очень много запросов. Повтори, пожалуйста, через минуту."
+
+
+class AdmissionMiddleware(BaseMiddleware):
+    """
+    Caps the number of updates processed at once across the process.
+
+    At most `max_in_flight` updates run; up to `max_queued` more wait for a
+    slot, FIFO, for no longer than `queue_timeout` seconds. Anything beyond
+    that is shed: the user gets BUSY_MESSAGE (one Bot API call, no DB, no FSM)
+    instead of a reply minutes later. Outer middleware, after dedup.
+    """
+
+    def __init__(self, max_in_flight: int, max_queued: int, queue_timeout: float) -> None:
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._queued = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        if self._slots.locked():
+            if self._queued >= self.max_queued:
+                return await self._shed(event, data["bot"], "queue_full")
+            self._queued += 1
+            UPDATES_QUEUED.set(self._queued)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except TimeoutError:
+                return await self._shed(event, data["bot"], "timeout")
+            finally:
+                self._queued -= 1
+                UPDATES_QUEUED.set(self._queued)
+        else:
+            await self._slots.acquire()
+
+        UPDATES_IN_FLIGHT.inc()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATES_IN_FLIGHT.dec()
+            self._slots.release()
+
+    async def _shed(self, event: Update, bot: Bot, reason: str) -> None:
+        UPDATES_SHED.labels(update_type=event.event_type, reason=reason).inc()
+        log.warning("Update shed", update_id=event.update_id, update_type=event.event_type, reason=reason)
+        try:
+            if event.callback_query:
+                await bot.answer_callback_query(event.callback_query.id, text=BUSY_MESSAGE)
+            elif event.message:
+                await bot.send_message(event.message.chat.id, BUSY_MESSAGE)
+        except TelegramAPIError as e:
+            log.warning("Busy reply not delivered", update_id=event.update_id, error=repr(e))
@@ -1,16 +1,47 @@
 from collections.abc import Callable, Awaitable
-from typing import Any
+from typing import Any, Optional
 
+import structlog
 from aiogram import BaseMiddleware
-from aiogram.types import TelegramObject
+from aiogram.types import TelegramObject, Update, User
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 
+from bot.db import commit, count_round_trips
+from bot.services.metrics import DB_ROUND_TRIP_BUDGET_EXCEEDED, DB_ROUND_TRIPS
+
+log = structlog.get_logger()
+
 
 class DbSessionMiddleware(BaseMiddleware):
-    """Injects a DB session into every handler via data dict."""
+    """
+    Injects a DB session into every handler via data dict and owns its
+    transaction: one commit after the handler returns, rollback if it raises,
+    then the session's after_commit() callbacks.
+
+    With a routing session factory (bot.db.routing_session_factory) @read_only
+    repository reads may go to the replica. A user who wrote within
+    `sticky_seconds` gets a primary-only session, so the next update sees
+    their own writes despite replication lag.
 
-    def __init__(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+    An update making more than `round_trip_budget` database round trips is
+    logged; with `strict` it also fails with AssertionError (development).
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        redis: Optional[Redis] = None,
+        sticky_seconds: int = 0,
+        round_trip_budget: int = 0,
+        strict: bool = False,
+    ) -> None:
         self.session_factory = session_factory
+        self.redis = redis if sticky_seconds > 0 else None
+        self.sticky_seconds = sticky_seconds
+        self.round_trip_budget = round_trip_budget
+        self.strict = strict
 
     async def __call__(
         self,
@@ -18,6 +49,53 @@ class DbSessionMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: dict[str, Any],
     ) -> Any:
-        async with self.session_factory() as session:
-            data["session"] = session
-            return await handler(event, data)
+        user: Optional[User] = data.get("event_from_user")
+        sticky_key = f"db:wrote:{user.id}" if user and self.redis else None
+
+        with count_round_trips() as round_trips:
+            async with self.session_factory() as session:
+                if sticky_key:
+                    session.info["primary_only"] = await self._recently_wrote(sticky_key)
+                data["session"] = session
+                try:
+                    result = await handler(event, data)
+                except Exception:
+                    await session.rollback()
+                    raise
+                await commit(session)
+                if sticky_key and session.info.get("wrote"):
+                    await self._mark_wrote(sticky_key)
+
+        DB_ROUND_TRIPS.observe(len(round_trips))
+        if self.round_trip_budget and len(round_trips) > self.round_trip_budget:
+            self._over_budget(event, round_trips)
+        return result
+
+    def _over_budget(self, event: TelegramObject, round_trips: list[str]) -> None:
+        update_type = event.event_type if isinstance(event, Update) else type(event).__name__
+        DB_ROUND_TRIP_BUDGET_EXCEEDED.labels(update_type=update_type).inc()
+        log.warning(
+            "Update exceeded DB round-trip budget",
+            update_type=update_type,
+            round_trips=len(round_trips),
+            budget=self.round_trip_budget,
+            statements=round_trips,
+        )
+        # Транзакция уже закоммичена — ошибка только сигнализирует о регрессии
+        assert not self.strict, (
+            f"{len(round_trips)} DB round trips in one {update_type} update "
+            f"(DATABASE_ROUND_TRIP_BUDGET={self.round_trip_budget})"
+        )
+
+    async def _recently_wrote(self, key: str) -> bool:
+        try:
+            return bool(await self.redis.exists(key))
+        except RedisError as e:
+            log.warning("Replica routing: Redis unavailable, reading from primary", error=repr(e))
+            return True
+
+    async def _mark_wrote(self, key: str) -> None:
+        try:
+            await self.redis.set(key, 1, ex=self.sticky_seconds)
+        except RedisError as e:
+            log.warning("Replica routing: could not mark user write", error=repr(e))
@@ -0,0 +1,49 @@
+from collections.abc import Callable, Awaitable
+from typing import Any
+
+import structlog
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from bot.services.metrics import UPDATES_DEDUPLICATED
+
+log = structlog.get_logger()
+
+
+class UpdateDedupMiddleware(BaseMiddleware):
+    """
+    Drops updates whose update_id was already seen within `ttl` seconds.
+
+    Telegram redelivers a webhook update when the response is slow, so a long
+    Claude call could otherwise be paid for and answered twice. Registered as an
+    outer middleware, so duplicates never reach FSM, the DB session or handlers.
+    If Redis is unavailable the update is processed (fail open).
+    """
+
+    def __init__(self, redis: Redis, ttl: int) -> None:
+        self.redis = redis
+        self.ttl = ttl
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        key = f"dedup:update:{data['bot'].id}:{event.update_id}"
+        try:
+            first = await self.redis.set(key, 1, nx=True, ex=self.ttl)
+        except RedisError as e:
+            log.warning("Update dedup: Redis unavailable, processing anyway", error=repr(e))
+            first = True
+
+        if not first:
+            UPDATES_DEDUPLICATED.labels(update_type=event.event_type).inc()
+            log.info("Duplicate update dropped", update_id=event.update_id, update_type=event.event_type)
+            return None
+        return await handler(event, data)
@@ -0,0 +1,195 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Awaitable
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+import structlog
+from aiogram import BaseMiddleware
+from aiogram.fsm.context import FSMContext
+from aiogram.types import TelegramObject, Update
+
+from bot.services.metrics import SLOW_UPDATES_PROFILED
+
+log = structlog.get_logger()
+
+MAX_STACK_DEPTH = 200
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _fold(frame) -> str:
+    """Stack as one collapsed line, root first: 'a (x.py:1);b (y.py:7)'."""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame).replace(";", ":"))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class LoopSampler:
+    """
+    Samples the event loop thread's stack from a daemon thread while at least
+    one update is being profiled. Each sample goes to every active update.
+
+    It records what the loop runs while the update is in flight. That includes
+    other updates' CPU work, which is exactly what delays an update beyond its
+    own I/O. An idle loop shows up as selectors.select.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._active: dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._loop_thread_id: Optional[int] = None
+
+    def start(self) -> Counter:
+        """Begin collecting for one update (call from the event loop thread)."""
+        samples: Counter = Counter()
+        with self._lock:
+            self._active[id(samples)] = samples
+            if self._thread is None:
+                self._loop_thread_id = threading.get_ident()
+                self._thread = threading.Thread(target=self._run, name="update-profiler", daemon=True)
+                self._thread.start()
+        return samples
+
+    def stop(self, samples: Counter) -> None:
+        with self._lock:
+            self._active.pop(id(samples), None)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._thread = None   # следующий start() поднимет поток заново
+                    return
+                targets = list(self._active.values())
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = _fold(frame)
+            del frame
+            for samples in targets:
+                samples[stack] += 1
+
+
+class SlowUpdateProfilerMiddleware(BaseMiddleware):
+    """
+    Opt-in (PROFILER_ENABLED) sampling profiler around every update. The profile
+    is kept only if the update took longer than `threshold_ms`.
+
+    Saved as <stamp>_<ms>ms_<handler>.folded, in collapsed-stack format (one
+    "frame;frame;frame count" line per stack). flamegraph.pl, speedscope and
+    inferno read it directly. A .json sidecar holds the tags: handler, FSM
+    state, business id, update id and duration. The oldest profiles are
+    deleted to keep the directory under `max_disk_bytes`.
+    """
+
+    def __init__(self, threshold_ms: int, interval_ms: int, directory: str, max_disk_bytes: int) -> None:
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.sampler = LoopSampler(self.interval)
+        self.directory = Path(directory)
+        self.max_disk_bytes = max_disk_bytes
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        # Заполняется HandlerTagMiddleware уровнем ниже (тот же объект словаря)
+        tags = data["profile_tags"] = {}
+        samples = self.sampler.start()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.sampler.stop(samples)
+            elapsed = time.perf_counter() - started
+            if elapsed >= self.threshold and samples:
+                await self._save(event, data.get("state"), tags, samples, elapsed)
+
+    async def _save(
+        self, event: Update, state: Optional[FSMContext], tags: dict, samples: Counter, elapsed: float,
+    ) -> None:
+        meta = {
+            "update_id": event.update_id,
+            "update_type": event.event_type,
+            "handler": tags.get("handler", "unhandled"),
+            "fsm_state": None,
+            "business_id": None,
+            "duration_ms": round(elapsed * 1000),
+            "samples": sum(samples.values()),
+            "interval_ms": round(self.interval * 1000, 1),
+        }
+        if state is not None:
+            try:
+                meta["fsm_state"] = await state.get_state()
+                meta["business_id"] = (await state.get_data()).get("business_id")
+            except Exception as e:
+                log.warning("Profiler: FSM state unavailable", error=repr(e))
+
+        try:
+            path = await asyncio.to_thread(self._write, meta, samples)
+        except OSError as e:
+            log.warning("Profiler: could not save profile", error=repr(e))
+            return
+        SLOW_UPDATES_PROFILED.inc()
+        log.warning("Slow update profiled", profile=str(path), **meta)
+
+    def _write(self, meta: dict, samples: Counter) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        handler = meta["handler"].replace(".", "_").replace("<", "").replace(">", "")
+        path = self.directory / f"{stamp}_{meta['duration_ms']}ms_{handler}.folded"
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in samples.most_common()))
+        path.with_suffix(".json").write_text(json.dumps(meta, ensure_ascii=False))
+        self._enforce_disk_cap()
+        return path
+
+    def _enforce_disk_cap(self) -> None:
+        """Delete the oldest profiles (both files) until the directory fits the cap."""
+        files = sorted(self.directory.glob("*.folded"))   # имя начинается с времени
+        sizes = {
+            path: path.stat().st_size + (path.with_suffix(".json").stat().st_size if path.with_suffix(".json").exists() else 0)
+            for path in files
+        }
+        total = sum(sizes.values())
+        for path in files:
+            if total <= self.max_disk_bytes:
+                break
+            total -= sizes[path]
+            path.unlink(missing_ok=True)
+            path.with_suffix(".json").unlink(missing_ok=True)
+
+
+class HandlerTagMiddleware(BaseMiddleware):
+    """Inner middleware: records which handler ran, for the profile tags."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        tags = data.get("profile_tags")
+        if tags is not None:
+            callback = data["handler"].callback
+            tags["handler"] = f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+        return await handler(event, data)
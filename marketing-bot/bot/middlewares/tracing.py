@@ -0,0 +1,71 @@
+from collections.abc import Callable, Awaitable
+from typing import Any, Optional
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.fsm.storage.base import StateType, StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject, Update
+
+from bot.tracing import span
+
+
+class UpdateTracingMiddleware(BaseMiddleware):
+    """
+    Root span of every update. Registered as the first outer middleware, so
+    dedup, FSM, the DB session and the handler are all inside it.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+        user = data.get("event_from_user")
+        with span(
+            "telegram.update",
+            **{
+                "update.id": event.update_id,
+                "update.type": event.event_type,
+                "user.id": user.id if user else None,
+            },
+        ):
+            return await handler(event, data)
+
+
+class BotApiTracingMiddleware(BaseRequestMiddleware):
+    """A span per outbound Bot API call (sendMessage, editMessageText, …)."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        with span(f"telegram.{type(method).__name__}"):
+            return await make_request(bot, method)
+
+
+class TracedRedisStorage(RedisStorage):
+    """RedisStorage with a span per FSM read/write."""
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        with span("fsm.set_state"):
+            await super().set_state(key, state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        with span("fsm.get_state"):
+            return await super().get_state(key)
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        with span("fsm.set_data"):
+            await super().set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        with span("fsm.get_data"):
+            return await super().get_data(key)
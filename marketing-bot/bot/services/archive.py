@@ -0,0 +1,281 @@
+"""
+Cold-history archival for the partitioned messages table.
+
+Daily maintenance job:
+1. Create monthly partitions of messages ahead of time
+2. Move partitions older than messages_archive_after_months into
+   zstd-compressed JSONL files (one per month) and drop them from Postgres
+
+Keeps the hot table small enough for its working set to stay in shared_buffers.
+Archived history is still readable via iter_archived_messages() for exports.
+"""
+
+import asyncio
+import io
+import json
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+import structlog
+import zstandard
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from bot.config import settings
+from bot.db import engine
+from bot.db.models import FlowStep
+
+log = structlog.get_logger()
+
+PARTITION_PREFIX = "messages_p"
+COLUMNS = "id, business_id, role, content, step, input_tokens, output_tokens, created_at"
+BATCH_SIZE = 1000
+ZSTD_LEVEL = 10
+
+# Произвольный, но постоянный ключ: maintenance выполняет только одна реплика бота
+MAINTENANCE_LOCK_ID = 0x6D736773
+
+# Сколько DETACH PARTITION ждёт блокировку на messages
+DETACH_LOCK_TIMEOUT = "3s"
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def _add_months(d: date, months: int) -> date:
+    total = d.year * 12 + d.month - 1 + months
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y_%m}"
+
+
+def _month_from_partition(name: str) -> date | None:
+    """messages_p2026_01 → date(2026, 1, 1); None for messages_default."""
+    if not name.startswith(PARTITION_PREFIX):
+        return None
+    year, month = name[len(PARTITION_PREFIX):].split("_")
+    return date(int(year), int(month), 1)
+
+
+def archive_path(month: date) -> Path:
+    return Path(settings.archive_dir) / f"messages_{month:%Y_%m}.jsonl.zst"
+
+
+def _index_path(path: Path) -> Path:
+    """Sidecar with the business ids present in an archive — lets readers skip files."""
+    return path.with_name(path.name.removesuffix(".jsonl.zst") + ".idx.json")
+
+
+def _row_to_record(row) -> dict:
+    return {
+        "id": row["id"],
+        "business_id": row["business_id"],
+        "role": row["role"],
+        "content": row["content"],
+        "step": FlowStep[row["step"]].value if row["step"] else None,
+        "input_tokens": row["input_tokens"],
+        "output_tokens": row["output_tokens"],
+        "created_at": row["created_at"].isoformat(),
+    }
+
+
+# ─── Partitions ───────────────────────────────────────────────────────────────
+
+async def list_partitions() -> list[tuple[str, date]]:
+    """Monthly partitions currently attached to messages, oldest first."""
+    async with engine.connect() as conn:
+        result = await conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'messages'::regclass"
+        ))
+        names = result.scalars().all()
+
+    partitions = [(name, _month_from_partition(name)) for name in names]
+    return sorted((p for p in partitions if p[1]), key=lambda p: p[1])
+
+
+async def ensure_partitions(months_ahead: int | None = None) -> list[str]:
+    """Create partitions for the current month and `months_ahead` following ones."""
+    if months_ahead is None:
+        months_ahead = settings.messages_partitions_ahead
+
+    month = datetime.now(timezone.utc).date().replace(day=1)
+    created = []
+    async with engine.begin() as conn:
+        for _ in range(months_ahead + 1):
+            name = _partition_name(month)
+            exists = await conn.scalar(text("SELECT to_regclass(:name)"), {"name": name})
+            if not exists:
+                await conn.execute(text(
+                    f"CREATE TABLE {name} PARTITION OF messages "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+                ))
+                created.append(name)
+            month = _next_month(month)
+    return created
+
+
+# ─── Archival ─────────────────────────────────────────────────────────────────
+
+async def archive_partition(name: str, month: date) -> int:
+    """
+    Stream one partition into its archive file, then detach and drop it.
+    The partition is dropped only if its row count still matches what was written.
+    If the detach transaction fails for any reason the partition is kept and
+    the file removed. A lock wait longer than DETACH_LOCK_TIMEOUT is expected
+    and returns 0 (the next run retries); other errors are re-raised.
+    Returns the number of archived rows.
+    """
+    path = archive_path(month)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+
+    business_ids: set[int] = set()
+    count = 0
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+
+    async with engine.connect() as conn:
+        result = await conn.stream(text(
+            f"SELECT {COLUMNS} FROM {name} ORDER BY business_id, created_at"
+        ))
+        with open(tmp, "wb") as fh, compressor.stream_writer(fh) as writer:
+            async for batch in result.mappings().partitions(BATCH_SIZE):
+                chunk = b"".join(
+                    json.dumps(_row_to_record(row), ensure_ascii=False).encode() + b"\n"
+                    for row in batch
+                )
+                await asyncio.to_thread(writer.write, chunk)
+                business_ids.update(row["business_id"] for row in batch)
+                count += len(batch)
+
+    tmp.replace(path)
+    _index_path(path).write_text(json.dumps({"rows": count, "business_ids": sorted(business_ids)}))
+
+    # DETACH берёт ACCESS EXCLUSIVE на messages и, пока ждёт открытые транзакции
+    # апдейтов, блокирует всем остальным чтение и запись. Поэтому ждём не дольше
+    # lock_timeout и повторяем на следующем запуске. DETACH ... CONCURRENTLY
+    # недоступен: у messages есть DEFAULT-партиция
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'"))
+            current = await conn.scalar(text(f"SELECT count(*) FROM {name}"))
+            if current != count:
+                raise RuntimeError(f"{name}: {current} rows in table, {count} archived — partition kept")
+            await conn.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+            await conn.execute(text(f"DROP TABLE {name}"))
+    except Exception as e:
+        # Транзакция откатилась, месяц остался в базе — архив убираем при любой
+        # ошибке, иначе /export и история прочитают его дважды
+        path.unlink(missing_ok=True)
+        _index_path(path).unlink(missing_ok=True)
+        if not (isinstance(e, DBAPIError) and getattr(e.orig, "sqlstate", None) == LOCK_NOT_AVAILABLE):
+            raise
+        log.warning("Partition busy, archival postponed to the next run", partition=name, lock_timeout=DETACH_LOCK_TIMEOUT)
+        return 0
+
+    log.info("Partition archived", partition=name, rows=count, file=str(path))
+    return count
+
+
+async def archive_old_partitions(older_than_months: int | None = None) -> int:
+    """Archive every partition whose whole month ended more than N months ago."""
+    if older_than_months is None:
+        older_than_months = settings.messages_archive_after_months
+
+    cutoff = _add_months(datetime.now(timezone.utc).date().replace(day=1), -older_than_months)
+    total = 0
+    for name, month in await list_partitions():
+        if _next_month(month) <= cutoff:
+            total += await archive_partition(name, month)
+    return total
+
+
+async def run_maintenance() -> None:
+    """Scheduled daily. Holds a Postgres advisory lock so replicas don't race."""
+    # Сессионная блокировка на autocommit-соединении: иначе SELECT открыл бы транзакцию,
+    # и соединение висело бы "idle in transaction" всю архивацию (горизонт VACUUM,
+    # idle_in_transaction_session_timeout)
+    async with engine.execution_options(isolation_level="AUTOCOMMIT").connect() as conn:
+        locked = await conn.scalar(text("SELECT pg_try_advisory_lock(:id)"), {"id": MAINTENANCE_LOCK_ID})
+        if not locked:
+            log.info("Messages maintenance already running elsewhere")
+            return
+        try:
+            created = await ensure_partitions()
+            archived = await archive_old_partitions()
+            log.info("Messages maintenance done", created=created, archived_rows=archived)
+        except Exception as e:
+            log.error("Messages maintenance failed", error=repr(e))
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MAINTENANCE_LOCK_ID})
+
+
+# ─── Reading cold history ─────────────────────────────────────────────────────
+
+def _archive_files() -> list[Path]:
+    return sorted(Path(settings.archive_dir).glob("messages_*.jsonl.zst"))
+
+
+def _archived_business_ids(path: Path) -> set[int]:
+    index = _index_path(path)
+    if not index.exists():
+        return set()
+    return set(json.loads(index.read_text())["business_ids"])
+
+
+def _read_archive(path: Path) -> Iterator[dict]:
+    with open(path, "rb") as fh, zstandard.ZstdDecompressor().stream_reader(fh) as reader:
+        for line in io.TextIOWrapper(reader, encoding="utf-8"):
+            yield json.loads(line)
+
+
+def iter_archived_messages(business_id: int) -> Iterator[dict]:
+    """
+    Yield archived messages of one business, oldest first, as plain dicts.
+    Blocking file IO — call from a thread when used inside the event loop.
+    """
+    for path in _archive_files():
+        if business_id not in _archived_business_ids(path):
+            continue
+        seen = False
+        for record in _read_archive(path):
+            if record["business_id"] == business_id:
+                seen = True
+                yield record
+            elif seen:
+                break  # rows are sorted by business_id
+
+
+def purge_archived(business_ids: set[int]) -> int:
+    """
+    Remove the given businesses from every archive (data deletion requests).
+    Rewrites only the files that contain them. Returns the number of removed rows.
+    """
+    removed = 0
+    for path in _archive_files():
+        present = _archived_business_ids(path)
+        if not present & business_ids:
+            continue
+
+        tmp = path.with_name(path.name + ".tmp")
+        kept = 0
+        with open(tmp, "wb") as fh, zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(fh) as writer:
+            for record in _read_archive(path):
+                if record["business_id"] in business_ids:
+                    removed += 1
+                    continue
+                writer.write(json.dumps(record, ensure_ascii=False).encode() + b"\n")
+                kept += 1
+
+        tmp.replace(path)
+        _index_path(path).write_text(json.dumps({
+            "rows": kept,
+            "business_ids": sorted(present - business_ids),
+        }))
+    return removed
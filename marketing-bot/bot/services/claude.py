@@ -4,135 +4,679 @@ Claude API service — the brain of the marketing agent.
 Manages:
 - Building conversation context from DB history
 - Sending requests to Claude with the right system prompt
-- Tracking token usage
-- Retry logic with exponential backoff
+- Routing each turn to a model and output budget by step and level
+- Tracking token usage, latency and cost per route
+- Profiling input size per context section (services/context_profile.py)
+- Prompt caching of the stable system prompt prefix, and its pre-warming
+- Retries that honour retry-after, under the global concurrency governor
+- Offline batch jobs via the Message Batches API (with a local stub backend)
 """
 
 import asyncio
-from typing import AsyncGenerator
+import itertools
+import json
+import time
+from typing import TYPE_CHECKING, AsyncGenerator, NamedTuple, Optional
 
-import anthropic
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_exponential,
-    retry_if_exception_type,
-)
+import structlog
 
 from bot.config import settings
+from bot.agent.documents import STEP_DOCUMENTS, STEP_TOOL_INSTRUCTION, step_tool
 from bot.agent.prompts import get_system_prompt
-from bot.db.models import Business, Message
+from bot.db.models import Business, BusinessLevel, FlowStep, Message
+from bot.services import context_profile
+from bot.services.governor import Priority, governor
+from bot.services.metrics import PROMPT_CACHE_TOKENS
+from bot.tracing import span, start_span, traced
 
+if TYPE_CHECKING:
+    import anthropic
+
+log = structlog.get_logger()
 
 # Max messages to include in context window (to control costs)
 MAX_CONTEXT_MESSAGES = 40
 
-client = anthropic.AsyncAnthropic(api_key=settings.anthropic_api_key)
+_client: Optional["anthropic.AsyncAnthropic"] = None
 
 
-def _build_context_messages(business: Business) -> list[dict]:
+def get_client() -> "anthropic.AsyncAnthropic":
     """
-    Build the messages array for the Claude API from the business's
-    conversation history. Trims to MAX_CONTEXT_MESSAGES to control costs.
+    The Anthropic client, created on first use: importing the SDK (with httpx
+    and httpcore) is the largest avoidable part of cold start.
     """
-    messages = business.messages[-MAX_CONTEXT_MESSAGES:]
-    return [{"role": msg.role, "content": msg.content} for msg in messages]
+    global _client
+    if _client is None:
+        import anthropic
 
+        # Retries are ours (see _create_message): the SDK's own would bypass the governor
+        _client = anthropic.AsyncAnthropic(api_key=settings.anthropic_api_key, max_retries=0)
+    return _client
 
-def _build_system_prompt(business: Business) -> str:
+MAX_ATTEMPTS = 4
+
+# Кэш промпта Anthropic живёт 5 минут с последнего обращения
+PROMPT_CACHE_CONTROL = {"type": "ephemeral"}
+PROMPT_CACHE_TTL = 300
+
+
+# ─── Model routing ────────────────────────────────────────────────────────────
+
+class Route(NamedTuple):
+    name: str
+    model: str
+    max_tokens: int
+
+
+# (step, level) → (tier, max_tokens). level=None — значение по умолчанию для шага.
+# "large" — settings.anthropic_model, "fast" — settings.anthropic_fast_model.
+# Большая модель — только для генерации стратегии и контент-плана.
+ROUTING_TABLE: dict[tuple[FlowStep, Optional[BusinessLevel]], tuple[str, int]] = {
+    (FlowStep.ONBOARDING, None): ("fast", 1024),
+    (FlowStep.PROFILE, None): ("fast", 1024),
+    (FlowStep.PROFILE, BusinessLevel.MEDIUM): ("fast", 2048),
+    (FlowStep.AUDIT, None): ("fast", 2048),
+    (FlowStep.AUDIT, BusinessLevel.MEDIUM): ("fast", 4096),
+    (FlowStep.STRATEGY, BusinessLevel.MICRO): ("large", 3072),
+    (FlowStep.STRATEGY, BusinessLevel.SMALL): ("large", 6144),
+    (FlowStep.STRATEGY, BusinessLevel.MEDIUM): ("large", 8192),
+    (FlowStep.CONTENT_PLAN, BusinessLevel.MICRO): ("large", 4096),
+    (FlowStep.CONTENT_PLAN, None): ("large", 8192),
+    (FlowStep.GENERATION, None): ("fast", 4096),
+    (FlowStep.CYCLE, None): ("fast", 2048),
+    (FlowStep.CYCLE, BusinessLevel.MEDIUM): ("fast", 4096),
+}
+
+DEFAULT_ROUTE = ("large", 4096)
+
+# Короткий вопрос посреди "тяжёлого" шага ("а что такое CPA?") не требует большой модели
+SHORT_TURN_CHARS = 200
+SHORT_TURN_MAX_TOKENS = 1024
+
+# USD per 1M tokens (input, output), by model-id prefix — for cost logging only
+MODEL_PRICING = {
+    "claude-opus-4": (15.0, 75.0),
+    "claude-sonnet-4": (3.0, 15.0),
+    "claude-haiku-4-5": (1.0, 5.0),
+    "claude-3-5-haiku": (0.8, 4.0),
+}
+
+
+def _is_short_turn(user_message: str) -> bool:
+    text = user_message.strip()
+    return len(text) <= SHORT_TURN_CHARS and text.endswith("?")
+
+
+def select_route(business: Business, user_message: str) -> Route:
+    """Pick model and max_tokens for this turn from ROUTING_TABLE."""
+    step = business.current_step
+    tier, max_tokens = ROUTING_TABLE.get(
+        (step, business.level),
+        ROUTING_TABLE.get((step, None), DEFAULT_ROUTE),
+    )
+    name = f"{step.value}:{business.level.value if business.level else '-'}"
+
+    if tier == "large" and _is_short_turn(user_message):
+        tier, max_tokens = "fast", SHORT_TURN_MAX_TOKENS
+        name += ":short"
+
+    if not settings.anthropic_routing_enabled:
+        tier = "large"
+
+    model = settings.anthropic_model if tier == "large" else settings.anthropic_fast_model
+    return Route(name=name, model=model, max_tokens=max_tokens)
+
+
+# Запись в кэш промпта дороже обычного input, чтение — в 10 раз дешевле
+CACHE_WRITE_PRICE_FACTOR = 1.25
+CACHE_READ_PRICE_FACTOR = 0.1
+
+
+def estimate_cost(
+    model: str, input_tokens: int, output_tokens: int,
+    cache_write_tokens: int = 0, cache_read_tokens: int = 0,
+) -> float:
+    """USD for one call; input_tokens are the uncached ones, as the API reports them."""
+    for prefix, (input_price, output_price) in MODEL_PRICING.items():
+        if model.startswith(prefix):
+            input_units = (
+                input_tokens
+                + cache_write_tokens * CACHE_WRITE_PRICE_FACTOR
+                + cache_read_tokens * CACHE_READ_PRICE_FACTOR
+            )
+            return (input_units * input_price + output_tokens * output_price) / 1_000_000
+    return 0.0
+
+
+def cache_usage(usage) -> tuple[int, int]:
+    """(cache_write_tokens, cache_read_tokens) of a response; 0 when nothing was cached."""
+    return (
+        getattr(usage, "cache_creation_input_tokens", None) or 0,
+        getattr(usage, "cache_read_input_tokens", None) or 0,
+    )
+
+
+def total_input_tokens(usage) -> int:
+    """The whole prompt size: uncached input plus what was written to / read from the cache."""
+    return usage.input_tokens + sum(cache_usage(usage))
+
+
+def _set_usage_attributes(current, usage, attempt: int) -> None:
+    cache_write, cache_read = cache_usage(usage)
+    current.set_attributes({
+        "claude.input_tokens": usage.input_tokens,
+        "claude.output_tokens": usage.output_tokens,
+        "claude.cache_write_tokens": cache_write,
+        "claude.cache_read_tokens": cache_read,
+        "claude.attempts": attempt,
+    })
+
+
+def _log_call(route: Route, started: float, usage, **extra) -> None:
+    cache_write, cache_read = cache_usage(usage)
+    PROMPT_CACHE_TOKENS.labels(kind="write").inc(cache_write)
+    PROMPT_CACHE_TOKENS.labels(kind="read").inc(cache_read)
+    log.info(
+        "Claude call",
+        route=route.name,
+        model=route.model,
+        max_tokens=route.max_tokens,
+        latency_ms=round((time.perf_counter() - started) * 1000),
+        input_tokens=usage.input_tokens,
+        output_tokens=usage.output_tokens,
+        cache_write_tokens=cache_write,
+        cache_read_tokens=cache_read,
+        cost_usd=round(estimate_cost(route.model, usage.input_tokens, usage.output_tokens, cache_write, cache_read), 6),
+        **extra,
+    )
+
+
+def _is_compacted(business: Business, step: Optional[FlowStep]) -> bool:
     """
-    Build the full system prompt with injected business context.
-    This way the model always has the latest profile data, even mid-conversation.
+    Turns of a finished step whose approved document is already in the system
+    prompt — they are not resent as history.
     """
-    level = business.level.value if business.level else None
-    step = business.current_step.value
+    if step is None or step == business.current_step:
+        return False
+    if step == FlowStep.ONBOARDING:
+        return business.level is not None
+    column = STEP_DOCUMENTS.get(step)
+    return bool(column and getattr(business, column))
 
-    base = get_system_prompt(level, step)
 
-    # Inject current business profile as context
-    context_parts = []
+def _build_context_messages(business: Business, history: Optional[list] = None) -> list[dict]:
+    """
+    Build the messages array for the Claude API from the conversation history:
+    `history` (recent turns, see repositories/history.py) or, if not given,
+    the loaded business.messages. Steps with an approved document are
+    represented by that document in the system prompt instead of their turns.
+    Trims to MAX_CONTEXT_MESSAGES to control costs.
+    """
+    if history is None:
+        history = business.messages
+    kept = [i for i, msg in enumerate(history) if not _is_compacted(business, msg.step)]
+    kept = kept[-MAX_CONTEXT_MESSAGES:]
 
-    if business.profile:
-        import json
-        context_parts.append(
-            f"## Текущий профиль бизнеса\n```json\n{json.dumps(business.profile, ensure_ascii=False, indent=2)}\n```"
-        )
+    # The API requires a user turn first. If the window starts with an assistant
+    # turn (e.g. the first question of a new step), pull in the user turn before it.
+    if kept and history[kept[0]].role != "user":
+        if kept[0] > 0 and history[kept[0] - 1].role == "user":
+            kept.insert(0, kept[0] - 1)
+        else:
+            kept = kept[1:]
 
-    if business.audit_result:
-        import json
-        context_parts.append(
-            f"## Утверждённый чекап\n```json\n{json.dumps(business.audit_result, ensure_ascii=False, indent=2)}\n```"
-        )
+    return [{"role": history[i].role, "content": history[i].content} for i in kept]
 
-    if business.strategy:
-        import json
-        context_parts.append(
-            f"## Утверждённая стратегия\n```json\n{json.dumps(business.strategy, ensure_ascii=False, indent=2)}\n```"
-        )
+
+# Документы, которые подставляются в системный промпт: (колонка Business, заголовок)
+PROMPT_DOCUMENTS = [
+    ("profile", "Текущий профиль бизнеса"),
+    ("audit_result", "Утверждённый чекап"),
+    ("strategy", "Утверждённая стратегия"),
+    ("content_plan", "Утверждённый контент-план"),
+]
+
+WEBSITE_PREVIEW_CHARS = 2000
+
+
+def _system_prompt_sections(business: Business) -> list[tuple[str, str]]:
+    """
+    The system prompt as named sections, in order: the level/step prompt,
+    each approved document, the site preview. Names are what the context
+    profiler reports (see services/context_profile.py).
+    """
+    level = business.level.value if business.level else None
+    step = business.current_step.value
+
+    sections = [("level_prompt", get_system_prompt(level, step))]
+
+    # Inject current business profile and approved documents as context
+    sections.extend(
+        (column, f"## {title}\n```json\n{json.dumps(getattr(business, column), ensure_ascii=False, indent=2)}\n```")
+        for column, title in PROMPT_DOCUMENTS
+        if getattr(business, column)
+    )
 
     if business.website_content:
         # Only include a trimmed preview of scraped content
-        preview = business.website_content[:2000]
-        context_parts.append(f"## Содержимое сайта (извлечено автоматически)\n{preview}")
+        preview = business.website_content[:WEBSITE_PREVIEW_CHARS]
+        sections.append(("website_preview", f"## Содержимое сайта (извлечено автоматически)\n{preview}"))
+
+    return sections
 
-    if context_parts:
-        base += "\n\n---\n\n" + "\n\n".join(context_parts)
 
+def _join_system_prompt(sections: list[tuple[str, str]]) -> str:
+    (_, base), *context_parts = sections
+    if context_parts:
+        base += "\n\n---\n\n" + "\n\n".join(text for _, text in context_parts)
     return base
 
 
-@retry(
-    retry=retry_if_exception_type((anthropic.APIConnectionError, anthropic.RateLimitError)),
-    wait=wait_exponential(multiplier=1, min=2, max=30),
-    stop=stop_after_attempt(4),
-)
+def _system_param(stable: str, volatile: str = "") -> list[dict]:
+    """
+    System prompt as API blocks. The stable prefix (level prompt, documents,
+    site preview) ends with a cache breakpoint, so consecutive turns and the
+    pre-warm request share it. Per-turn parts (recall, tool instruction) go
+    after the breakpoint.
+    """
+    blocks = [{"type": "text", "text": stable, "cache_control": PROMPT_CACHE_CONTROL}]
+    if volatile:
+        blocks.append({"type": "text", "text": volatile})
+    return blocks
+
+
+def _build_system_prompt(business: Business) -> str:
+    """
+    Build the full system prompt with injected business context.
+    This way the model always has the latest profile data, even mid-conversation.
+    """
+    return _join_system_prompt(_system_prompt_sections(business))
+
+
+# ─── Retries ──────────────────────────────────────────────────────────────────
+
+def _retry_after(error: "anthropic.APIStatusError") -> Optional[float]:
+    value = error.response.headers.get("retry-after")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+async def _handle_retryable(error: Exception, attempt: int, started: Optional[float] = None) -> None:
+    """
+    Back off before the next attempt, or re-raise if attempts are exhausted.
+    `started` is the governor slot's start time of the failed attempt.
+    """
+    if attempt >= MAX_ATTEMPTS:
+        raise error
+
+    import anthropic
+
+    delay = min(30, 2 ** attempt)
+    if isinstance(error, anthropic.APIStatusError):
+        delay = _retry_after(error) or delay
+        if error.status_code in (429, 529):
+            # Governor pauses every lane until retry-after and halves concurrency
+            # (once per burst of overloads)
+            await governor.on_overload(delay, started)
+            delay = 0
+
+    log.warning("Claude call failed, retrying", error=repr(error), attempt=attempt)
+    if delay:
+        await asyncio.sleep(delay)
+
+
+def _retryable_errors() -> tuple[type[Exception], ...]:
+    # Evaluated only when an exception is being matched — the SDK is loaded by then
+    import anthropic
+
+    return anthropic.APIConnectionError, anthropic.RateLimitError, anthropic.InternalServerError
+
+
+async def _create_message(
+    route: Route,
+    system: str | list[dict],
+    messages: list[dict],
+    priority: Priority,
+    tools: Optional[list[dict]] = None,
+):
+    """messages.create under the governor; retries repeat only the API call."""
+    extra = {"tools": tools} if tools else {}
+    with span("claude.messages.create", route=route.name, model=route.model, priority=priority.name) as current:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            slot_started = None
+            try:
+                async with governor.slot(priority) as slot_started:
+                    started = time.perf_counter()
+                    response = await get_client().messages.create(
+                        model=route.model,
+                        max_tokens=route.max_tokens,
+                        system=system,
+                        messages=messages,
+                        **extra,
+                    )
+                governor.on_success()
+                break
+            except _retryable_errors() as e:
+                current.add_event("retry", {"attempt": attempt, "error": repr(e)})
+                await _handle_retryable(e, attempt, slot_started)
+
+        _log_call(route, started, response.usage, stop_reason=response.stop_reason, attempt=attempt)
+        _set_usage_attributes(current, response.usage, attempt)
+    return response
+
+
 async def chat(
     business: Business,
     user_message: str,
+    priority: Priority = Priority.TRIAL,
+    history: Optional[list] = None,
+    recall: Optional[str] = None,
 ) -> tuple[str, int, int]:
     """
     Send a message to Claude and get a response.
+    The prompt is built once; retries only repeat the API call.
 
     Returns:
         (response_text, input_tokens, output_tokens)
     """
-    system_prompt = _build_system_prompt(business)
-    messages = _build_context_messages(business)
+    text, input_tokens, output_tokens, _ = await chat_step(
+        business, user_message, priority, with_tools=False, history=history, recall=recall,
+    )
+    return text, input_tokens, output_tokens
+
+
+@traced("claude.chat_step")
+async def chat_step(
+    business: Business,
+    user_message: str,
+    priority: Priority = Priority.TRIAL,
+    with_tools: bool = True,
+    history: Optional[list] = None,
+    recall: Optional[str] = None,
+) -> tuple[str, int, int, Optional[dict]]:
+    """
+    Like chat(), but offers Claude the current step's document tool.
+    If the user approved the step, Claude calls the tool and the structured
+    document is returned as the 4th element (None otherwise).
+    `recall` — older turns relevant to the message (services/recall.py).
+
+    Returns:
+        (response_text, input_tokens, output_tokens, document)
+    """
+    sections = _system_prompt_sections(business)
+    stable = _join_system_prompt(sections)
+    volatile = []
+    if recall:
+        sections.append(("recall", recall))
+        volatile.append(recall)
+    messages = _build_context_messages(business, history)
 
     # Append the current user message
     messages.append({"role": "user", "content": user_message})
 
-    response = await client.messages.create(
-        model=settings.anthropic_model,
-        max_tokens=4096,
-        system=system_prompt,
-        messages=messages,
+    route = select_route(business, user_message)
+    tool = step_tool(business.current_step) if with_tools else None
+    tools = [tool] if tool else None
+    if tool:
+        instruction = STEP_TOOL_INSTRUCTION.format(tool=tool["name"])
+        sections.append(("tool_instruction", instruction))
+        volatile.append(instruction)
+
+    system = _system_param(stable, "\n\n".join(volatile))
+    response = await _create_message(route, system, messages, priority, tools=tools)
+    input_tokens = total_input_tokens(response.usage)
+    context_profile.report(
+        context_profile.raw_sections(sections, messages, tools),
+        input_tokens,
+        route=route.name,
+        business_id=business.id,
     )
 
-    text = response.content[0].text
-    input_tokens = response.usage.input_tokens
-    output_tokens = response.usage.output_tokens
+    text = "".join(block.text for block in response.content if block.type == "text")
+    document = next(
+        (block.input for block in response.content if block.type == "tool_use" and tool and block.name == tool["name"]),
+        None,
+    )
 
-    return text, input_tokens, output_tokens
+    return text, input_tokens, response.usage.output_tokens, document
 
 
 async def chat_stream(
     business: Business,
     user_message: str,
+    priority: Priority = Priority.TRIAL,
+    history: Optional[list] = None,
+    recall: Optional[str] = None,
 ) -> AsyncGenerator[str, None]:
     """
     Streaming version — yields text chunks as they arrive.
     Used for long responses (strategy, content plan) to show typing effect.
+    Retries only if the stream fails before the first chunk.
+    """
+    sections = _system_prompt_sections(business)
+    system = _system_param(_join_system_prompt(sections), recall or "")
+    if recall:
+        sections.append(("recall", recall))
+    messages = _build_context_messages(business, history)
+    messages.append({"role": "user", "content": user_message})
+
+    route = select_route(business, user_message)
+
+    # Не текущий спан: он живёт между yield, а контекст генератора — нет.
+    # Событие first_chunk отделяет prefill от генерации
+    current = start_span("claude.stream", route=route.name, model=route.model, business_id=business.id)
+    try:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            yielded = False
+            slot_started = None
+            try:
+                async with governor.slot(priority) as slot_started:
+                    started = time.perf_counter()
+                    async with get_client().messages.stream(
+                        model=route.model,
+                        max_tokens=route.max_tokens,
+                        system=system,
+                        messages=messages,
+                    ) as stream:
+                        async for text in stream.text_stream:
+                            if not yielded:
+                                current.add_event("first_chunk")
+                            yielded = True
+                            yield text
+                        final = await stream.get_final_message()
+                governor.on_success()
+                break
+            except _retryable_errors() as e:
+                if yielded:
+                    raise
+                current.add_event("retry", {"attempt": attempt, "error": repr(e)})
+                await _handle_retryable(e, attempt, slot_started)
+        _set_usage_attributes(current, final.usage, attempt)
+    except Exception as e:
+        current.record_exception(e)
+        raise
+    finally:
+        current.end()
+
+    _log_call(route, started, final.usage, stop_reason=final.stop_reason, streamed=True, attempt=attempt)
+    context_profile.report(
+        context_profile.raw_sections(sections, messages),
+        total_input_tokens(final.usage),
+        route=route.name,
+        business_id=business.id,
+    )
+
+
+# ─── Prompt cache pre-warming ─────────────────────────────────────────────────
+#
+# Selecting a project means a turn is coming within seconds. One minimal request
+# (max_tokens=1) writes the stable prefix — tools + level prompt + documents —
+# to the prompt cache, so the first turn reads it instead of paying full prefill.
+
+PREWARM_MESSAGE = "."
+# Короче этого API не кэширует: прогрев был бы чистым расходом.
+# По префиксу model id, как MODEL_PRICING; остальные модели — DEFAULT
+PROMPT_CACHE_MIN_TOKENS = {
+    "claude-haiku-4-5": 2048,
+    "claude-3-5-haiku": 2048,
+}
+DEFAULT_PROMPT_CACHE_MIN_TOKENS = 1024
+
+
+def prompt_cache_min_tokens(model: str) -> int:
+    """Shortest prefix the API will cache for this model."""
+    for prefix, min_tokens in PROMPT_CACHE_MIN_TOKENS.items():
+        if model.startswith(prefix):
+            return min_tokens
+    return DEFAULT_PROMPT_CACHE_MIN_TOKENS
+
+
+class PrewarmResult(NamedTuple):
+    route: Route
+    cache_write_tokens: int
+    cache_read_tokens: int
+    cost_usd: float
+
+
+async def prewarm_prompt_cache(business: Business) -> Optional[PrewarmResult]:
+    """
+    Write the business's stable prompt prefix to the cache for the model its
+    next turn will be routed to. None if the prefix is too short to be cached
+    by that model. Best effort: no retries, lowest governor priority.
+    """
+    route = select_route(business, "")._replace(max_tokens=1)
+    stable = _join_system_prompt(_system_prompt_sections(business))
+    if context_profile.estimator.estimate(stable) < prompt_cache_min_tokens(route.model):
+        return None
+
+    # Same prefix as chat_step(): tools come before the system prompt in the cache key
+    tool = step_tool(business.current_step)
+    extra = {"tools": [tool]} if tool else {}
+    async with governor.slot(Priority.BACKGROUND):
+        started = time.perf_counter()
+        response = await get_client().messages.create(
+            model=route.model,
+            max_tokens=route.max_tokens,
+            system=_system_param(stable),
+            messages=[{"role": "user", "content": PREWARM_MESSAGE}],
+            **extra,
+        )
+    _log_call(route, started, response.usage, prewarm=True)
+
+    cache_write, cache_read = cache_usage(response.usage)
+    return PrewarmResult(
+        route, cache_write, cache_read,
+        estimate_cost(route.model, response.usage.input_tokens, response.usage.output_tokens, cache_write, cache_read),
+    )
+
+
+# ─── Batch mode (Message Batches API) ─────────────────────────────────────────
+#
+# Non-interactive work (weekly CYCLE reports) goes through batches: ~50% cheaper
+# and outside the interactive rate limits. Results arrive within 24h.
+
+BATCH_POLL_INTERVAL = 60  # seconds
+BATCH_MAX_WAIT = 24 * 3600
+
+
+class BatchResult(NamedTuple):
+    custom_id: str
+    text: Optional[str]       # None if the request failed
+    input_tokens: int
+    output_tokens: int
+    error: Optional[str] = None
+
+
+def build_batch_request(business: Business, user_message: str, document_changes: Optional[str] = None) -> dict:
+    """
+    One Message Batches request — same prompt and routing as chat(), plus
+    `document_changes` (services/document_changes.py) after the documents.
     """
-    system_prompt = _build_system_prompt(business)
     messages = _build_context_messages(business)
     messages.append({"role": "user", "content": user_message})
+    route = select_route(business, user_message)
+    sections = _system_prompt_sections(business)
+    if document_changes:
+        sections.append(("document_changes", document_changes))
+    return {
+        "custom_id": f"business-{business.id}",
+        "params": {
+            "model": route.model,
+            "max_tokens": route.max_tokens,
+            "system": _join_system_prompt(sections),
+            "messages": messages,
+        },
+    }
+
+
+class AnthropicBatchBackend:
+    """Message Batches API (beta namespace in anthropic==0.40)."""
+
+    async def submit(self, requests: list[dict]) -> str:
+        batch = await get_client().beta.messages.batches.create(requests=requests)
+        return batch.id
+
+    async def is_done(self, batch_id: str) -> bool:
+        batch = await get_client().beta.messages.batches.retrieve(batch_id)
+        return batch.processing_status == "ended"
+
+    async def results(self, batch_id: str) -> AsyncGenerator[BatchResult, None]:
+        async for entry in await get_client().beta.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                message = entry.result.message
+                yield BatchResult(
+                    custom_id=entry.custom_id,
+                    text=message.content[0].text,
+                    input_tokens=message.usage.input_tokens,
+                    output_tokens=message.usage.output_tokens,
+                )
+            else:
+                error = getattr(entry.result, "error", None)
+                yield BatchResult(entry.custom_id, None, 0, 0, error=repr(error) if error else entry.result.type)
+
+
+class StubBatchBackend:
+    """Offline backend: completes instantly with canned replies. No network."""
+
+    def __init__(self) -> None:
+        self._batches: dict[str, list[dict]] = {}
+        # results() забирает пакет из словаря, так что len(self._batches) + 1
+        # выдал бы id уже собранного пакета — и его done-набор в Redis пропустил
+        # бы все запросы нового (см. weekly_reports.collect_reports)
+        self._ids = itertools.count(1)
+
+    async def submit(self, requests: list[dict]) -> str:
+        batch_id = f"stub_batch_{next(self._ids)}"
+        self._batches[batch_id] = requests
+        return batch_id
+
+    async def is_done(self, batch_id: str) -> bool:
+        return True
+
+    async def results(self, batch_id: str) -> AsyncGenerator[BatchResult, None]:
+        for request in self._batches.pop(batch_id, []):
+            prompt = request["params"]["messages"][-1]["content"]
+            yield BatchResult(
+                custom_id=request["custom_id"],
+                text=f"[stub] {prompt[:200]}",
+                input_tokens=0,
+                output_tokens=0,
+            )
+
+
+def get_batch_backend():
+    if settings.anthropic_batch_backend == "stub":
+        return StubBatchBackend()
+    return AnthropicBatchBackend()
+
 
-    async with client.messages.stream(
-        model=settings.anthropic_model,
-        max_tokens=4096,
-        system=system_prompt,
-        messages=messages,
-    ) as stream:
-        async for text in stream.text_stream:
-            yield text
+async def wait_for_batch(backend, batch_id: str) -> None:
+    """Poll until the batch has ended. Raises TimeoutError after BATCH_MAX_WAIT."""
+    waited = 0
+    while not await backend.is_done(batch_id):
+        if waited >= BATCH_MAX_WAIT:
+            raise TimeoutError(f"Batch {batch_id} not finished after {BATCH_MAX_WAIT}s")
+        await asyncio.sleep(BATCH_POLL_INTERVAL)
+        waited += BATCH_POLL_INTERVAL
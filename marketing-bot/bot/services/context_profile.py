@@ -0,0 +1,116 @@
+"""
+Per-request context size profiler.
+
+Estimates how many input tokens each part of a Claude request takes — the
+level prompt, every injected document, the site preview, history, the tool
+schema — without calling the API. The estimator is a character-class ratio
+(Cyrillic packs fewer chars per token than Latin/JSON), continuously
+calibrated against the input_tokens the API reports for the same request.
+
+Each request's breakdown goes to structlog ("Claude context") and to the
+claude_context_* Prometheus metrics; scripts/context_report.py aggregates the
+same breakdown offline across all businesses.
+"""
+
+import json
+from typing import Optional
+
+import structlog
+
+from bot.services.metrics import CONTEXT_ESTIMATOR_SCALE, CONTEXT_INPUT_TOKENS, CONTEXT_SECTION_TOKENS
+
+log = structlog.get_logger()
+
+# Стартовые коэффициенты (символов на токен); дальше поправка scale по ответам API
+CHARS_PER_TOKEN_ASCII = 3.8
+CHARS_PER_TOKEN_OTHER = 2.6        # кириллица, эмодзи
+MESSAGE_OVERHEAD_TOKENS = 4        # роль и разметка одного сообщения
+REQUEST_OVERHEAD_TOKENS = 10
+
+# EMA-сглаживание поправки и её допустимые границы
+CALIBRATION_ALPHA = 0.05
+MIN_SCALE, MAX_SCALE = 0.5, 2.0
+
+
+class TokenEstimator:
+    """Fast local token estimate: O(len) in C, no tokenizer needed."""
+
+    def __init__(self) -> None:
+        self.scale = 1.0
+        self.samples = 0
+
+    @staticmethod
+    def raw(text: str) -> float:
+        ascii_chars = len(text.encode("ascii", "ignore"))
+        return ascii_chars / CHARS_PER_TOKEN_ASCII + (len(text) - ascii_chars) / CHARS_PER_TOKEN_OTHER
+
+    def estimate(self, text: str) -> int:
+        return round(self.raw(text) * self.scale)
+
+    def calibrate(self, raw_total: float, actual: int) -> None:
+        """Move scale towards actual / raw_total (exponential moving average)."""
+        if raw_total <= 0 or actual <= 0:
+            return
+        ratio = min(MAX_SCALE, max(MIN_SCALE, actual / raw_total))
+        if self.samples == 0:
+            self.scale = ratio
+        else:
+            self.scale += CALIBRATION_ALPHA * (ratio - self.scale)
+        self.samples += 1
+        CONTEXT_ESTIMATOR_SCALE.set(self.scale)
+
+
+estimator = TokenEstimator()
+
+
+def raw_sections(
+    system_sections: list[tuple[str, str]],
+    messages: list[dict],
+    tools: Optional[list[dict]] = None,
+) -> dict[str, float]:
+    """
+    Uncalibrated estimate per section. The last message is the current user
+    turn and is reported separately from the history before it.
+    """
+    sections: dict[str, float] = {}
+    for name, text in system_sections:
+        sections[name] = sections.get(name, 0.0) + TokenEstimator.raw(text)
+
+    *history, current = messages or [{"content": ""}]
+    sections["history"] = sum(TokenEstimator.raw(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in history)
+    sections["user_message"] = TokenEstimator.raw(current["content"]) + MESSAGE_OVERHEAD_TOKENS
+    if tools:
+        sections["tools"] = TokenEstimator.raw(json.dumps(tools, ensure_ascii=False))
+    sections["overhead"] = REQUEST_OVERHEAD_TOKENS
+    return sections
+
+
+def report(
+    sections: dict[str, float],
+    actual_input_tokens: int,
+    route: str,
+    **extra,
+) -> dict[str, int]:
+    """
+    Calibrate against the API's input_tokens, then log and export the
+    breakdown. Returns the calibrated per-section estimate.
+    """
+    raw_total = sum(sections.values())
+    estimated_raw = round(raw_total * estimator.scale)
+    estimator.calibrate(raw_total, actual_input_tokens)
+
+    calibrated = {name: round(value * estimator.scale) for name, value in sections.items()}
+    for name, tokens in calibrated.items():
+        CONTEXT_SECTION_TOKENS.labels(section=name).observe(tokens)
+    CONTEXT_INPUT_TOKENS.labels(route=route).observe(actual_input_tokens)
+
+    log.info(
+        "Claude context",
+        route=route,
+        input_tokens=actual_input_tokens,
+        estimated_tokens=estimated_raw,     # before this request's calibration step
+        estimator_scale=round(estimator.scale, 3),
+        sections=calibrated,
+        **extra,
+    )
+    return calibrated
@@ -0,0 +1,80 @@
+"""
+"What changed since last week" for the agent: the JSON patch between the
+strategy / content plan in effect at `since` and the current ones, rendered
+as a short list of "path: old → new" lines.
+
+The weekly CYCLE report gets this section next to the current documents, so
+the model sees the edits without comparing two full copies.
+"""
+
+import json
+from datetime import datetime
+from typing import Optional
+
+import jsonpatch
+from jsonpointer import JsonPointerException, resolve_pointer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.agent.prompts import DOCUMENT_CHANGES_HEADER
+from bot.db.models import Business
+from bot.db.repositories.documents import VERSIONED_DOCUMENTS, get_version, version_at
+
+DOCUMENT_TITLES = {"strategy": "Стратегия", "content_plan": "Контент-план"}
+
+MAX_CHANGES_PER_DOCUMENT = 30
+VALUE_MAX_CHARS = 200
+
+
+def _short(value) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return text if len(text) <= VALUE_MAX_CHARS else text[:VALUE_MAX_CHARS] + "…"
+
+
+def format_patch(old: dict, patch: list[dict]) -> list[str]:
+    """One line per operation. Old values are read from `old` as the patch is applied."""
+    lines = []
+    document = old
+    for op in patch[:MAX_CHANGES_PER_DOCUMENT]:
+        path = op["path"] or "/"
+        try:
+            before = resolve_pointer(document, op["path"]) if op["op"] in ("replace", "remove") else None
+        except JsonPointerException:
+            before = None
+        if op["op"] == "add":
+            lines.append(f"- {path}: добавлено {_short(op['value'])}")
+        elif op["op"] == "remove":
+            lines.append(f"- {path}: удалено {_short(before)}")
+        elif op["op"] == "replace":
+            lines.append(f"- {path}: {_short(before)} → {_short(op['value'])}")
+        elif op["op"] == "move":
+            lines.append(f"- {path}: перемещено из {op['from']}")
+        else:  # copy, test
+            lines.append(f"- {path}: {op['op']}")
+        document = jsonpatch.apply_patch(document, [op])
+
+    if len(patch) > MAX_CHANGES_PER_DOCUMENT:
+        lines.append(f"- …и ещё {len(patch) - MAX_CHANGES_PER_DOCUMENT} правок")
+    return lines
+
+
+async def changes_since(session: AsyncSession, business: Business, since: datetime) -> Optional[str]:
+    """
+    Edits to the versioned documents since `since` as a prompt section, or None
+    if nothing changed. The documents must be loaded on `business`. A document
+    with no version at `since` is skipped: it is new, and it is in the prompt
+    in full anyway.
+    """
+    parts = []
+    for doc_type in VERSIONED_DOCUMENTS:
+        current = getattr(business, doc_type)
+        version = await version_at(session, business.id, doc_type, since)
+        if current is None or version is None:
+            continue
+        old = await get_version(session, business.id, doc_type, version)
+        patch = jsonpatch.make_patch(old, current).patch
+        if patch:
+            parts.append(f"### {DOCUMENT_TITLES[doc_type]}\n" + "\n".join(format_patch(old, patch)))
+
+    if not parts:
+        return None
+    return DOCUMENT_CHANGES_HEADER.format(since=since.strftime("%d.%m.%Y")) + "\n\n" + "\n\n".join(parts)
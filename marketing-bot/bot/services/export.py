@@ -0,0 +1,158 @@
+"""
+/export — a project's documents and full conversation history as a file.
+
+Memory stays flat regardless of history size:
+- live messages come through a server-side cursor in batches of BATCH_SIZE;
+- archived months are read from their zstd files batch by batch
+  (iter_archived_messages, in a thread);
+- every batch is written straight to a temp file, never to a string.
+
+Files above COMPRESS_MIN_BYTES are zipped before they are sent. The caller
+sends the result as a Telegram document, then removes the temp directory.
+"""
+
+import asyncio
+import itertools
+import json
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, NamedTuple, TextIO
+
+import structlog
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.db import replica_reads
+from bot.db.models import Business, Message
+from bot.services.archive import iter_archived_messages
+from bot.services.claude import PROMPT_DOCUMENTS
+
+log = structlog.get_logger()
+
+FORMATS = ("md", "jsonl")
+BATCH_SIZE = 500
+# Крупнее — отдаём zip; больше TELEGRAM_MAX_BYTES бот отправить не может
+COMPRESS_MIN_BYTES = 1024 * 1024
+TELEGRAM_MAX_BYTES = 50 * 1024 * 1024
+
+ROLE_TITLES = {"user": "Пользователь", "assistant": "Маркетолог"}
+
+
+class ExportTooLarge(Exception):
+    """The export does not fit into a Telegram document even compressed."""
+
+
+class ExportFile(NamedTuple):
+    path: Path
+    filename: str
+    messages: int
+    compressed: bool
+
+
+# ─── Sources ──────────────────────────────────────────────────────────────────
+
+EXPORT_FIELDS = ("id", "role", "content", "step", "created_at")
+
+
+async def _archived_batches(business_id: int) -> AsyncIterator[list[dict]]:
+    records = iter_archived_messages(business_id)
+    while batch := await asyncio.to_thread(lambda: list(itertools.islice(records, BATCH_SIZE))):
+        yield [{field: record[field] for field in EXPORT_FIELDS} for record in batch]
+
+
+async def _live_batches(session: AsyncSession, business_id: int) -> AsyncIterator[list[dict]]:
+    # Строки, а не ORM-объекты: ни identity map, ни лишних аллокаций на сообщение
+    with replica_reads(session):
+        result = await session.stream(
+            select(Message.id, Message.role, Message.content, Message.step, Message.created_at)
+            .where(Message.business_id == business_id)
+            .order_by(Message.created_at, Message.id)
+            .execution_options(yield_per=BATCH_SIZE)
+        )
+    async for batch in result.mappings().partitions(BATCH_SIZE):
+        yield [
+            {
+                "id": row["id"],
+                "role": row["role"],
+                "content": row["content"],
+                "step": row["step"].value if row["step"] else None,
+                "created_at": row["created_at"].isoformat(),
+            }
+            for row in batch
+        ]
+
+
+async def iter_message_batches(session: AsyncSession, business_id: int) -> AsyncIterator[list[dict]]:
+    """All messages of a business, oldest first: archived months, then Postgres."""
+    async for batch in _archived_batches(business_id):
+        yield batch
+    async for batch in _live_batches(session, business_id):
+        yield batch
+
+
+# ─── Formats ──────────────────────────────────────────────────────────────────
+
+def _write_header(fh: TextIO, business: Business, fmt: str) -> None:
+    documents = {column: getattr(business, column) for column, _ in PROMPT_DOCUMENTS}
+    if fmt == "jsonl":
+        fh.write(json.dumps({
+            "type": "business",
+            "id": business.id,
+            "name": business.name,
+            "level": business.level.value if business.level else None,
+            "current_step": business.current_step.value,
+            **documents,
+        }, ensure_ascii=False) + "\n")
+        return
+
+    fh.write(f"# {business.name}\n\n")
+    for column, title in PROMPT_DOCUMENTS:
+        if documents[column]:
+            document = json.dumps(documents[column], ensure_ascii=False, indent=2)
+            fh.write(f"## {title}\n\n```json\n{document}\n```\n\n")
+    fh.write("## Переписка\n\n")
+
+
+def _format_batch(batch: list[dict], fmt: str) -> str:
+    if fmt == "jsonl":
+        return "".join(json.dumps({"type": "message", **record}, ensure_ascii=False) + "\n" for record in batch)
+    return "".join(
+        f"**{ROLE_TITLES.get(record['role'], record['role'])}** · "
+        f"{datetime.fromisoformat(record['created_at']):%Y-%m-%d %H:%M}\n\n{record['content']}\n\n"
+        for record in batch
+    )
+
+
+def _zip(path: Path) -> Path:
+    archive = path.with_name(path.name + ".zip")
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        zf.write(path, arcname=path.name)   # читает файл кусками
+    path.unlink()
+    return archive
+
+
+# ─── Export ───────────────────────────────────────────────────────────────────
+
+async def export_business(session: AsyncSession, business: Business, fmt: str, directory: Path) -> ExportFile:
+    """
+    Write the export into `directory` (the caller owns and removes it).
+    Raises ExportTooLarge if the result exceeds the Telegram document limit.
+    """
+    path = directory / f"project-{business.id}-{datetime.now():%Y%m%d}.{fmt}"
+    count = 0
+    with open(path, "w", encoding="utf-8") as fh:
+        _write_header(fh, business, fmt)
+        async for batch in iter_message_batches(session, business.id):
+            await asyncio.to_thread(fh.write, _format_batch(batch, fmt))
+            count += len(batch)
+
+    compressed = path.stat().st_size > COMPRESS_MIN_BYTES
+    if compressed:
+        path = await asyncio.to_thread(_zip, path)
+    size = path.stat().st_size
+    if size > TELEGRAM_MAX_BYTES:
+        raise ExportTooLarge(f"{size} bytes")
+
+    log.info("Project exported", business_id=business.id, format=fmt, messages=count, bytes=size, compressed=compressed)
+    return ExportFile(path, path.name, count, compressed)
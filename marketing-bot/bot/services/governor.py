@@ -0,0 +1,215 @@
+"""
+Process-wide concurrency governor for Anthropic calls.
+
+- Caps in-flight requests; the cap adapts AIMD-style: +1/limit per success,
+  halved on 429/529 down to a floor, at most once per congestion window
+  (overloads of requests started before the last decrease are ignored)
+- Honours retry-after: an overload pauses every lane until the deadline
+- Priority lanes: paid interactive turns go first, then trial, then background
+- Optional Redis coordination (CLAUDE_GLOBAL_MAX_CONCURRENCY > 0): a global
+  cap across replicas and a shared retry-after pause. Priority ordering is
+  per process; across replicas background work simply polls less often.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+import uuid
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator, Optional
+
+import structlog
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from bot.config import settings
+from bot.db.models import SubscriptionPlan
+from bot.db.redis import redis
+
+log = structlog.get_logger()
+
+
+class Priority(IntEnum):
+    PAID = 0          # interactive turn, paid plan
+    TRIAL = 1         # interactive turn, trial / no plan
+    BACKGROUND = 2    # prewarming, maintenance, anything nobody waits for
+
+
+def priority_for_plan(plan: Optional[SubscriptionPlan]) -> Priority:
+    if plan is None or plan == SubscriptionPlan.FREE_TRIAL:
+        return Priority.TRIAL
+    return Priority.PAID
+
+
+# KEYS[1] — zset of leases (score = expiry). ARGV: now, limit, expiry, token
+_ACQUIRE_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+    return 1
+end
+return 0
+"""
+
+GLOBAL_INFLIGHT_KEY = "claude:inflight"
+GLOBAL_PAUSE_KEY = "claude:paused_until"
+LEASE_SECONDS = 300           # a crashed replica's slots free themselves after this
+GLOBAL_POLL_INTERVAL = {Priority.PAID: 0.05, Priority.TRIAL: 0.1, Priority.BACKGROUND: 0.5}
+
+
+class ClaudeGovernor:
+    def __init__(
+        self,
+        max_in_flight: int,
+        min_in_flight: int = 1,
+        global_max_in_flight: int = 0,
+        redis_client: Optional[Redis] = None,
+    ) -> None:
+        self.max_limit = max_in_flight
+        self.min_limit = min(min_in_flight, max_in_flight)
+        self.limit = float(max_in_flight)
+        self.in_flight = 0
+        self.global_max = global_max_in_flight
+        self.redis = redis_client if global_max_in_flight > 0 else None
+
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0   # time.monotonic()
+        self._last_decrease = 0.0  # time.monotonic()
+
+    # ─── Local slots ──────────────────────────────────────────────────────────
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < max(int(self.limit), self.min_limit)
+
+    def _wake(self) -> None:
+        while self._waiters and self._has_capacity():
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():
+                continue  # waiter was cancelled
+            self.in_flight += 1
+            fut.set_result(None)
+
+    async def _acquire_local(self, priority: Priority) -> None:
+        if self._has_capacity() and not self.queued:
+            self.in_flight += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # Slot was handed over right before cancellation — give it back
+            if fut.done() and not fut.cancelled():
+                self._release_local()
+            raise
+
+    def _release_local(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    # ─── Global (Redis) slots ─────────────────────────────────────────────────
+
+    async def _acquire_global(self, priority: Priority) -> Optional[str]:
+        if self.redis is None:
+            return None
+        token = uuid.uuid4().hex
+        try:
+            while True:
+                now = time.time()
+                acquired = await self.redis.eval(
+                    _ACQUIRE_LUA, 1, GLOBAL_INFLIGHT_KEY,
+                    now, self.global_max, now + LEASE_SECONDS, token,
+                )
+                if acquired:
+                    return token
+                await asyncio.sleep(GLOBAL_POLL_INTERVAL[priority])
+        except RedisError as e:
+            log.warning("Claude governor: Redis unavailable, local limit only", error=repr(e))
+            return None
+
+    async def _release_global(self, token: Optional[str]) -> None:
+        if token is None or self.redis is None:
+            return
+        try:
+            await self.redis.zrem(GLOBAL_INFLIGHT_KEY, token)
+        except RedisError:
+            pass  # the lease expires by itself
+
+    # ─── Pause (retry-after) ──────────────────────────────────────────────────
+
+    async def _wait_pause(self) -> None:
+        delay = self._paused_until - time.monotonic()
+        if self.redis is not None:
+            try:
+                remote = await self.redis.pttl(GLOBAL_PAUSE_KEY)
+                delay = max(delay, remote / 1000)
+            except RedisError:
+                pass
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    # ─── Public API ───────────────────────────────────────────────────────────
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.TRIAL) -> AsyncIterator[float]:
+        """
+        Hold one in-flight Anthropic request for the duration of the block.
+        Yields the request's start time, to pass to on_overload().
+        """
+        await self._wait_pause()
+        await self._acquire_local(priority)
+        token = None
+        try:
+            token = await self._acquire_global(priority)
+            yield time.monotonic()
+        finally:
+            await self._release_global(token)
+            self._release_local()
+
+    def on_success(self) -> None:
+        """Additive increase: about +1 to the limit per `limit` successful calls."""
+        if self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake()
+
+    async def on_overload(self, retry_after: float, started: Optional[float] = None) -> None:
+        """
+        Multiplicative decrease on 429/529 and a pause for every lane.
+
+        `started` is the slot's start time. A request that started before the
+        last decrease belongs to the same burst: it extends the pause but does
+        not halve the limit again.
+        """
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + retry_after)
+        if started is None or started >= self._last_decrease:
+            self.limit = max(self.min_limit, self.limit / 2)
+            self._last_decrease = now
+            log.warning(
+                "Claude overloaded, backing off",
+                limit=round(self.limit, 2),
+                in_flight=self.in_flight,
+                queued=self.queued,
+                retry_after=retry_after,
+            )
+        if self.redis is not None:
+            try:
+                await self.redis.set(GLOBAL_PAUSE_KEY, "1", px=max(1, int(retry_after * 1000)))
+            except RedisError:
+                pass
+
+
+governor = ClaudeGovernor(
+    max_in_flight=settings.claude_max_concurrency,
+    min_in_flight=settings.claude_min_concurrency,
+    global_max_in_flight=settings.claude_global_max_concurrency,
+    redis_client=redis,
+)
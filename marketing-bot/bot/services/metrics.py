@@ -0,0 +1,125 @@
+"""
+Prometheus metrics — the process-wide metrics surface.
+
+All metrics are declared here so names and labels stay consistent; modules
+import the ones they update. Served over HTTP on METRICS_PORT (see bot.main).
+"""
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from bot.config import settings
+
+_TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+
+# ─── Claude context size ──────────────────────────────────────────────────────
+
+CONTEXT_SECTION_TOKENS = Histogram(
+    "claude_context_section_tokens",
+    "Estimated input tokens per context section (calibrated)",
+    ["section"],
+    buckets=_TOKEN_BUCKETS,
+)
+CONTEXT_INPUT_TOKENS = Histogram(
+    "claude_context_input_tokens",
+    "Input tokens reported by the API per request",
+    ["route"],
+    buckets=_TOKEN_BUCKETS,
+)
+CONTEXT_ESTIMATOR_SCALE = Gauge(
+    "claude_context_estimator_scale",
+    "Calibration factor of the local token estimator (reported / raw estimate)",
+)
+
+
+# ─── Prompt cache ─────────────────────────────────────────────────────────────
+
+PROMPT_CACHE_TOKENS = Counter(
+    "claude_prompt_cache_tokens_total",
+    "Input tokens written to (write) or read from (read) the Anthropic prompt cache",
+    ["kind"],
+)
+PROMPT_CACHE_PREWARMS = Counter(
+    "claude_prompt_cache_prewarms_total",
+    "Background pre-warms on project selection: ok, skipped (prefix too short or nothing written to the cache), error",
+    ["result"],
+)
+PROMPT_CACHE_PREWARM_COST = Counter(
+    "claude_prompt_cache_prewarm_cost_usd_total",
+    "Estimated USD spent on pre-warm requests",
+)
+FIRST_TURN_LATENCY = Histogram(
+    "claude_first_turn_latency_seconds",
+    "Claude latency of the first turn after selecting a project, by whether the selection was sampled for a pre-warm",
+    ["prewarmed"],
+    buckets=(0.5, 1, 2, 3, 5, 8, 13, 21, 34, 60),
+)
+
+
+# ─── Telegram updates ─────────────────────────────────────────────────────────
+
+UPDATES_DEDUPLICATED = Counter(
+    "telegram_updates_deduplicated_total",
+    "Redelivered updates dropped by update_id before reaching handlers",
+    ["update_type"],
+)
+UPDATES_IN_FLIGHT = Gauge(
+    "telegram_updates_in_flight",
+    "Updates being processed now (at most ADMISSION_MAX_IN_FLIGHT)",
+)
+UPDATES_QUEUED = Gauge(
+    "telegram_updates_queued",
+    "Updates waiting for an admission slot (at most ADMISSION_MAX_QUEUED)",
+)
+UPDATES_SHED = Counter(
+    "telegram_updates_shed_total",
+    "Updates answered with the busy reply: queue full or waited longer than ADMISSION_QUEUE_TIMEOUT",
+    ["update_type", "reason"],
+)
+SLOW_UPDATES_PROFILED = Counter(
+    "telegram_slow_updates_profiled_total",
+    "Updates over PROFILER_THRESHOLD_MS whose sampling profile was saved",
+)
+
+
+# ─── Database ─────────────────────────────────────────────────────────────────
+
+DB_ROUND_TRIPS = Histogram(
+    "db_round_trips_per_update",
+    "Database round trips (statements, BEGIN/COMMIT/ROLLBACK) per Telegram update",
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+DB_ROUND_TRIP_BUDGET_EXCEEDED = Counter(
+    "db_round_trip_budget_exceeded_total",
+    "Updates that made more than DATABASE_ROUND_TRIP_BUDGET database round trips",
+    ["update_type"],
+)
+
+
+# ─── Conversation history cache ───────────────────────────────────────────────
+
+HISTORY_CACHE_REQUESTS = Counter(
+    "history_cache_requests_total",
+    "Recent-turns reads by outcome: hit, miss (loaded from Postgres), error (Redis down)",
+    ["result"],
+)
+HISTORY_CACHE_INCONSISTENT = Counter(
+    "history_cache_inconsistent_total",
+    "Cached recent-turn lists that disagreed with Postgres and were dropped",
+)
+
+
+# ─── Logging ──────────────────────────────────────────────────────────────────
+
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records dropped because the logging queue was full",
+)
+
+
+def start_metrics_server() -> bool:
+    """Expose /metrics on settings.metrics_port. False if disabled (port 0)."""
+    if not settings.metrics_port:
+        return False
+    start_http_server(settings.metrics_port)
+    return True
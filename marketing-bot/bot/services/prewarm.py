@@ -0,0 +1,89 @@
+"""
+Background pre-warm on project selection.
+
+on_project_select() knows a chat turn is coming. For a PROMPT_CACHE_PREWARM_RATE
+share of selections it starts a background task that does two things:
+
+- loads the project's recent turns into the Redis history cache;
+- writes the stable prompt prefix to the Anthropic prompt cache
+  (claude.prewarm_prompt_cache).
+
+The selection's group is decided by the sampling itself and kept in the FSM
+data (prewarmed=True/False next to first_turn). The first turn reports its
+Claude latency labelled by that group, whether or not the pre-warm finished in
+time. The difference between the two groups shows the latency saved, and
+claude_prompt_cache_prewarm_cost_usd_total shows what it cost. A finished
+pre-warm is only marked in Redis to log whether it landed before the first turn.
+"""
+
+import asyncio
+import random
+
+import structlog
+from redis.exceptions import RedisError
+
+from bot.config import settings
+from bot.db import async_session_factory
+from bot.db.redis import redis
+from bot.db.repositories.business import get_active_business
+from bot.db.repositories.history import get_recent_turns
+from bot.services.claude import PROMPT_CACHE_TTL, prewarm_prompt_cache
+from bot.services.metrics import FIRST_TURN_LATENCY, PROMPT_CACHE_PREWARM_COST, PROMPT_CACHE_PREWARMS
+
+log = structlog.get_logger()
+
+# Ссылки на фоновые задачи, чтобы их не собрал GC до завершения
+_tasks: set[asyncio.Task] = set()
+
+
+def _key(business_id: int) -> str:
+    return f"prewarm:{business_id}"
+
+
+def schedule_prewarm(user_id: int, business_id: int) -> bool:
+    """Start a background pre-warm for a sampled share of selections. True if started."""
+    if random.random() >= settings.prompt_cache_prewarm_rate:
+        return False
+    task = asyncio.create_task(_prewarm(user_id, business_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return True
+
+
+async def _prewarm(user_id: int, business_id: int) -> None:
+    try:
+        async with async_session_factory() as session:
+            business = await get_active_business(session, user_id, business_id)
+            if not business:
+                return
+            await get_recent_turns(session, business_id)
+
+        result = await prewarm_prompt_cache(business)
+        if result is None:
+            PROMPT_CACHE_PREWARMS.labels(result="skipped").inc()
+            return
+        PROMPT_CACHE_PREWARM_COST.inc(result.cost_usd)
+        if not result.cache_write_tokens:
+            # Запрос оплачен, но в кэш ничего не записано (оценка длины ошиблась
+            # или префикс уже был в кэше) — это не успешный прогрев
+            PROMPT_CACHE_PREWARMS.labels(result="skipped").inc()
+            log.info("Prompt cache prewarm wrote nothing", business_id=business_id, cache_read=result.cache_read_tokens)
+            return
+        PROMPT_CACHE_PREWARMS.labels(result="ok").inc()
+        await redis.set(_key(business_id), 1, ex=PROMPT_CACHE_TTL)
+    except Exception as e:
+        # Прогрев — оптимизация: первый ход просто пойдёт без кэша
+        PROMPT_CACHE_PREWARMS.labels(result="error").inc()
+        log.warning("Prompt cache prewarm failed", business_id=business_id, error=repr(e))
+
+
+async def record_first_turn(business_id: int, latency: float, prewarmed: bool) -> None:
+    """Observe the first turn's Claude latency, labelled by the group chosen in schedule_prewarm()."""
+    FIRST_TURN_LATENCY.labels(prewarmed="yes" if prewarmed else "no").observe(latency)
+    if not prewarmed:
+        return
+    try:
+        landed = bool(await redis.getdel(_key(business_id)))
+    except RedisError:
+        return
+    log.info("First turn after prewarm", business_id=business_id, prewarm_landed=landed, latency=round(latency, 3))
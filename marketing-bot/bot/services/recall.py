@@ -0,0 +1,71 @@
+"""
+Recall of older conversation turns.
+
+The context sent to Claude holds only the last MAX_CONTEXT_MESSAGES turns.
+Facts the user mentioned earlier would be lost, and the user would have to
+repeat them. For every chat turn the user's message is matched against the
+business's older messages (full-text search with Russian stemming, see
+history.search_older_turns). The best matches are added to the system prompt
+as a "recall" section, within RECALL_TOKEN_BUDGET.
+"""
+
+from typing import Optional
+
+import structlog
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.agent.prompts import RECALL_HEADER
+from bot.config import settings
+from bot.db.repositories.history import Turn, search_older_turns
+from bot.services.claude import MAX_CONTEXT_MESSAGES
+from bot.services.context_profile import estimator
+
+log = structlog.get_logger()
+
+# Длинный ответ ассистента (стратегия, план) целиком не нужен — хватает начала
+SNIPPET_MAX_CHARS = 700
+ROLE_LABELS = {"user": "Пользователь", "assistant": "Ты"}
+
+
+def _snippet(turn: Turn) -> str:
+    text = " ".join(turn.content.split())
+    if len(text) > SNIPPET_MAX_CHARS:
+        text = text[:SNIPPET_MAX_CHARS].rsplit(" ", 1)[0] + " …"
+    return f"- {ROLE_LABELS.get(turn.role, turn.role)}: {text}"
+
+
+def format_recall(turns: list[Turn], token_budget: int) -> Optional[str]:
+    """
+    Take turns in relevance order while they fit the budget, then list them
+    chronologically under RECALL_HEADER. None if nothing fits.
+    """
+    used = estimator.estimate(RECALL_HEADER)
+    picked = []
+    for turn in turns:
+        snippet = _snippet(turn)
+        cost = estimator.estimate(snippet)
+        if used + cost > token_budget:
+            continue   # менее релевантный, но короткий фрагмент ещё может влезть
+        picked.append((turn.id, snippet))
+        used += cost
+    if not picked:
+        return None
+    return RECALL_HEADER + "\n\n" + "\n".join(snippet for _, snippet in sorted(picked))
+
+
+async def recall_older_turns(
+    session: AsyncSession, business_id: int, history: list[Turn], user_message: str,
+) -> Optional[str]:
+    """
+    System prompt section with older turns relevant to `user_message`, or None.
+    `history` is what get_recent_turns() returned, so the search starts right
+    before the turns already in the context window.
+    """
+    if not settings.recall_token_budget or len(history) < MAX_CONTEXT_MESSAGES:
+        return None   # весь разговор и так помещается в окно
+    before_id = history[-MAX_CONTEXT_MESSAGES].id
+    turns = await search_older_turns(session, business_id, user_message, before_id, settings.recall_top_k)
+    recall = format_recall(turns, settings.recall_token_budget)
+    if recall:
+        log.debug("Older turns recalled", business_id=business_id, found=len(turns))
+    return recall
@@ -15,6 +15,8 @@ from urllib.parse import urlparse
 import httpx
 from bs4 import BeautifulSoup
 
+from bot.tracing import traced
+
 
 MAX_CONTENT_LENGTH = 8000  # chars — enough context, not too many tokens
 
@@ -64,6 +66,7 @@ def _extract_main_content(html: str, url: str) -> str:
     return combined[:MAX_CONTENT_LENGTH]
 
 
+@traced("scrape.fast")
 async def scrape_fast(url: str) -> str | None:
     """HTTP-only scraping with httpx. Fast and cheap."""
     try:
@@ -79,6 +82,7 @@ async def scrape_fast(url: str) -> str | None:
         return None
 
 
+@traced("scrape.playwright")
 async def scrape_with_playwright(url: str) -> str | None:
     """JS-rendering fallback using Playwright."""
     try:
@@ -94,6 +98,7 @@ async def scrape_with_playwright(url: str) -> str | None:
         return None
 
 
+@traced("scrape")
 async def scrape(url: str) -> str:
     """
     Main entry point. Try fast scraping first, fall back to Playwright.
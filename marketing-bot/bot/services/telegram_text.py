@@ -0,0 +1,18 @@
+"""
+Text helpers for messages sent to Telegram, shared by the chat handlers and
+background senders (weekly reports).
+"""
+
+# Лимит Telegram — 4096 символов, оставляем запас
+MAX_MESSAGE_CHARS = 4000
+
+
+def split_message(text: str, max_len: int = MAX_MESSAGE_CHARS) -> list[str]:
+    """Split long messages into Telegram-safe chunks."""
+    if len(text) <= max_len:
+        return [text]
+    chunks = []
+    while text:
+        chunks.append(text[:max_len])
+        text = text[max_len:]
+    return chunks
@@ -0,0 +1,131 @@
+"""
+Weekly CYCLE reports for every active business, generated offline as one
+Message Batches job instead of a chat() call per business.
+
+Flow: build requests → submit batch → poll → write Message rows → deliver.
+Pending batch ids are kept in Redis, so after a restart polling resumes
+instead of paying for the same batch twice. Handled results are recorded per
+batch, so a resumed collection skips them instead of sending the report again.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import structlog
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload, undefer_group
+
+from bot.agent.prompts import WEEKLY_REPORT_REQUEST
+from bot.config import settings
+from bot.db import async_session_factory, commit
+from bot.db.models import Business, FlowStep
+from bot.db.redis import redis
+from bot.db.repositories.business import add_message
+from bot.services.claude import build_batch_request, get_batch_backend, wait_for_batch
+from bot.services.document_changes import changes_since
+from bot.services.telegram_text import split_message
+
+log = structlog.get_logger()
+
+PENDING_KEY = "batches:weekly_reports"
+LOAD_CHUNK = 200
+DONE_TTL = 30 * 24 * 3600   # на случай, если пакет так и не будет дособран
+
+
+async def _build_requests() -> list[dict]:
+    """Requests for every active business at the CYCLE step, loaded in id-ordered chunks."""
+    requests = []
+    last_id = 0
+    week_ago = datetime.now(timezone.utc) - timedelta(days=7)
+    async with async_session_factory() as session:
+        while True:
+            result = await session.execute(
+                select(Business)
+                .where(
+                    Business.current_step == FlowStep.CYCLE,
+                    Business.is_active == True,
+                    Business.delete_after.is_(None),
+                    Business.id > last_id,
+                )
+                .order_by(Business.id)
+                .limit(LOAD_CHUNK)
+                .options(undefer_group("heavy"), selectinload(Business.messages))
+            )
+            chunk = result.scalars().all()
+            if not chunk:
+                break
+            for business in chunk:
+                changes = await changes_since(session, business, week_ago)
+                requests.append(build_batch_request(business, WEEKLY_REPORT_REQUEST, changes))
+            last_id = chunk[-1].id
+            session.expunge_all()
+    return requests
+
+
+async def collect_reports(bot: Bot, backend, batch_id: str) -> None:
+    """Wait for the batch, store each report in the project history and send it."""
+    await wait_for_batch(backend, batch_id)
+
+    # Обработанные custom_id: после перезапуска сбор продолжается с того же места,
+    # без повторной записи и повторной отправки отчёта
+    done_key = f"{PENDING_KEY}:{batch_id}:done"
+    done = {custom_id.decode() for custom_id in await redis.smembers(done_key)}
+
+    delivered = failed = skipped = 0
+    async for item in backend.results(batch_id):
+        if item.custom_id in done:
+            skipped += 1
+            continue
+        if item.text is None:
+            failed += 1
+            log.warning("Weekly report failed", custom_id=item.custom_id, error=item.error)
+            continue
+
+        business_id = int(item.custom_id.removeprefix("business-"))
+        async with async_session_factory() as session:
+            business = await session.get(Business, business_id)
+            if not business or not business.is_active:
+                continue
+            await add_message(session, business, "user", WEEKLY_REPORT_REQUEST)
+            await add_message(
+                session, business, "assistant", item.text,
+                input_tokens=item.input_tokens, output_tokens=item.output_tokens,
+            )
+            await commit(session)
+        await redis.sadd(done_key, item.custom_id)
+        await redis.expire(done_key, DONE_TTL)
+
+        try:
+            await bot.send_message(business.user_id, f"📊 **{business.name}** — еженедельный отчёт", parse_mode="Markdown")
+            for chunk in split_message(item.text):
+                await bot.send_message(business.user_id, chunk, parse_mode="Markdown")
+            delivered += 1
+        except TelegramAPIError as e:
+            log.warning("Weekly report not delivered", business_id=business_id, error=repr(e))
+
+    await redis.hdel(PENDING_KEY, batch_id)
+    await redis.delete(done_key)
+    log.info("Weekly reports done", batch_id=batch_id, delivered=delivered, failed=failed, skipped=skipped)
+
+
+async def run_weekly_reports(bot: Bot) -> None:
+    """Scheduled job: submit one batch with a report request per CYCLE business."""
+    requests = await _build_requests()
+    if not requests:
+        log.info("Weekly reports: no businesses at the cycle step")
+        return
+
+    backend = get_batch_backend()
+    batch_id = await backend.submit(requests)
+    await redis.hset(PENDING_KEY, batch_id, datetime.now(timezone.utc).isoformat())
+    log.info("Weekly reports batch submitted", batch_id=batch_id, requests=len(requests))
+
+    await collect_reports(bot, backend, batch_id)
+
+
+async def pending_batch_ids() -> list[str]:
+    """Batches submitted before a restart and not collected yet."""
+    if settings.anthropic_batch_backend == "stub":
+        return []  # stub batches live in memory and don't survive a restart
+    return [batch_id.decode() for batch_id in await redis.hkeys(PENDING_KEY)]
@@ -0,0 +1,182 @@
+"""
+Tracing: OpenTelemetry spans for updates, SQL, Claude, scraping and Bot API calls.
+
+One trace per Telegram update. The spans are:
+
+    telegram.update              bot/middlewares/tracing.py
+      fsm.get_data / set_state   TracedRedisStorage
+      db.query                   every SQL statement (engine events)
+      claude.chat_step / claude.messages.create / claude.stream
+      scrape / scrape.fast / scrape.playwright
+      telegram.SendMessage …     outbound Bot API calls
+
+TRACING_EXPORTER selects the output:
+- "console": one JSON span per line on stdout;
+- "file": the same, appended to TRACING_FILE.
+
+Both work offline. Trace and span ids are added to every structlog line written
+inside a span.
+
+Tracing is off by default. span() is then a no-op and OpenTelemetry is never
+imported: its API alone costs ~100 ms of cold start (scripts/check_startup.py).
+"""
+
+import atexit
+import functools
+import sys
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from bot.config import settings
+
+_tracer = None        # opentelemetry Tracer after setup_tracing()
+_trace = None         # the opentelemetry.trace module, once imported
+
+STATEMENT_MAX_CHARS = 1000
+
+
+class _NullSpan:
+    """Stands in for a span when tracing is off, so call sites need no checks."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: dict) -> None:
+        pass
+
+    def add_event(self, name: str, attributes: dict | None = None) -> None:
+        pass
+
+    def record_exception(self, exception: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+def _attributes(attributes: dict) -> dict:
+    # OpenTelemetry принимает только str/bool/int/float — None выбрасываем, остальное в строку
+    return {
+        key: value if isinstance(value, (str, bool, int, float)) else str(value)
+        for key, value in attributes.items()
+        if value is not None
+    }
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Any]:
+    """Child span of the current one for the duration of the block."""
+    if _tracer is None:
+        yield NULL_SPAN
+        return
+    with _tracer.start_as_current_span(name, attributes=_attributes(attributes)) as current:
+        yield current
+
+
+def start_span(name: str, **attributes) -> Any:
+    """
+    A span that is not made current; the caller ends it. For async generators,
+    where a current span would leak across yields.
+    """
+    if _tracer is None:
+        return NULL_SPAN
+    return _tracer.start_span(name, attributes=_attributes(attributes))
+
+
+def traced(name: str):
+    """Decorator: run a coroutine function inside span(name)."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_trace_ids(logger, method_name: str, event_dict: dict) -> dict:
+    """structlog processor: trace_id / span_id of the current span."""
+    if _trace is not None:
+        context = _trace.get_current_span().get_span_context()
+        if context.is_valid:
+            event_dict["trace_id"] = format(context.trace_id, "032x")
+            event_dict["span_id"] = format(context.span_id, "016x")
+    return event_dict
+
+
+# ─── SQL ──────────────────────────────────────────────────────────────────────
+
+def instrument_engine(engine) -> None:
+    """A db.query span per statement, parented to the span current at execute time."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        context._trace_span = _tracer.start_span("db.query", attributes={
+            "db.system": "postgresql",
+            "db.statement": statement[:STATEMENT_MAX_CHARS],
+            "db.executemany": executemany,
+            "db.host": str(engine.url.host),
+        })
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _end(conn, cursor, statement, parameters, context, executemany):
+        current = getattr(context, "_trace_span", None)
+        if current is not None:
+            current.set_attribute("db.rowcount", cursor.rowcount if cursor.rowcount is not None else -1)
+            current.end()
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def _error(exception_context):
+        current = getattr(exception_context.execution_context, "_trace_span", None)
+        if current is not None:
+            current.record_exception(exception_context.original_exception)
+            current.set_status(_trace.Status(_trace.StatusCode.ERROR))
+            current.end()
+
+
+# ─── Setup ────────────────────────────────────────────────────────────────────
+
+def setup_tracing() -> bool:
+    """Configure the tracer provider once at process start. False if tracing is off."""
+    global _tracer, _trace
+    if not settings.tracing_exporter:
+        return False
+
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    if settings.tracing_exporter == "file":
+        out = open(settings.tracing_file, "a", encoding="utf-8")
+    elif settings.tracing_exporter == "console":
+        out = sys.stdout
+    else:
+        raise ValueError(f"TRACING_EXPORTER must be 'console', 'file' or empty, got {settings.tracing_exporter!r}")
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": "marketing-bot", "deployment.environment": settings.environment}),
+        sampler=ParentBased(TraceIdRatioBased(settings.tracing_sample_rate)),
+    )
+    # Экспорт в фоновом потоке пачками — event loop не ждёт записи
+    provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter(
+        out=out,
+        formatter=lambda finished: finished.to_json(indent=None) + "\n",
+    )))
+    trace.set_tracer_provider(provider)
+    atexit.register(provider.shutdown)   # дописать спаны из буфера
+
+    _trace = trace
+    _tracer = trace.get_tracer("marketing-bot")
+
+    from bot.db import engine, replica_engine
+
+    instrument_engine(engine)
+    if replica_engine is not None:
+        instrument_engine(replica_engine)
+    return True
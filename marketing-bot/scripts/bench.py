@@ -0,0 +1,284 @@
+"""
+Микробенчмарки чистых горячих функций с проверкой регрессий.
+
+Каждый ход чата и каждый скрейп проходят через:
+    _build_system_prompt, _build_context_messages   (services/claude.py)
+    _extract_main_content, _clean_text               (services/scraper.py)
+    split_message                                    (services/telegram_text.py)
+    URL_RE.findall                                   (handlers/chat.py)
+Фикстуры реалистичные и детерминированные: большие документы проекта,
+40+ сообщений истории, HTML-страница ~2 МБ, ответ на 20k символов.
+
+Замер как в pytest-benchmark: число вызовов в раунде подбирается так, чтобы
+раунд длился ≥ MIN_ROUND_SECONDS, берётся лучший раунд (min устойчивее
+медианы к шуму соседних процессов). Результаты сравниваются с
+scripts/bench_baseline.json после нормировки на эталонный бенчмарк (чистый
+Python-цикл) — так базу можно сравнивать между машинами. Порог по умолчанию
+50%: на общих CI-раннерах шум доходит до ±35%; на выделенной машине --tolerance 0.2.
+Подозрительные бенчмарки перемеряются до RECHECKS раз, прежде чем провалить прогон.
+
+Usage (из marketing-bot/):
+    python -m scripts.bench                  # сравнить с базой, exit 1 при регрессии
+    python -m scripts.bench --save           # перезаписать базу
+    python -m scripts.bench -k scraper       # только бенчмарки с подстрокой в имени
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+from bot.db.models import Business, BusinessLevel, FlowStep, Message
+from bot.handlers.chat import URL_RE
+from bot.services.claude import _build_context_messages, _build_system_prompt
+from bot.services.scraper import _clean_text, _extract_main_content
+from bot.services.telegram_text import split_message
+
+BASELINE_PATH = Path(__file__).with_name("bench_baseline.json")
+MIN_ROUND_SECONDS = 0.05
+ROUNDS = 7
+# Замедление больше чем на 50% (после нормировки) — регрессия
+DEFAULT_TOLERANCE = 0.5
+RECHECKS = 2
+
+_rng = random.Random(42)
+_WORDS = (
+    "кофейня клиент продажи стратегия контент аудитория бюджет конверсия охват "
+    "рекомендация отзыв акция сезон доставка десерт бариста marketing SEO CPA"
+).split()
+
+
+def _sentence(words: int) -> str:
+    return " ".join(_rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _paragraph(sentences: int) -> str:
+    return " ".join(_sentence(_rng.randint(6, 16)) for _ in range(sentences))
+
+
+# ─── Fixtures ─────────────────────────────────────────────────────────────────
+
+def make_business() -> Business:
+    """A MEDIUM business at CONTENT_PLAN with every document filled and a long history."""
+    business = Business(
+        id=1,
+        user_id=1,
+        name="Кофейня у метро",
+        level=BusinessLevel.MEDIUM,
+        current_step=FlowStep.CONTENT_PLAN,
+        profile={
+            "niche": "Кофейня", "product": _paragraph(4), "audience": _paragraph(3),
+            "geography": "Москва", "usp": _paragraph(2),
+            "competitors": [_sentence(6) for _ in range(8)],
+            "channels": [_sentence(4) for _ in range(6)],
+            "budget": "150 000 ₽", "goals": [_sentence(8) for _ in range(5)],
+            "notes": [_paragraph(2) for _ in range(10)],
+        },
+        audit_result={
+            "summary": _paragraph(6), "strengths": [_sentence(10) for _ in range(8)],
+            "weaknesses": [_sentence(10) for _ in range(8)],
+            "channels": [{"name": w, "status": "ok", "comment": _sentence(12)} for w in _WORDS[:10]],
+            "priorities": [_sentence(10) for _ in range(6)],
+        },
+        strategy={
+            "goal": _sentence(12), "positioning": _paragraph(3),
+            "audience_segments": [_paragraph(1) for _ in range(4)],
+            "key_messages": [_sentence(10) for _ in range(6)],
+            "channels": [{"name": w, "role": _sentence(8), "budget_share": "10%", "kpi": _sentence(5)} for w in _WORDS[:8]],
+            "plan": [{"period": f"Неделя {i}", "actions": [_sentence(10) for _ in range(4)]} for i in range(1, 13)],
+            "kpis": [_sentence(6) for _ in range(6)],
+        },
+        content_plan=None,
+        website_content=_paragraph(80)[:8000],
+    )
+    steps = [FlowStep.PROFILE] * 20 + [FlowStep.AUDIT] * 20 + [FlowStep.STRATEGY] * 20 + [FlowStep.CONTENT_PLAN] * 50
+    business.messages = [
+        Message(
+            id=i, role="user" if i % 2 == 0 else "assistant", step=step,
+            content=_paragraph(2) if i % 2 == 0 else _paragraph(12),
+        )
+        for i, step in enumerate(steps)
+    ]
+    return business
+
+
+def make_html(size: int = 2 * 1024 ** 2) -> str:
+    """A landing page of about `size` bytes: head, nav, scripts, sections, footer."""
+    head = (
+        "<html><head><title>Кофейня у метро — кофе с собой</title>"
+        '<meta name="description" content="Лучший кофе у метро">'
+        "<style>" + "body{margin:0}" * 500 + "</style></head><body>"
+        "<header><nav>" + "".join(f'<a href="/p{i}">{w}</a>' for i, w in enumerate(_WORDS * 5)) + "</nav></header>"
+    )
+    parts = [head, "<main>"]
+    total = len(head.encode())
+    while total < size:
+        block = (
+            f"<section><h2>{_sentence(4)}</h2><p>{_paragraph(5)}</p>"
+            f"<ul>{''.join(f'<li>{_sentence(6)}</li>' for _ in range(5))}</ul>"
+            f"<script>var x = {_rng.random()};</script>\n\n\n</section>"
+        )
+        parts.append(block)
+        total += len(block.encode())
+    parts.append("</main><footer>" + _paragraph(5) + "</footer></body></html>")
+    return "".join(parts)
+
+
+def make_dirty_text(size: int = 300_000) -> str:
+    """get_text() output: runs of blank lines, tabs and spaces between fragments."""
+    parts = []
+    total = 0
+    while total < size:
+        part = _sentence(8) + _rng.choice(["\n", "\n\n\n\n", "\t\t  ", "     \n\n\n"])
+        parts.append(part)
+        total += len(part)
+    return "".join(parts)
+
+
+def make_reply(size: int = 20_000) -> str:
+    """A long assistant reply / user paste with links sprinkled in."""
+    parts = []
+    total = 0
+    while total < size:
+        part = _paragraph(3)
+        if _rng.random() < 0.3:
+            part += f" https://example{_rng.randint(1, 99)}.ru/page?id={_rng.randint(1, 9999)} www.site.ru/a"
+        parts.append(part + "\n\n")
+        total += len(part) + 2
+    return "".join(parts)[:size]
+
+
+def _reference() -> int:
+    """Machine-speed yardstick: a plain Python loop, unaffected by our code."""
+    total = 0
+    for i in range(20_000):
+        total += i * i % 7
+    return total
+
+
+def benchmarks() -> dict[str, Callable[[], object]]:
+    business = make_business()
+    html = make_html()
+    dirty = make_dirty_text()
+    reply = make_reply()
+    return {
+        "reference": _reference,
+        "claude._build_system_prompt": lambda: _build_system_prompt(business),
+        "claude._build_context_messages": lambda: _build_context_messages(business),
+        "scraper._extract_main_content[2MB]": lambda: _extract_main_content(html, "https://example.ru"),
+        "scraper._clean_text[300k]": lambda: _clean_text(dirty),
+        "telegram_text.split_message[20k]": lambda: split_message(reply),
+        "chat.URL_RE.findall[20k]": lambda: URL_RE.findall(reply),
+    }
+
+
+# ─── Runner ───────────────────────────────────────────────────────────────────
+
+def measure(fn: Callable[[], object]) -> float:
+    """Best seconds per call over ROUNDS rounds of ≥ MIN_ROUND_SECONDS each."""
+    fn()  # warm-up
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= MIN_ROUND_SECONDS:
+            break
+        loops = max(loops * 2, int(loops * MIN_ROUND_SECONDS / max(elapsed, 1e-9)))
+
+    rounds = [elapsed / loops]
+    for _ in range(ROUNDS - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        rounds.append((time.perf_counter() - started) / loops)
+    return min(rounds)
+
+
+def _format(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.0f} ns"
+
+
+def _regressed(results: dict[str, float], baseline: dict[str, float], tolerance: float) -> list[str]:
+    speed = results["reference"] / baseline["reference"] if "reference" in baseline else 1.0
+    return [
+        name for name, seconds in results.items()
+        if name != "reference" and name in baseline and seconds / (baseline[name] * speed) - 1 > tolerance
+    ]
+
+
+def print_comparison(results: dict[str, float], baseline: dict[str, float], regressions: list[str]) -> None:
+    speed = results["reference"] / baseline["reference"] if "reference" in baseline else 1.0
+    print(f"\nСкорость машины относительно базы: ×{1 / speed:.2f}\n")
+    print(f"{'бенчмарк':<40}{'сейчас':>12}{'база':>12}{'Δ':>9}")
+    for name, seconds in results.items():
+        if name == "reference":
+            continue
+        if name not in baseline:
+            print(f"{name:<40}{_format(seconds):>12}{'—':>12}{'новый':>9}")
+            continue
+        expected = baseline[name] * speed
+        mark = " ❌" if name in regressions else ""
+        print(f"{name:<40}{_format(seconds):>12}{_format(expected):>12}{seconds / expected - 1:>+8.0%}{mark}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--save", action="store_true", help="записать результаты как новую базу")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("-k", dest="keyword", default="", help="только бенчмарки с подстрокой в имени")
+    args = parser.parse_args()
+
+    suite = benchmarks()
+    results = {}
+    for name, fn in suite.items():
+        if name != "reference" and args.keyword not in name:
+            continue
+        results[name] = measure(fn)
+        print(f"{name:<40}{_format(results[name]):>12}", file=sys.stderr)
+    # Эталон — ещё раз в конце: частота CPU за время прогона могла измениться
+    results["reference"] = min(results["reference"], measure(_reference))
+
+    if args.save:
+        BASELINE_PATH.write_text(json.dumps({
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }, indent=2) + "\n")
+        print(f"База сохранена: {BASELINE_PATH}")
+        return 0
+
+    if not BASELINE_PATH.exists():
+        print("Базы нет — запусти с --save")
+        return 1
+    baseline = json.loads(BASELINE_PATH.read_text())["results"]
+    regressions = _regressed(results, baseline, args.tolerance)
+    # Шум не воспроизводится, настоящая регрессия — да: перемеряем подозрительные
+    for _ in range(RECHECKS):
+        if not regressions:
+            break
+        results["reference"] = min(results["reference"], measure(_reference))
+        for name in regressions:
+            results[name] = min(results[name], measure(suite[name]))
+        regressions = _regressed(results, baseline, args.tolerance)
+
+    print_comparison(results, baseline, regressions)
+    if regressions:
+        print(f"\n❌ Регрессии (> {args.tolerance:.0%}): {', '.join(regressions)}")
+        return 1
+    print("\n✅ Регрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
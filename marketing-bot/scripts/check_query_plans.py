@@ -0,0 +1,154 @@
+"""
+Проверка: каждый горячий запрос из bot/db/repositories/business.py идёт по индексу.
+
+Запускает EXPLAIN (FORMAT JSON) для каждого запроса с enable_seqscan = off —
+на маленькой dev-базе планировщик иначе всегда выбирает seq scan, а нам важно
+доказать, что подходящий индекс существует и применим.
+
+Usage (из marketing-bot/, после `alembic upgrade head`):
+    python -m scripts.check_query_plans
+Exit code 1, если хотя бы один запрос не использует ожидаемый индекс.
+"""
+
+import asyncio
+import json
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import func, literal_column, select, text
+from sqlalchemy.dialects import postgresql
+
+from bot.db import engine
+from bot.db.models import (
+    MESSAGE_SEARCH_CONFIG, MESSAGE_SEARCH_VECTOR, Business, DocumentVersion, Message, Subscription,
+    SubscriptionStatus,
+)
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+SEARCH_QUERY = func.to_tsquery(MESSAGE_SEARCH_CONFIG, "кофейня | москва")
+
+# (name, statement, expected index)
+HOT_QUERIES = [
+    (
+        "get_user_businesses",
+        select(Business)
+        .where(Business.user_id == 1, Business.is_active == True)
+        .order_by(Business.updated_at.desc()),
+        "ix_businesses_user_active_updated",
+    ),
+    (
+        "get_active_business",
+        select(Business).where(Business.id == 1, Business.user_id == 1, Business.is_active == True),
+        "businesses_pkey",
+    ),
+    (
+        "Business.messages (selectinload)",
+        select(Message).where(Message.business_id.in_([1, 2])).order_by(Message.created_at),
+        "ix_messages_business_created",
+    ),
+    (
+        "get_recent_turns (history cache miss)",
+        select(Message.id, Message.role, Message.content, Message.step)
+        .where(Message.business_id == 1)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(100),
+        "ix_messages_business_created",
+    ),
+    (
+        "search_older_turns (recall)",
+        select(Message.id)
+        .where(
+            Message.business_id == 1,
+            Message.id < 1000,
+            MESSAGE_SEARCH_VECTOR.op("@@")(SEARCH_QUERY),
+        )
+        .order_by(func.ts_rank(MESSAGE_SEARCH_VECTOR, SEARCH_QUERY, 1).desc())
+        .limit(5),
+        "ix_messages_business_search",
+    ),
+    (
+        "document version chain (get_version / record_version)",
+        select(DocumentVersion.version, DocumentVersion.snapshot, DocumentVersion.patch)
+        .where(
+            DocumentVersion.business_id == 1,
+            DocumentVersion.doc_type == "strategy",
+            DocumentVersion.version >= 11,
+            DocumentVersion.version <= 15,
+        )
+        .order_by(DocumentVersion.version),
+        "uq_document_versions_business_doc_version",
+    ),
+    (
+        "get_user_plan / User.active_subscription",
+        select(Subscription).where(
+            Subscription.user_id == 1, Subscription.status == SubscriptionStatus.ACTIVE
+        ),
+        "ix_subscriptions_user_status",
+    ),
+    (
+        "find_businesses_by_profile",
+        select(Business).where(
+            # literal_binds не умеет рендерить JSONB — подставляем литерал вручную
+            Business.profile.contains(literal_column("""'{"niche": "кофейня"}'::jsonb""")),
+            Business.is_active == True,
+        ),
+        "ix_businesses_profile_gin",
+    ),
+    (
+        "retention: businesses past delete_after",
+        select(Business.id).where(Business.delete_after <= NOW),
+        "ix_businesses_delete_after",
+    ),
+    (
+        "retention: messages older than cutoff",
+        select(Message.id).where(Message.created_at < NOW),
+        "ix_messages_created_at",
+    ),
+]
+
+
+def _index_names(plan: dict) -> set[str]:
+    names = set()
+    if "Index Name" in plan:
+        names.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        names |= _index_names(child)
+    return names
+
+
+async def _with_parent_indexes(conn, names: set[str]) -> set[str]:
+    """On partitioned tables the plan names per-partition indexes — map them to the parent."""
+    if not names:
+        return names
+    result = await conn.execute(
+        text(
+            "SELECT p.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE c.relname = ANY(:names)"
+        ),
+        {"names": list(names)},
+    )
+    return names | set(result.scalars().all())
+
+
+async def main() -> int:
+    failed = 0
+    async with engine.connect() as conn:
+        await conn.execute(text("SET LOCAL enable_seqscan = off"))
+        for name, stmt, expected in HOT_QUERIES:
+            sql = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+            result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+            raw = result.scalar_one()
+            plan = (raw if isinstance(raw, list) else json.loads(raw))[0]["Plan"]
+            used = await _with_parent_indexes(conn, _index_names(plan))
+            ok = expected in used
+            failed += not ok
+            print(f"{'✅' if ok else '❌'} {name}: expected {expected}, plan uses {sorted(used) or 'no index'}")
+    await engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
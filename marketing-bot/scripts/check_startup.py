@@ -0,0 +1,101 @@
+"""
+Проверка холодного старта: сколько стоит `import bot.main` и что он тянет.
+
+Запускает `python -X importtime -c "import bot.main"` в чистом интерпретаторе
+(лучший из --runs прогонов), печатает вклад пакетов (собственное время модулей,
+сгруппированное по пакету верхнего уровня) и проверяет бюджет:
+
+- `import bot.main` укладывается в STARTUP_BUDGET_MS, а собственное время
+  модулей bot.* — в OWN_CODE_BUDGET_MS (от скорости машины зависит меньше:
+  общий итог на 70%+ — типы aiogram, их лениво не загрузить);
+- тяжёлые зависимости, которые нужны не на каждом апдейте (SDK Anthropic,
+  скрейпер, Playwright, OpenTelemetry), не импортируются на старте — они грузятся при первом
+  использовании (bot.services.claude.get_client, _handle_url_in_message) или только
+  при включённом трейсинге (bot.tracing.setup_tracing).
+
+Usage (из marketing-bot/):
+    python -m scripts.check_startup [--runs 5] [--budget-ms 5000] [--top 15]
+Exit code 1 при превышении бюджета или импорте отложенного модуля.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# Бюджет на импорт bot.main (-X importtime сам добавляет ~10–20%).
+# Почти всё — aiogram (~75%, типы Bot API) и SQLAlchemy; наш код — единицы процентов.
+STARTUP_BUDGET_MS = 5000
+OWN_CODE_BUDGET_MS = 150
+
+# Не должны импортироваться при старте
+DEFERRED_MODULES = ["anthropic", "httpx", "httpcore", "bs4", "lxml", "playwright", "opentelemetry"]
+
+
+def profile_import(module: str = "bot.main") -> dict[str, tuple[int, int]]:
+    """{module: (self_us, cumulative_us)} from one fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=os.environ.copy(),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def by_package(modules: dict[str, tuple[int, int]]) -> dict[str, int]:
+    totals: dict[str, int] = defaultdict(int)
+    for name, (self_us, _) in modules.items():
+        totals[name.split(".")[0]] += self_us
+    return totals
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    # Лучший прогон: первый обычно платит за холодный дисковый кэш и .pyc
+    runs = [profile_import() for _ in range(args.runs)]
+    modules = min(runs, key=lambda m: m["bot.main"][1])
+    total_ms = modules["bot.main"][1] / 1000
+
+    packages = sorted(by_package(modules).items(), key=lambda item: -item[1])
+    print(f"{'пакет':<28}{'мс':>10}{'доля':>8}")
+    for name, us in packages[: args.top]:
+        print(f"{name:<28}{us / 1000:>10.1f}{us / 1000 / total_ms:>8.1%}")
+
+    failed = False
+    print(f"\nimport bot.main: {total_ms:.0f} мс (бюджет {args.budget_ms:.0f} мс, лучший из {args.runs})")
+    if total_ms > args.budget_ms:
+        print("❌ Бюджет холодного старта превышен")
+        failed = True
+
+    own_ms = by_package(modules)["bot"] / 1000
+    print(f"модули bot.*: {own_ms:.0f} мс (бюджет {OWN_CODE_BUDGET_MS} мс)")
+    if own_ms > OWN_CODE_BUDGET_MS:
+        print("❌ Бюджет на собственный код превышен — что-то тяжёлое выполняется при импорте")
+        failed = True
+
+    eager = [name for name in DEFERRED_MODULES if name in modules]
+    if eager:
+        print(f"❌ Импортируются на старте, хотя должны грузиться лениво: {', '.join(eager)}")
+        failed = True
+
+    if not failed:
+        print("✅ Холодный старт в бюджете")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Отчёт: что занимает входной контекст Claude по всем активным проектам.
+
+Для каждого проекта собирает запрос так же, как chat_step() (системный промпт,
+история, инструмент шага), оценивает токены по секциям локальным оценщиком из
+bot/services/context_profile.py и печатает:
+- суммарный вклад каждой секции, её долю, среднее и p95 по проектам;
+- top-N проектов по размеру контекста с самой тяжёлой секцией.
+
+Оценка без калибровки (API не вызывается). Поправку можно взять из логов
+"Claude context" (estimator_scale) или метрики claude_context_estimator_scale.
+
+Usage (из marketing-bot/):
+    python -m scripts.context_report [--top 20] [--scale 1.0]
+"""
+
+import argparse
+import asyncio
+from collections import defaultdict
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload, undefer_group
+
+from bot.agent.documents import STEP_TOOL_INSTRUCTION, step_tool
+from bot.db import async_session_factory
+from bot.db.models import Business
+from bot.services.claude import _build_context_messages, _system_prompt_sections
+from bot.services.context_profile import raw_sections
+
+LOAD_CHUNK = 200
+
+# Типичный следующий вопрос пользователя — чтобы user_message не был пустым
+SAMPLE_USER_MESSAGE = "Что делаем дальше?"
+
+
+def _profile(business: Business) -> dict[str, float]:
+    sections = _system_prompt_sections(business)
+    tool = step_tool(business.current_step)
+    if tool:
+        sections.append(("tool_instruction", STEP_TOOL_INSTRUCTION.format(tool=tool["name"])))
+    messages = _build_context_messages(business)
+    messages.append({"role": "user", "content": SAMPLE_USER_MESSAGE})
+    return raw_sections(sections, messages, [tool] if tool else None)
+
+
+async def collect() -> list[tuple[Business, dict[str, float]]]:
+    profiles = []
+    last_id = 0
+    async with async_session_factory() as session:
+        while True:
+            result = await session.execute(
+                select(Business)
+                .where(Business.is_active == True, Business.delete_after.is_(None), Business.id > last_id)
+                .order_by(Business.id)
+                .limit(LOAD_CHUNK)
+                .options(undefer_group("heavy"), selectinload(Business.messages))
+            )
+            chunk = result.scalars().all()
+            if not chunk:
+                break
+            profiles.extend((b, _profile(b)) for b in chunk)
+            last_id = chunk[-1].id
+            session.expunge_all()
+    return profiles
+
+
+def _p95(values: list[float]) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def print_report(profiles: list[tuple[Business, dict[str, float]]], top: int, scale: float) -> None:
+    if not profiles:
+        print("Нет активных проектов")
+        return
+
+    per_section: dict[str, list[float]] = defaultdict(list)
+    for _, sections in profiles:
+        for name, value in sections.items():
+            per_section[name].append(value * scale)
+
+    grand_total = sum(sum(values) for values in per_section.values())
+    print(f"Проектов: {len(profiles)}, всего ~{grand_total:,.0f} входных токенов на один ход каждого\n")
+    print(f"{'секция':<18}{'всего':>12}{'доля':>8}{'среднее':>10}{'p95':>10}{'проектов':>10}")
+    for name, values in sorted(per_section.items(), key=lambda item: -sum(item[1])):
+        total = sum(values)
+        print(
+            f"{name:<18}{total:>12,.0f}{total / grand_total:>8.1%}"
+            f"{total / len(values):>10,.0f}{_p95(values):>10,.0f}{len(values):>10}"
+        )
+
+    print(f"\nTop {top} проектов по размеру контекста:")
+    ranked = sorted(profiles, key=lambda item: -sum(item[1].values()))[:top]
+    for business, sections in ranked:
+        heaviest, heaviest_tokens = max(sections.items(), key=lambda item: item[1])
+        print(
+            f"  #{business.id:<8}{business.name[:30]:<32}{business.current_step.value:<14}"
+            f"~{sum(sections.values()) * scale:>8,.0f}  ({heaviest}: ~{heaviest_tokens * scale:,.0f})"
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--scale", type=float, default=1.0, help="estimator_scale из логов / метрик")
+    args = parser.parse_args()
+
+    print_report(await collect(), args.top, args.scale)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
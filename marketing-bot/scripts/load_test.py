@@ -0,0 +1,343 @@
+"""
+Нагрузочный прогон всего бота: create_dispatcher() + Dispatcher.feed_update.
+
+Тысячи симулированных чатов параллельно проходят /start → онбординг →
+подтверждение уровня → N ходов чата (последний утверждает профиль через
+tool use) → /projects. Telegram и Anthropic подменены:
+- FakeTelegramSession — aiogram-сессия без сети, отвечает на sendMessage,
+  editMessageText, sendChatAction и т.п. синтетическими объектами;
+- фейковый Anthropic API — локальный aiohttp-сервер /v1/messages с настраиваемой
+  задержкой и SSE-стримингом; SDK ходит в него по HTTP как в настоящий.
+Postgres и Redis — настоящие, локальные (make up migrate).
+
+Отчёт: p50/p95/p99 латентности обработчиков по типам апдейтов, updates/s,
+SQL-запросов на апдейт, вызовов Telegram/Anthropic, RSS процесса.
+
+Usage (из marketing-bot/):
+    python -m scripts.load_test --chats 1000 --concurrency 200 --turns 5 --claude-latency-ms 800
+Созданные пользователи (id от LOAD_USER_ID_BASE), их FSM-ключи и ключи дедупликации
+update_id удаляются в конце.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import resource
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any
+
+import structlog
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, Message, Update
+from aiohttp import web
+from sqlalchemy import event, text
+
+from bot.db import engine, verify_schema_revision
+from bot.db.redis import redis
+from bot.main import create_dispatcher
+from bot.services import claude
+
+LOAD_USER_ID_BASE = 9_000_000_000
+LOAD_BOT_TOKEN = "4242:load-test"     # bot.id = 4242 → FSM-ключи fsm:4242:*
+
+ONBOARDING_ANSWER = "1. 10 человек\n2. маркетолог на фрилансе\n3. оборот 2 млн в месяц"
+CHAT_TURNS = [
+    "Мы кофейня у метро, продаём кофе с собой и десерты, средний чек 350 рублей.",
+    "Аудитория — студенты и офисные сотрудники 20–35 лет.",
+    "Конкуренты — две сетевые кофейни рядом, у них дешевле.",
+    "Сейчас ведём только Instagram, бюджета на рекламу почти нет.",
+    "Цель — плюс 30% выручки за три месяца.",
+]
+APPROVAL_TURN = "Всё верно, утверждаю профиль"
+
+
+# ─── Fake Telegram ────────────────────────────────────────────────────────────
+
+class FakeTelegramSession(BaseSession):
+    """Answers every Bot API call locally. Methods returning Message get a synthetic one."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls: dict[str, int] = defaultdict(int)
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: int | None = None) -> Any:
+        self.calls[type(method).__name__] += 1
+        if method.__returning__ is Message:
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(timezone.utc),
+                chat=Chat(id=method.chat_id, type="private"),
+                text=getattr(method, "text", None),
+            )
+        return True
+
+    async def stream_content(self, url: str, headers=None, timeout: int = 30, chunk_size: int = 65536, raise_for_status: bool = True):
+        raise RuntimeError("load test does not download files")
+        yield b""  # делает метод асинхронным генератором, как в BaseSession
+
+    async def close(self) -> None:
+        pass
+
+
+def _user(chat_id: int) -> dict:
+    return {"id": chat_id, "is_bot": False, "first_name": f"Load{chat_id % 10_000}", "language_code": "ru"}
+
+
+def make_message_update(update_id: int, chat_id: int, text_: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": _user(chat_id),
+            "text": text_,
+        },
+    }
+
+
+# ─── Fake Anthropic ───────────────────────────────────────────────────────────
+
+class FakeAnthropic:
+    """Minimal /v1/messages: fixed-size replies, tool_use on approval, optional SSE."""
+
+    def __init__(self, latency_ms: float, jitter: float, reply_chars: int, stream_chunks: int) -> None:
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.reply_chars = reply_chars
+        self.stream_chunks = stream_chunks
+        self.requests = 0
+        self.in_flight = self.max_in_flight = 0
+
+    def _delay(self) -> float:
+        spread = self.latency_ms * self.jitter
+        return max(0.0, random.uniform(self.latency_ms - spread, self.latency_ms + spread)) / 1000
+
+    @staticmethod
+    def _tool_input(schema: dict) -> dict:
+        return {
+            name: [] if schema["properties"][name].get("type") == "array" else "load test"
+            for name in schema.get("required", [])
+        }
+
+    def _content(self, body: dict) -> tuple[list[dict], str]:
+        reply = ("Отличный вопрос, давай разберём подробнее. " * 50)[: self.reply_chars]
+        last = body["messages"][-1]["content"]
+        tools = body.get("tools") or []
+        if tools and "утверждаю" in last:
+            tool = tools[0]
+            return [
+                {"type": "text", "text": "Сохраняю и идём дальше."},
+                {"type": "tool_use", "id": f"toolu_{self.requests}", "name": tool["name"],
+                 "input": self._tool_input(tool["input_schema"])},
+            ], "tool_use"
+        return [{"type": "text", "text": reply}], "end_turn"
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            content, stop_reason = self._content(body)
+            usage = {"input_tokens": len(json.dumps(body, ensure_ascii=False)) // 3, "output_tokens": self.reply_chars // 3}
+            message = {
+                "id": f"msg_{self.requests}", "type": "message", "role": "assistant", "model": body["model"],
+                "content": content, "stop_reason": stop_reason, "stop_sequence": None, "usage": usage,
+            }
+            if not body.get("stream"):
+                await asyncio.sleep(self._delay())
+                return web.json_response(message)
+            return await self._stream(request, message)
+        finally:
+            self.in_flight -= 1
+
+    async def _stream(self, request: web.Request, message: dict) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(event_type: str, data: dict) -> None:
+            await response.write(f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode())
+
+        text_ = message["content"][0]["text"]
+        step = max(1, len(text_) // self.stream_chunks)
+        delay = self._delay() / (self.stream_chunks + 1)
+
+        await asyncio.sleep(delay)  # time to first token
+        await send("message_start", {"type": "message_start", "message": {**message, "content": [], "stop_reason": None}})
+        await send("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        for i in range(0, len(text_), step):
+            await asyncio.sleep(delay)
+            await send("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text_[i:i + step]}})
+        await send("content_block_stop", {"type": "content_block_stop", "index": 0})
+        await send("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": message["usage"]["output_tokens"]}})
+        await send("message_stop", {"type": "message_stop"})
+        await response.write_eof()
+        return response
+
+    async def start(self) -> tuple[web.AppRunner, str]:
+        app = web.Application(client_max_size=32 * 1024 ** 2)
+        app.router.add_post("/v1/messages", self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return runner, f"http://127.0.0.1:{port}"
+
+
+# ─── Measurements ─────────────────────────────────────────────────────────────
+
+class Stats:
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.queries = 0
+
+    def on_query(self, *args) -> None:
+        self.queries += 1
+
+    async def error_middleware(self, handler, event, data):
+        """Outer middleware: sees handler exceptions before dp.errors swallows them."""
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            self.errors[type(e).__name__] += 1
+            raise
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as fh:
+        for line in fh:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+# ─── Scenario ─────────────────────────────────────────────────────────────────
+
+async def run_chat(dp, bot: Bot, chat_id: int, turns: int, think_ms: float, update_ids, stats: Stats) -> None:
+    script = [("start", "/start"), ("onboarding", ONBOARDING_ANSWER), ("confirm", "да")]
+    script += [("chat", CHAT_TURNS[i % len(CHAT_TURNS)]) for i in range(max(0, turns - 1))]
+    if turns:
+        script.append(("chat", APPROVAL_TURN))
+    script.append(("projects", "/projects"))
+
+    for kind, text_ in script:
+        update = Update.model_validate(make_message_update(next(update_ids), chat_id, text_), context={"bot": bot})
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            stats.errors[f"{kind}: {type(e).__name__}"] += 1
+        stats.latencies[kind].append(time.perf_counter() - started)
+        if think_ms:
+            await asyncio.sleep(random.expovariate(1000 / think_ms))
+
+
+async def cleanup(chat_ids: range) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("DELETE FROM users WHERE id >= :lo AND id < :hi"),
+            {"lo": chat_ids.start, "hi": chat_ids.stop},
+        )
+    bot_id = LOAD_BOT_TOKEN.split(":")[0]
+    for pattern in (f"fsm:{bot_id}:*", f"dedup:update:{bot_id}:*"):
+        async for key in redis.scan_iter(pattern, count=1000):
+            await redis.delete(key)
+    for chat_id in chat_ids:
+        await redis.delete(f"projects:{chat_id}")
+
+
+def print_report(stats: Stats, fake: FakeAnthropic, session: FakeTelegramSession, wall: float, rss: tuple) -> None:
+    all_latencies = [v for values in stats.latencies.values() for v in values]
+    updates = len(all_latencies)
+    print(f"\nАпдейтов: {updates} за {wall:.1f} с → {updates / wall:,.1f} updates/s")
+    print(f"\n{'тип':<12}{'n':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+    for kind, values in [*stats.latencies.items(), ("всего", all_latencies)]:
+        print(
+            f"{kind:<12}{len(values):>8}"
+            + "".join(f"{_percentile(values, q) * 1000:>10.0f}" for q in (0.5, 0.95, 0.99))
+            + f"{max(values) * 1000:>10.0f}"
+        )
+    print(f"\nSQL-запросов: {stats.queries} ({stats.queries / updates:.1f} на апдейт)")
+    print(f"Anthropic: {fake.requests} запросов, максимум {fake.max_in_flight} одновременно")
+    print(f"Telegram: {dict(session.calls)}")
+    start_rss, end_rss, peak_rss = rss
+    print(f"RSS: {start_rss:.0f} → {end_rss:.0f} МБ (пик {peak_rss:.0f} МБ)")
+    if stats.errors:
+        print(f"\n❌ Ошибки: {dict(stats.errors)}")
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200, help="одновременно активных чатов")
+    parser.add_argument("--turns", type=int, default=5, help="ходов чата после онбординга")
+    parser.add_argument("--think-ms", type=float, default=0, help="средняя пауза пользователя между сообщениями")
+    parser.add_argument("--claude-latency-ms", type=float, default=800)
+    parser.add_argument("--claude-jitter", type=float, default=0.5, help="разброс задержки, доля от среднего")
+    parser.add_argument("--reply-chars", type=int, default=1500)
+    parser.add_argument("--stream-chunks", type=int, default=30, help="чанков SSE при stream=true")
+    parser.add_argument("--keep-data", action="store_true", help="не удалять созданных пользователей")
+    args = parser.parse_args()
+
+    # Логи обработчиков исказили бы замеры
+    logging.getLogger("aiogram").setLevel(logging.WARNING)
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+    await verify_schema_revision()
+
+    stats = Stats()
+    event.listen(engine.sync_engine, "before_cursor_execute", stats.on_query)
+
+    fake = FakeAnthropic(args.claude_latency_ms, args.claude_jitter, args.reply_chars, args.stream_chunks)
+    runner, base_url = await fake.start()
+    claude._client = claude.get_client().with_options(base_url=base_url, api_key="load-test")
+
+    session = FakeTelegramSession()
+    bot = Bot(token=LOAD_BOT_TOKEN, session=session)
+    dp = create_dispatcher()
+    dp.update.outer_middleware(stats.error_middleware)
+
+    chat_ids = range(LOAD_USER_ID_BASE, LOAD_USER_ID_BASE + args.chats)
+    update_ids = itertools.count(1)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one_chat(chat_id: int) -> None:
+        async with semaphore:
+            await run_chat(dp, bot, chat_id, args.turns, args.think_ms, update_ids, stats)
+
+    await cleanup(chat_ids)   # остатки прерванного прогона
+    stats.queries = 0
+    start_rss = _rss_mb()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one_chat(chat_id) for chat_id in chat_ids))
+        wall = time.perf_counter() - started
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print_report(stats, fake, session, wall, (start_rss, _rss_mb(), peak_rss))
+    finally:
+        if not args.keep_data:
+            await cleanup(chat_ids)
+        await runner.cleanup()
+        await engine.dispose()
+        await redis.aclose()
+    return 1 if stats.errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))